@@ -0,0 +1,180 @@
+"""
+BM25 인덱스 벤치마크: 예전 pickle(BM25Retriever dict) vs CSR 역색인(.npy + mmap)
+
+합성 코퍼스(태그별 문서, Zipf 분포 단어)로 두 인덱스를 만들고
+- 디스크 크기, 새 프로세스에서의 로드 시간 / RSS 증가량
+- 쿼리 점수 계산 시간
+- 태그별 상위 k 결과가 완전히 같은지
+를 비교한다. (CSR 쪽 문서 본문 조회는 Chroma 에서 하므로 점수 계산 시간만 비교)
+
+실행:
+    python -m benchmarks.bench_bm25_index --docs 20000 --tags 11 --queries 200 --k 20
+"""
+
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+from langchain_community.retrievers import BM25Retriever
+from langchain_core.documents import Document
+
+from services.utils.sparse_index import SparseBM25Index
+
+
+def _corpus(n_docs, n_tags, doc_len, vocab_size, seed=0):
+    rng = np.random.default_rng(seed)
+    syllables = [chr(c) for c in range(0xAC00, 0xAC00 + 400)]  # 한글 음절
+    vocab = [
+        "".join(rng.choice(syllables, size=rng.integers(1, 4))) + str(i % 7)
+        for i in range(vocab_size)
+    ]
+    # Zipf 분포로 흔한 단어 / 드문 단어가 섞이도록
+    probs = 1 / np.arange(1, vocab_size + 1) ** 1.1
+    probs /= probs.sum()
+
+    ids, texts, tags = [], [], []
+    for i in range(n_docs):
+        words = rng.choice(vocab, size=rng.integers(doc_len // 2, doc_len * 2), p=probs)
+        ids.append(f"doc-{i}")
+        texts.append(" ".join(words))
+        tags.append(f"tag{i % n_tags}")
+    queries = [
+        " ".join(rng.choice(vocab, size=rng.integers(2, 8), p=probs))
+        for _ in range(1000)
+    ]
+    return ids, texts, tags, queries
+
+
+def _build_pickle(ids, texts, tags, path):
+    # 기존 retriever_bm25._load_bm25_index 와 같은 방식
+    tag_docs = defaultdict(list)
+    for doc_id, text, tag in zip(ids, texts, tags):
+        meta = {"tags": tag, "id": doc_id}
+        tag_docs[tag].append(Document(page_content=text, metadata=meta))
+    bm25_dict = {
+        tag: BM25Retriever.from_documents(dlist) for tag, dlist in tag_docs.items()
+    }
+    with open(path, "wb") as f:
+        pickle.dump(bm25_dict, f)
+    return bm25_dict
+
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _probe(kind, path):
+    """새 프로세스에서 인덱스를 로드하고 시간 / RSS 증가량을 JSON 으로 출력"""
+    before = _rss_mb()
+    start = time.perf_counter()
+    if kind == "pickle":
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+    else:
+        index = SparseBM25Index.load(path)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "rss_mb": _rss_mb() - before}))
+    return index
+
+
+def _measure_load(kind, path):
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_bm25_index", "--probe", kind, path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _disk_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 2**20
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--tags", type=int, default=11)
+    parser.add_argument("--doc-len", type=int, default=120)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--probe", nargs=2, metavar=("KIND", "PATH"))
+    args = parser.parse_args()
+
+    if args.probe:
+        _probe(*args.probe)
+        return
+
+    ids, texts, tags, queries = _corpus(args.docs, args.tags, args.doc_len, args.vocab)
+    queries = queries[: args.queries]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pkl_path = os.path.join(tmp, "bm25_index.pkl")
+        csr_path = os.path.join(tmp, "bm25_index")
+
+        start = time.perf_counter()
+        old = _build_pickle(ids, texts, tags, pkl_path)
+        old_build = time.perf_counter() - start
+        start = time.perf_counter()
+        SparseBM25Index.build(ids, texts, tags).save(csr_path)
+        new_build = time.perf_counter() - start
+        new = SparseBM25Index.load(csr_path)
+
+        # 결과 동일성 (태그 x 쿼리 전부)
+        mismatches = 0
+        for tag, retriever in old.items():
+            retriever = retriever.model_copy(update={"k": args.k})
+            for q in queries:
+                expected = [d.metadata["id"] for d in retriever.invoke(q)]
+                got = [new.doc_ids[r] for r in new.top_n(tag, q.split(), args.k)]
+                mismatches += expected != got
+
+        # 점수 계산 시간 (쿼리 하나당 전체 태그)
+        start = time.perf_counter()
+        for q in queries:
+            for retriever in old.values():
+                retriever.vectorizer.get_top_n(q.split(), retriever.docs, n=args.k)
+        old_query = (time.perf_counter() - start) / len(queries)
+        start = time.perf_counter()
+        for q in queries:
+            for tag in new.tags:
+                new.top_n(tag, q.split(), args.k)
+        new_query = (time.perf_counter() - start) / len(queries)
+
+        old_load = _measure_load("pickle", pkl_path)
+        new_load = _measure_load("csr", csr_path)
+
+        print(
+            f"docs={args.docs} tags={args.tags} queries={len(queries)} k={args.k} "
+            f"(tag x query 결과 불일치: {mismatches})"
+        )
+        print(
+            f"{'index':<8}{'disk(MB)':>10}{'build(s)':>10}{'load(s)':>10}"
+            f"{'rss(MB)':>10}{'query(ms)':>11}"
+        )
+        for name, path, build, load, query in (
+            ("pickle", pkl_path, old_build, old_load, old_query),
+            ("csr", csr_path, new_build, new_load, new_query),
+        ):
+            print(
+                f"{name:<8}{_disk_mb(path):>10.1f}{build:>10.2f}{load['seconds']:>10.3f}"
+                f"{load['rss_mb']:>10.1f}{query * 1000:>11.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+/chat2 LangGraph 동시 처리량 벤치마크 (LLM / 검색 스텁)
+
+실제 OpenAI 호출과 bge-m3 / Chroma 로딩 없이, 고정 지연을 가진 가짜 체인으로
+동기 그래프(graph.invoke)와 비동기 그래프(graph.ainvoke)의 동시 요청 처리량을 비교한다.
+
+실행:
+    python -m benchmarks.bench_chat2_concurrency --llm-latency 0.2 --concurrency 1 8 32 64
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+import types
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+
+SEARCH_LATENCY = 0.05
+
+
+class _FakeRetriever:
+    def search(self, query, query_vector=None):
+        time.sleep(SEARCH_LATENCY)
+        return [
+            types.SimpleNamespace(
+                doc=Document(page_content=f"{query} 문서 {i}"), score=1 / (61 + i)
+            )
+            for i in range(3)
+        ]
+
+
+def _stub_retrieval_modules():
+    """모델/벡터DB 를 로드하는 모듈을 가짜 모듈로 대체"""
+    stubs = {
+        "services.utils.retriever": {"retriever_setting": lambda *a, **k: None},
+        "services.utils.retriever_qa": {"retriever_setting2": lambda *a, **k: None},
+        "services.utils.retriever_hybrid": {
+            "hybrid_retriever_setting": lambda *a, **k: _FakeRetriever(),
+            "hybrid_retriever_setting_qa": lambda *a, **k: _FakeRetriever(),
+            "embed_queries": lambda queries: {q: [0.0] for q in queries},
+            "stored_embeddings": lambda refs: {},
+        },
+    }
+    for name, attrs in stubs.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(attrs)
+        sys.modules[name] = module
+
+
+def _fake_chain(output, latency):
+    def func(_):
+        time.sleep(latency)
+        return output(_) if callable(output) else output
+
+    async def afunc(_):
+        await asyncio.sleep(latency)
+        return output(_) if callable(output) else output
+
+    return RunnableLambda(func, afunc=afunc)
+
+
+def _tool_calls(_):
+    return AIMessage(
+        content="",
+        tool_calls=[
+            {
+                "name": "vector_search_tool",
+                "args": {"query": q, "api_tags": ["drive"]},
+                "id": f"call_{i}",
+            }
+            for i, q in enumerate(["드라이브 권한", "drive permission"])
+        ],
+    )
+
+
+def _patch_chains(nodes, latency):
+    nodes.classification_chain = _fake_chain("api", latency)
+    nodes.query_chain = _fake_chain(
+        {"questions": ["드라이브 권한", "drive permission"]}, latency
+    )
+    nodes.llm_with_tools = _fake_chain(_tool_calls, latency)
+    nodes.basic_chain = _fake_chain("답변", latency)
+    nodes.quality_chain = _fake_chain("good", latency)
+    nodes.simple_chain = _fake_chain("안녕하세요", latency)
+    nodes.imp_chain = _fake_chain("모르는 내용입니다", latency)
+    nodes.alt_query_chain = _fake_chain({"docs": []}, latency)
+
+
+def _inputs(i):
+    return {
+        "messages": [],
+        "question": "구글 드라이브 파일 권한 수정 방법",
+        "image": None,
+        "retry": False,
+    }, {"configurable": {"thread_id": f"bench-{i}"}}
+
+
+async def _run_sync(graph, n):
+    async def one(i):
+        state, config = _inputs(i)
+        return graph.invoke(state, config=config)  # 기존 방식: 이벤트 루프 블로킹
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+
+
+async def _run_async(graph, n):
+    async def one(i):
+        state, config = _inputs(i)
+        return await graph.ainvoke(state, config=config)
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+
+
+async def _measure(runner, graph, n):
+    """처리 시간과 이벤트 루프 최대 지연(= /health 응답 지연 근사)을 측정"""
+    lag = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal lag
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - start - 0.01)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await runner(graph, n)
+    elapsed = time.perf_counter() - start
+    done = True
+    await tick
+    return elapsed, lag
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    args = parser.parse_args()
+
+    _stub_retrieval_modules()
+    from services.utils import langgraph_node2 as nodes
+    from services.utils.langgraph_setting2 import graph_setting
+
+    _patch_chains(nodes, args.llm_latency)
+
+    graphs = {
+        "sync (invoke)": (_run_sync, graph_setting()),
+        "async (ainvoke)": (_run_async, graph_setting(use_async=True)),
+    }
+
+    print(f"LLM latency={args.llm_latency}s, search latency={SEARCH_LATENCY}s")
+    print(f"{'mode':<18}{'conc':>6}{'time(s)':>10}{'req/s':>10}{'max lag(s)':>12}")
+    for name, (runner, graph) in graphs.items():
+        for n in args.concurrency:
+            with contextlib.redirect_stdout(io.StringIO()):  # 노드 로그 숨김
+                elapsed, lag = asyncio.run(_measure(runner, graph, n))
+            print(f"{name:<18}{n:>6}{elapsed:>10.2f}{n / elapsed:>10.1f}{lag:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+/chat2/stream 토큰 누출 확인 (LLM / 검색 스텁)
+
+SPECULATIVE_HYDE 로 답변 생성과 동시에 실행되는 재검색 체인(대체 쿼리 생성)의
+토큰이 답변 토큰으로 스트리밍되지 않는지 확인한다. 누출되면 AssertionError.
+
+실행:
+    python -m benchmarks.check_chat2_stream
+"""
+
+import asyncio
+import contextlib
+import io
+import os
+
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+
+from benchmarks.bench_chat2_concurrency import (
+    _fake_chain,
+    _patch_chains,
+    _stub_retrieval_modules,
+)
+
+os.environ["ANSWER_CACHE"] = "off"  # 캐시 적중으로 그래프를 건너뛰지 않도록
+
+ANSWER = "드라이브 권한은 공유 설정에서 바꿉니다"
+LEAK = "ALT QUERY LEAK"
+
+
+def _streaming_chain(text, delay=0.0, parse=None):
+    """토큰 단위로 on_chat_model_stream 이벤트를 내는 가짜 체인"""
+
+    async def wait(inputs):
+        await asyncio.sleep(delay)
+        return str(inputs)
+
+    model = GenericFakeChatModel(messages=iter([text] * 100))
+    chain = RunnableLambda(lambda x: str(x), afunc=wait) | model | StrOutputParser()
+    return chain | RunnableLambda(parse) if parse else chain
+
+
+async def _stream_one():
+    from models.chat_model import ChatRequest2
+    from services.langgraph_service import stream_langraph
+
+    request = ChatRequest2(
+        user_input="구글 드라이브 파일 권한 수정 방법", config_id="check-stream"
+    )
+    return [event async for event in stream_langraph(request)]
+
+
+def main():
+    _stub_retrieval_modules()
+    from services.utils import langgraph_node2 as nodes
+
+    _patch_chains(nodes, 0.01)
+    nodes.SPECULATIVE_HYDE = True
+    # 재검색 체인은 바로 스트리밍, 답변은 조금 늦게 시작해 두 스트림이 겹치게 함
+    nodes.alt_query_chain = _streaming_chain(LEAK, parse=lambda _: {"docs": []})
+    nodes.basic_chain = _streaming_chain(ANSWER, delay=0.1)
+    nodes.quality_chain = _fake_chain("good", 0.01)
+
+    with contextlib.redirect_stdout(io.StringIO()):  # 노드 로그 숨김
+        events = asyncio.run(_stream_one())
+
+    tokens = "".join(e["content"] for e in events if e["type"] == "token")
+    done = [e for e in events if e["type"] == "done"]
+    print(f"tokens: {tokens!r}")
+    assert nodes.hyde_speculation_stats()["attempts"] == 1, "재검색이 시작되지 않음"
+    assert LEAK not in tokens, "재검색 체인 토큰이 답변 스트림에 섞임"
+    assert tokens == ANSWER, tokens
+    assert done and done[0]["answer"] == ANSWER, done
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
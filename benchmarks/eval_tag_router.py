@@ -0,0 +1,109 @@
+"""
+로컬 태그 라우터 오프라인 평가: LLM(GPT-4.1 tool call)이 고른 api_tags 와 비교
+
+TAG_ROUTER_LOG 로 모은 기록(JSONL: query, llm_tags)을 정답으로 보고
+임계값 조합별로
+- 커버리지: 로컬 결과를 쓰는 쿼리 비율 (자신 있는 쿼리)
+- exact: 태그 집합이 LLM 과 완전히 같은 비율
+- top1: 로컬 1순위 태그가 LLM 태그에 포함된 비율
+- jaccard: 태그 집합 평균 Jaccard
+를 출력한다. 태그 centroid 는 서버와 같은 방식(Chroma 임베딩 평균)으로 읽거나 만든다.
+
+실행:
+    TAG_ROUTER=shadow TAG_ROUTER_LOG=tag_log.jsonl uvicorn main:app ...   # 로그 수집
+    python -m benchmarks.eval_tag_router --log tag_log.jsonl \
+        --min-sim 0.35 0.45 0.55 --min-margin 0.0 0.03 0.06
+"""
+
+import argparse
+import itertools
+import json
+
+from services.utils.embedding_cache import get_shared_embeddings
+from services.utils.langgraph_node2 import GOOGLE_API_OPTIONS
+from services.utils.preclassifier import ApiMentions
+from services.utils.retriever import text_vectorstore
+from services.utils.tag_router import (
+    TAG_ROUTER_MAX_TAGS,
+    TAG_ROUTER_MULTI,
+    TagRouter,
+    load_centroids,
+)
+
+
+def _load(path):
+    rows = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if row.get("query") and row.get("llm_tags"):
+                rows[row["query"]] = set(row["llm_tags"])  # 같은 쿼리는 마지막 결과
+    return rows
+
+
+def _evaluate(router, rows, vectors):
+    covered = exact = top1 = 0
+    jaccard = 0.0
+    all_exact = 0
+    for query, llm_tags in rows.items():
+        route = router.route_one(query, vectors[query])
+        local = set(route.tags)
+        hit = local == llm_tags
+        all_exact += hit
+        if not route.confident:
+            continue
+        covered += 1
+        exact += hit
+        top1 += route.tags[0] in llm_tags
+        jaccard += len(local & llm_tags) / len(local | llm_tags)
+    n = max(covered, 1)
+    return {
+        "coverage": covered / max(len(rows), 1),
+        "exact": exact / n,
+        "top1": top1 / n,
+        "jaccard": jaccard / n,
+        "exact_all": all_exact / max(len(rows), 1),  # 임계값 없이 전부 로컬로 했을 때
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", required=True)
+    parser.add_argument("--min-sim", type=float, nargs="+", default=[0.35, 0.45, 0.55])
+    parser.add_argument(
+        "--min-margin", type=float, nargs="+", default=[0.0, 0.03, 0.06]
+    )
+    parser.add_argument("--multi", type=float, default=TAG_ROUTER_MULTI)
+    parser.add_argument("--max-tags", type=int, default=TAG_ROUTER_MAX_TAGS)
+    args = parser.parse_args()
+
+    rows = _load(args.log)
+    centroids = load_centroids(text_vectorstore.get())
+    queries = list(rows)
+    vectors = dict(zip(queries, get_shared_embeddings().embed_documents(queries)))
+    print(f"쿼리 {len(rows)}개, 태그 {len(centroids.tags)}개")
+
+    print(
+        f"{'min_sim':>8} {'margin':>7} {'coverage':>9} {'exact':>7} {'top1':>7} {'jaccard':>8}"
+    )
+    for min_sim, min_margin in itertools.product(args.min_sim, args.min_margin):
+        router = TagRouter(
+            centroids,
+            ApiMentions(GOOGLE_API_OPTIONS),
+            mode="on",
+            min_sim=min_sim,
+            min_margin=min_margin,
+            multi=args.multi,
+            max_tags=args.max_tags,
+            log_path=None,
+        )
+        r = _evaluate(router, rows, vectors)
+        print(
+            f"{min_sim:8.2f} {min_margin:7.2f} {r['coverage']:9.1%} "
+            f"{r['exact']:7.1%} {r['top1']:7.1%} {r['jaccard']:8.3f}"
+        )
+    print(f"(임계값 없이 모두 로컬로 했을 때 exact {r['exact_all']:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+classify 로컬 분류기 오프라인 평가 / 로지스틱 회귀 학습
+
+PRECLASSIFIER_LOG 로 모은 LLM 분류 기록(JSONL: question, llm)을 정답으로 보고
+- 규칙(rules)의 커버리지 / LLM 일치율
+- 규칙이 판단 못 한 질문에 대해 bge-m3 임베딩 로지스틱 회귀의 커버리지 / 일치율 (held-out)
+을 출력하고, 전체 데이터로 다시 학습한 모델을 저장한다 (PRECLASSIFIER=logreg 에서 사용).
+
+실행:
+    PRECLASSIFIER_LOG=classify_log.jsonl uvicorn main:app ...   # 로그 수집 (shadow 권장)
+    python -m benchmarks.train_preclassifier --log classify_log.jsonl --min-prob 0.9
+"""
+
+import argparse
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline")
+
+from services.utils.embedding_cache import get_shared_embeddings
+from services.utils.langgraph_node2 import GOOGLE_API_OPTIONS
+from services.utils.preclassifier import (
+    LABELS,
+    PRECLASSIFIER_MIN_PROB,
+    PRECLASSIFIER_MODEL,
+    LogisticClassifier,
+    PreClassifier,
+    _clean,
+)
+
+
+def _load(path):
+    rows = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if row.get("llm") in LABELS:
+                rows[row["question"]] = row["llm"]  # 같은 질문은 마지막 결과
+    return list(rows), list(rows.values())
+
+
+def _report(name, predicted, labels):
+    covered = [(p, l) for p, l in zip(predicted, labels) if p is not None]
+    agree = sum(p == l for p, l in covered)
+    print(
+        f"{name:8s} 커버리지 {len(covered) / max(len(labels), 1):6.1%} "
+        f"({len(covered)}/{len(labels)})  일치율 {agree / max(len(covered), 1):6.1%}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", required=True)
+    parser.add_argument("--out", default=PRECLASSIFIER_MODEL)
+    parser.add_argument("--min-prob", type=float, default=PRECLASSIFIER_MIN_PROB)
+    parser.add_argument("--test-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    questions, labels = _load(args.log)
+    print(f"질문 {len(questions)}개, 분포 {dict(Counter(labels))}")
+
+    rules = PreClassifier(GOOGLE_API_OPTIONS, mode="rules", log_path=None)
+    ruled = [rules.rules(q) for q in questions]
+    _report("rules", ruled, labels)
+
+    vectors = np.asarray(
+        get_shared_embeddings().embed_documents([_clean(q) for q in questions]),
+        dtype=np.float32,
+    )
+    order = np.random.default_rng(args.seed).permutation(len(questions))
+    n_test = int(len(order) * args.test_ratio)
+    test, train = order[:n_test], order[n_test:]
+
+    model = LogisticClassifier.fit(vectors[train], [labels[i] for i in train])
+    prob = model.predict_proba(vectors[test])
+    logreg = [
+        model.labels[p.argmax()] if p.max() >= args.min_prob else None for p in prob
+    ]
+    # 실제 동작과 같이 규칙이 먼저, 못 하면 logreg
+    combined = [ruled[i] or pred for i, pred in zip(test, logreg)]
+    _report("logreg", logreg, [labels[i] for i in test])
+    _report("combined", combined, [labels[i] for i in test])
+
+    model = LogisticClassifier.fit(vectors, labels)
+    model.save(args.out)
+    print(f"저장: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,33 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from routers import chat_router
+from services.utils.components import readiness, warmup_components
+from services.utils.metrics import collect_stats
+
+# 서버 시작 직후 백그라운드에서 모델/인덱스/그래프를 병렬로 미리 로드
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup = asyncio.create_task(warmup_components()) if WARMUP_ON_STARTUP else None
+    yield
+    if warmup is not None:
+        warmup.cancel()
+
 
 # Create FastAPI app
 app = FastAPI(
     title="ChatBot LangChain API",
     description="FastAPI service with LangChain and Qwen3 integration for chatbot functionality",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -38,5 +58,21 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready_check():
+    """Readiness endpoint: 모든 필수 컴포넌트 로드 완료 시 200, 아니면 503"""
+    ready, components = readiness()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "components": components},
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    """캐시 적중률 등 런타임 통계"""
+    return collect_stats()
+
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8001, reload=True)
@@ -6,6 +6,10 @@ class ChatRequest(BaseModel):
     history: List[Dict]
     permission: Literal["cto", "backend", "frontend", "data_ai", "none"] = "none"
     tone: Literal["formal", "informal"] = "formal"
+    # 있으면 제목을 기다리지 않고 응답 (GET /chat/title/{conversation_id} 로 조회)
+    conversation_id: Optional[str] = None
+    # 이미 확정된 대화 제목이 있으면 다시 생성하지 않음
+    title: Optional[str] = None
 
 
 class ChatRequest2(BaseModel):
@@ -1,10 +1,13 @@
+import json
+
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from models.chat_model import ChatRequest, ChatRequest2
 from models.title_model import InitialTitleRequest, RefineTitleRequest
 from models.suggestion_model import SuggestionRequest
 from models.query_model import QueryRequest
 from services.langchain_service import chat_service
-from services.langgraph_service import run_langraph
+from services.langgraph_service import run_langraph, stream_langraph
 from services.title_llm_service import initial_title_with_llm, refine_title_with_llm
 from services.suggest_llm_service import generate_suggestions
 from services.query_service import search_dense
@@ -12,18 +15,53 @@ from services.query_service import search_dense
 router = APIRouter()
 
 
+def _sse(events):
+    # dict 이벤트를 Server-Sent Events 형식으로 전송 (event: 타입, data: JSON)
+    async def body():
+        async for event in events:
+            data = json.dumps(event, ensure_ascii=False)
+            yield f"event: {event['type']}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/chat")
 async def chat(chat_request: ChatRequest):
-    response, title, tool_calls, tool_responses = await chat_service.get_chat_response(chat_request)
+    service = await chat_service.aget()
+    response, title, tool_calls, tool_responses = await service.get_chat_response(chat_request)
     return {"response": response, "title": title, "tool_calls": tool_calls, "tool_responses": tool_responses}
 
 
+@router.post("/chat/stream")
+async def chat_stream(chat_request: ChatRequest):
+    # token / reset / tool_call / done / title / error
+    service = await chat_service.aget()
+    return _sse(service.stream_chat_response(chat_request))
+
+
+@router.get("/chat/title/{conversation_id}")
+async def chat_title(conversation_id: str):
+    # /chat 과 동시에 생성한 제목 조회 (생성 중이면 잠시 기다린 뒤 status: pending)
+    service = await chat_service.aget()
+    return await service.titles.get(conversation_id)
+
+
 @router.post("/chat2")
 async def chat2(chat_request: ChatRequest2):
     response = await run_langraph(chat_request)
     return {"response": response}
 
 
+@router.post("/chat2/stream")
+async def chat2_stream(chat_request: ChatRequest2):
+    # progress / answer_start / token / done / error
+    return _sse(stream_langraph(chat_request))
+
+
 @router.post("/title")
 async def title(title_request: InitialTitleRequest):
     title = await initial_title_with_llm(title_request)
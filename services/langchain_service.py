@@ -1,8 +1,11 @@
+import asyncio
 import json
 import logging
 import re
 import gdown
 import os, shutil, tempfile
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
@@ -13,9 +16,11 @@ from langchain_core.messages import (
 )
 from langchain_core.tools import tool
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 
 from models.chat_model import ChatRequest
+from services.utils.components import component
+from services.utils.embedding_cache import get_shared_embeddings
+from services.utils.metrics import register_stats
 
 load_dotenv()
 
@@ -64,10 +69,89 @@ def create_chroma_db():
             logger.info(f"-------- {name} already exists")
 
 
-if not os.path.isdir(DB_DIR):
-    create_chroma_db()
+# /chat2 retriever 와 같은 bge-m3 인스턴스 + 임베딩 캐시를 공유
+embedding_model = get_shared_embeddings()
 
-embedding_model = HuggingFaceEmbeddings(model_name="BAAI/bge-m3")
+
+class VectorStorePool:
+    """
+    팀별 Chroma 벡터스토어를 한 번만 열어 요청 간에 재사용하는 풀
+    - 첫 사용 시(또는 warmup 시) 열고, 디렉토리가 교체되면 자동으로 다시 연다
+    """
+
+    def __init__(self, base_dir: Path, embedding_function):
+        self.base_dir = base_dir
+        self.embedding_function = embedding_function
+        self._stores = {}  # team -> (vectorstore, signature)
+        self._lock = threading.Lock()
+
+    def _signature(self, team: str):
+        # 다운로드로 파일이 교체되면 inode 가 바뀐다
+        # (mtime 은 Chroma 자체 쓰기에도 바뀌므로 사용하지 않음)
+        team_dir = self.base_dir / team
+        sqlite_file = team_dir / "chroma.sqlite3"
+        try:
+            return (team_dir.stat().st_ino, sqlite_file.stat().st_ino)
+        except FileNotFoundError:
+            return None
+
+    def _open(self, team: str):
+        return Chroma(
+            persist_directory=str(self.base_dir / team),
+            embedding_function=self.embedding_function,
+        )
+
+    def get(self, team: str):
+        signature = self._signature(team)
+        entry = self._stores.get(team)
+        if entry is not None and entry[1] == signature:
+            return entry[0]
+
+        with self._lock:
+            entry = self._stores.get(team)
+            if entry is not None and entry[1] == signature:
+                return entry[0]
+            if entry is not None:
+                logger.info(f"-------- {team} vectorstore changed on disk, reloading")
+                _release_chroma_system(self.base_dir / team)
+            vectorstore = self._open(team)
+            self._stores[team] = (vectorstore, signature)
+            return vectorstore
+
+    def reload(self, team: str = None):
+        """지정한 팀(없으면 전체) 벡터스토어를 닫고 다음 사용 시 다시 열도록 한다"""
+        with self._lock:
+            teams = [team] if team else list(self._stores)
+            for name in teams:
+                if self._stores.pop(name, None) is not None:
+                    _release_chroma_system(self.base_dir / name)
+
+    def warmup(self):
+        for team in DRIVE_URLS:
+            self.get(team)
+
+
+def _release_chroma_system(path: Path):
+    # chromadb 는 경로별 System 을 프로세스 전역에 캐시하므로, 재로드 전에 캐시에서 제거해야 새 파일을 읽는다
+    # (진행 중인 요청이 이전 핸들을 쓰고 있을 수 있으므로 stop 하지 않고 GC 에 맡김)
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+
+        SharedSystemClient._identifier_to_system.pop(str(path), None)
+    except Exception as e:
+        logger.warning(f"-------- chroma system release 실패: {path} ({e})")
+
+
+vectorstore_pool = VectorStorePool(DB_DIR, embedding_model)
+
+
+# 팀별 DB 다운로드(없을 때만) + 벡터스토어 오픈은 첫 사용 시 또는 서버 warmup 시 수행
+@component("team_vectorstores")
+def team_vectorstores():
+    if not os.path.isdir(DB_DIR):
+        create_chroma_db()
+    vectorstore_pool.warmup()
+    return vectorstore_pool
 
 
 # 툴 정의
@@ -81,9 +165,7 @@ def frontend_search(keyword: str) -> str:
     logger.info(f"-------- frontend search keyword: {keyword}")
     try:
         # frontend team 기반 검색 수행
-        vectorstore = Chroma(
-            persist_directory=DB_DIR / "frontend", embedding_function=embedding_model
-        )
+        vectorstore = team_vectorstores.get().get("frontend")
         docs = vectorstore.similarity_search(keyword, k=7)
         if not docs:
             logger.info(f"-------- frontend 관련된 답변을 찾지 못했습니다.")
@@ -110,9 +192,7 @@ def backend_search(keyword: str) -> str:
     logger.info(f"-------- backend search keyword: {keyword}")
     try:
         # backend team 기반 검색 수행
-        vectorstore = Chroma(
-            persist_directory=DB_DIR / "backend", embedding_function=embedding_model
-        )
+        vectorstore = team_vectorstores.get().get("backend")
         docs = vectorstore.similarity_search(keyword, k=7)
         if not docs:
             logger.info(f"-------- backend 관련된 답변을 찾지 못했습니다.")
@@ -139,9 +219,7 @@ def data_ai_search(keyword: str) -> str:
     logger.info(f"-------- data_ai search keyword: {keyword}")
     try:
         # data_ai team 기반 검색 수행
-        vectorstore = Chroma(
-            persist_directory=DB_DIR / "data_ai", embedding_function=embedding_model
-        )
+        vectorstore = team_vectorstores.get().get("data_ai")
         docs = vectorstore.similarity_search(keyword, k=7)
         if not docs:
             logger.info(f"-------- data_ai 관련된 답변을 찾지 못했습니다.")
@@ -168,9 +246,7 @@ def cto_search(keyword: str) -> str:
     logger.info(f"-------- cto search keyword: {keyword}")
     try:
         # cto 기반 검색 수행
-        vectorstore = Chroma(
-            persist_directory=DB_DIR / "cto", embedding_function=embedding_model
-        )
+        vectorstore = team_vectorstores.get().get("cto")
         docs = vectorstore.similarity_search(keyword, k=7)
         if not docs:
             logger.info(f"-------- cto 관련된 답변을 찾지 못했습니다.")
@@ -187,6 +263,191 @@ def cto_search(keyword: str) -> str:
         return f"cto 검색 중 오류 발생: {e}"
 
 
+# 대화 제목 요약 프롬프트
+TITLE_SYSTEM_PROMPT = """
+                다음 문장을 바탕으로 한국어로 **짧고 간결한 대화 제목**을 하나만 만들어라.
+                절대 원문 문장을 그대로 복사하지 말고, 핵심 주제를 명사 중심으로 추출하라.
+
+                규칙:                      
+                - 글자 수: 12자 이상, 24자 이하
+                - 반드시 명사/주제어 위주 (불필요한 수식어 제거)
+                - 이모지, 따옴표, 마침표, 물음표, 느낌표, 특수문자 금지
+                - 접두사·접미사, 괄호, 콜론 금지
+                - 문장 그대로 복사 후 붙여넣기 하지 말고, 핵심 키워드만 뽑아서 제목화
+                - 질문 원문을 절대 그대로 베끼지 말 것 (핵심 개념만 압축)
+                - 답변은 오직 제목 텍스트만 출력 (불필요한 설명·접두어 금지)
+                                        
+                예시:
+                - 입력: "코드노바의 API 서버 기술스택알려줘"
+                    출력: 코드노바의 API 서버 기술스택
+                - 입력: "코드노바의 캐시 만료 시간은 어떤 기준으로 설정해야 하나요?"
+                    출력: 코드노바의 캐시 만료 시간
+            """
+
+TOOL_CALL_TAG = "<tool_call>"
+TOOL_CALL_PATTERN = re.compile(r"<tool_call>\s*(\{.*?\})\s*</tool_call>", flags=re.S)
+THINK_TAGS = ("<think>", "</think>")
+
+
+def strip_think(text: str) -> str:
+    """<think>...</think> 구간과 짝이 맞지 않는 태그 제거"""
+    text = re.sub(r"<think>.*?</think>", "", text, flags=re.S)
+    text = text.replace("<think>", "").strip()
+    return text.replace("</think>", "").strip()
+
+
+def title_messages(history):
+    return [
+        SystemMessage(content=TITLE_SYSTEM_PROMPT),
+        HumanMessage(content=json.dumps(history, ensure_ascii=False)),
+    ]
+
+
+def clean_title(text: str) -> str:
+    title = re.sub(r"<think>.*?</think>", "", text.strip(), flags=re.S)
+    return title.replace("</think>", "").strip()
+
+
+def _partial_tag(text: str, tags) -> int:
+    """text 끝이 태그의 앞부분과 겹치는 길이 (다음 청크에서 태그가 완성될 수 있음)"""
+    for n in range(min(len(text), max(map(len, tags)) - 1), 0, -1):
+        if any(tag.startswith(text[-n:]) for tag in tags):
+            return n
+    return 0
+
+
+class ThinkStripper:
+    """
+    스트리밍 토큰에서 <think>...</think> 구간을 바로 제거 (strip_think 의 증분 버전)
+    - 태그가 청크 경계에 걸쳐도 처리하고, 짝이 없는 </think> 는 태그만 지운다
+    - 닫히지 않은 <think> 뒤 내용은 끝(flush)에서 태그만 빼고 돌려준다
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._thought = ""
+        self._thinking = False
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        out = []
+        while True:
+            if self._thinking:
+                idx, tag = self._buffer.find(THINK_TAGS[1]), THINK_TAGS[1]
+            else:
+                found = [(self._buffer.find(t), t) for t in THINK_TAGS]
+                found = [f for f in found if f[0] >= 0]
+                idx, tag = min(found) if found else (-1, None)
+
+            if idx < 0:
+                keep = len(self._buffer) - _partial_tag(self._buffer, THINK_TAGS)
+                if self._thinking:
+                    self._thought += self._buffer[:keep]
+                else:
+                    out.append(self._buffer[:keep])
+                self._buffer = self._buffer[keep:]
+                return "".join(out)
+
+            if self._thinking:  # 생각 구간 끝: 버림
+                self._thought = ""
+                self._thinking = False
+            else:
+                out.append(self._buffer[:idx])
+                self._thinking = tag == THINK_TAGS[0]
+            self._buffer = self._buffer[idx + len(tag) :]
+
+    def flush(self) -> str:
+        rest = self._thought + self._buffer if self._thinking else self._buffer
+        self._buffer, self._thought, self._thinking = "", "", False
+        return rest
+
+
+TITLE_STORE_SIZE = int(os.getenv("TITLE_STORE_SIZE", "1000"))  # 제목을 기억할 대화 수
+TITLE_WAIT_TIMEOUT = float(
+    os.getenv("TITLE_WAIT_TIMEOUT", "10")
+)  # 제목 조회 시 최대 대기(초)
+
+
+class TitleStore:
+    """
+    대화별 제목 생성 작업 (conversation_id → asyncio.Task), 최근 TITLE_STORE_SIZE 개만 유지
+    - 요청에 제목이 있거나 이미 만든 제목이 있으면 다시 생성하지 않는다
+    - conversation_id 가 없으면 저장하지 않고 그 요청 안에서만 사용
+    """
+
+    def __init__(self, max_entries: int = TITLE_STORE_SIZE):
+        self.max_entries = max_entries
+        self._tasks = OrderedDict()
+        self.counts = dict.fromkeys(["generated", "reused", "skipped", "failed"], 0)
+
+    def _done(self, task):
+        if task.cancelled() or task.exception() is not None:
+            self.counts["failed"] += 1
+            if not task.cancelled():
+                logger.warning(f"-------- title 생성 실패: {task.exception()}")
+
+    def start(self, request, generate):
+        if request.title:  # 클라이언트가 가진 확정 제목
+            self.counts["skipped"] += 1
+            return _completed(request.title)
+
+        cid = request.conversation_id
+        task = self._tasks.get(cid) if cid else None
+        if task is not None and not (task.done() and _failed(task)):
+            self.counts["reused"] += 1
+            self._tasks.move_to_end(cid)
+            return task
+
+        self.counts["generated"] += 1
+        task = asyncio.create_task(generate(request.history))
+        task.add_done_callback(self._done)
+        if cid:
+            self._tasks[cid] = task
+            self._tasks.move_to_end(cid)
+            while len(self._tasks) > self.max_entries:
+                self._tasks.popitem(last=False)
+        return task
+
+    async def result(self, request, task, wait=None):
+        """
+        wait=None: conversation_id 가 있으면 끝난 경우에만 제목, 아니면 None (나중에 조회)
+        """
+        if wait is None:
+            wait = not request.conversation_id
+        if not wait and not task.done():
+            return None
+        try:
+            return await asyncio.shield(task) if wait else task.result()
+        except Exception:
+            return None
+
+    async def get(self, conversation_id: str, timeout: float = TITLE_WAIT_TIMEOUT):
+        task = self._tasks.get(conversation_id)
+        if task is None:
+            return {"status": "unknown", "title": None}
+        try:
+            title = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            return {"status": "pending", "title": None}
+        except Exception:
+            return {"status": "failed", "title": None}
+        return {"status": "ready", "title": title}
+
+    def stats(self):
+        pending = sum(1 for t in self._tasks.values() if not t.done())
+        return {**self.counts, "stored": len(self._tasks), "pending": pending}
+
+
+def _completed(value):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(value)
+    return future
+
+
+def _failed(task):
+    return task.cancelled() or task.exception() is not None
+
+
 # 서비스 클래스
 class LangChainChatService:
     def __init__(self):
@@ -197,26 +458,26 @@ class LangChainChatService:
         self.model_name = os.getenv("VLLM_MODEL")
         self.api_key = os.getenv("VLLM_API_KEY")
 
-        # OpenAI 호환 LLM 초기화
+        # OpenAI 호환 LLM 초기화 (답변 / 제목 생성에 공유)
         self.llm = ChatOpenAI(
             model=self.model_name,
             openai_api_base=self.api_url,
             openai_api_key=self.api_key,
             temperature=0.0,
         )
+        self.titles = TitleStore()
+        register_stats("chat_title", self.titles.stats)
 
-    async def get_chat_response(self, request: ChatRequest) -> str:
+    def _build_state(self, request: ChatRequest):
+        """permission / tone 에 맞는 시스템 프롬프트 + 대화 기록 메시지, 사용할 툴"""
         history = request.history
         permission = request.permission
         tone = request.tone
-        logger.info(f"-------- Chat Request - Permission: {permission}, Tone: {tone}")
-        logger.info(f"-------- Chat History:{history}")
 
-        try:
-            # permission별 툴 선택
-            if permission == "cto":
-                tool_map = {"cto_search": cto_search}
-                tool_prompt = """사용자는 cto로서, 모든 팀의 문서를 열람할 수 있는 개발팀 최고 관리자입니다.
+        # permission별 툴 선택
+        if permission == "cto":
+            tool_map = {"cto_search": cto_search}
+            tool_prompt = """사용자는 cto로서, 모든 팀의 문서를 열람할 수 있는 개발팀 최고 관리자입니다.
                 당신은 <tools></tools> 안에 있는 tool을 호출하여 문서를 검색할 수 있습니다.
                 일상적인 질문(ex: 안녕, 안녕하세요, 반가워 등)의 경우, tool 호출 없이 바로 답변하세요.
 
@@ -233,9 +494,9 @@ class LangChainChatService:
                 <tool_call>
                 {"name": <function-name>, "arguments": <args-json-object>}'
                 </tool_call>"""
-            elif permission == "frontend":
-                tool_map = {"frontend_search": frontend_search}
-                tool_prompt = """
+        elif permission == "frontend":
+            tool_map = {"frontend_search": frontend_search}
+            tool_prompt = """
                                 사용자는 frontend(프론트엔드)팀에 속한 팀원입니다.
                 당신은 <tools></tools> 안에 있는 tool을 호출하여 문서를 검색할 수 있습니다.
                 일상적인 질문(ex: 안녕, 안녕하세요, 반가워 등)의 경우, tool 호출 없이 바로 답변하세요.
@@ -254,9 +515,9 @@ class LangChainChatService:
                 {"name": <function-name>, "arguments": <args-json-object>}'
                 </tool_call>
                                 """
-            elif permission == "backend":
-                tool_map = {"backend_search": backend_search}
-                tool_prompt = """
+        elif permission == "backend":
+            tool_map = {"backend_search": backend_search}
+            tool_prompt = """
                                 사용자는 backend(백엔드)팀에 속한 팀원입니다.
                 당신은 <tools></tools> 안에 있는 tool을 호출하여 문서를 검색할 수 있습니다.
                 일상적인 질문(ex: 안녕, 안녕하세요, 반가워 등)의 경우, tool 호출 없이 바로 답변하세요.
@@ -275,9 +536,9 @@ class LangChainChatService:
                 {"name": <function-name>, "arguments": <args-json-object>}'
                 </tool_call>
                                 """
-            elif permission == "data_ai":
-                tool_map = {"data_ai_search": data_ai_search}
-                tool_prompt = """
+        elif permission == "data_ai":
+            tool_map = {"data_ai_search": data_ai_search}
+            tool_prompt = """
                                 사용자는 Data AI(데이터 AI)팀에 속한 팀원입니다.
                 당신은 <tools></tools> 안에 있는 tool을 호출하여 문서를 검색할 수 있습니다.
                 일상적인 질문(ex: 안녕, 안녕하세요, 반가워 등)의 경우, tool 호출 없이 바로 답변하세요.
@@ -296,20 +557,20 @@ class LangChainChatService:
                 {"name": <function-name>, "arguments": <args-json-object>}'
                 </tool_call>
                                 """
-            else:
-                tool_map = {}
-                tool_prompt = f""
-            logger.info(f"-------- Tools Prompt: {tool_prompt}")
-
-            # 톤별 가이드
-            if tone == "formal":
-                tone_instruction = "정중하고 사무적인 어조"
-                tone_instruction2 = '"잘 모르겠습니다"'
-            elif tone == "informal":
-                tone_instruction = "가볍고 친근한 반말"
-                tone_instruction2 = '"잘 모르겠어"'
-
-            system_message = f"""
+        else:
+            tool_map = {}
+            tool_prompt = f""
+        logger.info(f"-------- Tools Prompt: {tool_prompt}")
+
+        # 톤별 가이드
+        if tone == "formal":
+            tone_instruction = "정중하고 사무적인 어조"
+            tone_instruction2 = '"잘 모르겠습니다"'
+        elif tone == "informal":
+            tone_instruction = "가볍고 친근한 반말"
+            tone_instruction2 = '"잘 모르겠어"'
+
+        system_message = f"""
             당신은 사내 지식을 활용하여 사용자의 질문에 정확하고 유용한 답변을 제공하는 코드노바의 사내 문서 AI 챗봇입니다.
 
             {tool_prompt}
@@ -324,13 +585,170 @@ class LangChainChatService:
             7. 사용자의 말투와 상관 없이, 반드시 {tone_instruction}로 답변해야 합니다.
             """
 
-            # 대화 기록 변환
-            state = [SystemMessage(content=system_message)]
-            for h in history:
-                if h["role"] == "user":
-                    state.append(HumanMessage(content=h["content"]))
-                elif h["role"] == "assistant":
-                    state.append(AIMessage(content=h["content"]))
+        # 대화 기록 변환
+        state = [SystemMessage(content=system_message)]
+        for h in history:
+            if h["role"] == "user":
+                state.append(HumanMessage(content=h["content"]))
+            elif h["role"] == "assistant":
+                state.append(AIMessage(content=h["content"]))
+
+        return state, tool_map
+
+    @staticmethod
+    def _parse_tool_calls(matches):
+        extra_calls = []
+        for m in matches:
+            try:
+                extra_calls.append(json.loads(m))
+            except json.JSONDecodeError as e:
+                logger.warning(f"Tool call JSON decode 실패: {m} ({e})")
+        logger.info(f"-------- LLM Tools Match : {len(extra_calls)}")
+        return extra_calls
+
+    @staticmethod
+    def _run_tools(extra_calls, tool_map) -> str:
+        tool_results = []
+        for call in extra_calls:
+            tool_name = call["name"]
+            tool_func = tool_map.get(tool_name)
+            if tool_func:
+                result = tool_func.invoke(call["arguments"])
+                tool_results.append(f"<tool_response>{result}</tool_response>")
+                logger.info(f"-------- {tool_name} tool Response Success")
+            else:
+                result = None
+                tool_results.append(f"<tool_response>{result}</tool_response>")
+                logger.info(f"-------- {tool_name} tool Response Fail")
+        return "\n".join(tool_results)
+
+    async def agenerate_title(self, history) -> str:
+        title_res = await self.llm.ainvoke(title_messages(history))
+        return clean_title(title_res.content)
+
+    async def _astream_answer(self, state, result, detect_tool_call=False):
+        """
+        LLM 응답을 스트리밍하며 <think> 구간을 뺀 답변 조각을 yield
+        - 응답 원문은 result["raw"], 조각을 하나라도 보냈는지는 result["sent"] 에 기록
+        - detect_tool_call: <tool_call> 로 시작하는(또는 중간에 나온) 부분부터는 보내지 않는다
+        """
+        stripper = ThinkStripper()
+        raw, text, sent = "", "", None
+        result["sent"] = False
+        async for chunk in self.llm.astream(state):
+            raw += chunk.content
+            text += stripper.feed(chunk.content)
+            if detect_tool_call and TOOL_CALL_TAG in text:
+                continue
+            lead = len(text) - len(text.lstrip())
+            end = len(text)
+            if detect_tool_call:  # "<tool" 처럼 태그가 만들어지는 중이면 기다린다
+                end -= _partial_tag(text, (TOOL_CALL_TAG,))
+            if sent is None:
+                if end <= lead:
+                    continue
+                sent = lead
+            if end > sent:
+                result["sent"] = True
+                yield text[sent:end]
+                sent = end
+
+        result["raw"] = raw
+        if detect_tool_call and TOOL_CALL_PATTERN.search(raw):
+            return
+        text += stripper.flush()
+        rest = text[sent:] if sent is not None else text.lstrip()
+        if rest.rstrip():
+            result["sent"] = True
+            yield rest.rstrip()
+
+    async def stream_chat_response(self, request: ChatRequest):
+        """
+        get_chat_response 스트리밍 버전, 아래 이벤트를 순서대로 yield
+        - {"type": "tool_call", "names"}: 문서 검색 시작
+        - {"type": "reset"}: 앞서 보낸 토큰은 툴 호출 응답이었음 → 지우고 다시 표시
+        - {"type": "token", "content"}: <think> 구간을 뺀 답변 토큰
+        - {"type": "done", "response", "tool_calls", "tool_responses"}: /chat 과 같은 값
+        - {"type": "title", "title"}: 답변과 동시에 생성한 대화 제목 (마지막)
+        - {"type": "error", "message"}
+        """
+        logger.info(
+            f"-------- Chat Stream Request - Permission: {request.permission}, Tone: {request.tone}"
+        )
+        title_task = None
+        try:
+            state, tool_map = self._build_state(request)
+            # 제목은 답변을 기다리지 않고 대화 내역만으로 동시에 생성
+            title_task = self.titles.start(request, self.agenerate_title)
+
+            tool_calls = ""
+            tool_responses = ""
+
+            # 1차 호출: 툴 호출이 아니면 이 응답이 곧 최종 답변
+            result = {}
+            async for piece in self._astream_answer(
+                state, result, detect_tool_call=True
+            ):
+                yield {"type": "token", "content": piece}
+            state.append(AIMessage(content=result["raw"]))
+
+            matches = TOOL_CALL_PATTERN.findall(result["raw"])
+            if matches:
+                tool_calls = result["raw"]
+            extra_calls = self._parse_tool_calls(matches)
+
+            if extra_calls:
+                if result["sent"]:
+                    yield {"type": "reset"}
+                yield {
+                    "type": "tool_call",
+                    "names": [c.get("name") for c in extra_calls],
+                }
+                tool_responses = await asyncio.to_thread(
+                    self._run_tools, extra_calls, tool_map
+                )
+                state.append(HumanMessage(content=tool_responses))
+
+                # 툴 결과 반영 후 재호출
+                result = {}
+                async for piece in self._astream_answer(state, result):
+                    yield {"type": "token", "content": piece}
+
+            assistant_reply = strip_think(result["raw"])
+            logger.info("-------- Final Assistant Reply Streamed")
+            yield {
+                "type": "done",
+                "response": assistant_reply,
+                "tool_calls": tool_calls,
+                "tool_responses": tool_responses,
+            }
+
+            yield {
+                "type": "title",
+                "title": await self.titles.result(request, title_task, wait=True),
+            }
+
+        except Exception as e:
+            if title_task is not None and not request.conversation_id:
+                title_task.cancel()
+            logger.exception("-------- chat stream 실패")
+            yield {
+                "type": "error",
+                "message": f"Failed to get response from AI: {str(e)}",
+            }
+
+    async def get_chat_response(self, request: ChatRequest) -> str:
+        history = request.history
+        permission = request.permission
+        tone = request.tone
+        logger.info(f"-------- Chat Request - Permission: {permission}, Tone: {tone}")
+        logger.info(f"-------- Chat History:{history}")
+
+        # 제목은 답변과 동시에 백그라운드로 생성 (이미 확정된 제목이 있으면 생략)
+        title_task = self.titles.start(request, self.agenerate_title)
+
+        try:
+            state, tool_map = self._build_state(request)
 
             # LLM한테 Tool Call 호출을 확인한다.
             """
@@ -339,9 +757,7 @@ class LangChainChatService:
             형식을 리턴한다.
             """
 
-
-
-            llm_tool = self.llm.invoke(state)
+            llm_tool = await self.llm.ainvoke(state)
             logger.info("-------- LLM Tool Parse Response Success")
             state.append(llm_tool)
 
@@ -351,37 +767,18 @@ class LangChainChatService:
             # <tool_call> 분석
             assistant_reply = state[-1].content
 
-            matches = re.findall(
-                r"<tool_call>\s*(\{.*?\})\s*</tool_call>", assistant_reply, flags=re.S
-            )
+            matches = TOOL_CALL_PATTERN.findall(assistant_reply)
 
             if matches:
                 tool_calls = assistant_reply
 
-            extra_calls = []
-            for m in matches:
-                try:
-                    extra_calls.append(json.loads(m))
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Tool call JSON decode 실패: {m} ({e})")
-            logger.info(f"-------- LLM Tools Match : {len(extra_calls)}")
+            extra_calls = self._parse_tool_calls(matches)
 
             if extra_calls:
-                tool_results = []
-                for call in extra_calls:
-                    tool_name = call["name"]
-                    tool_func = tool_map.get(tool_name)
-                    if tool_func:
-                        result = tool_func.invoke(call["arguments"])
-                        tool_results.append(f"<tool_response>{result}</tool_response>")
-                        logger.info(f"-------- {tool_name} tool Response Success")
-                    else:
-                        result = None
-                        tool_results.append(f"<tool_response>{result}</tool_response>")
-                        logger.info(f"-------- {tool_name} tool Response Fail")
-
                 # 여러 개 결과를 하나의 메시지로 합치기
-                combined_result = "\n".join(tool_results)
+                combined_result = await asyncio.to_thread(
+                    self._run_tools, extra_calls, tool_map
+                )
                 tool_responses = combined_result
                 state.append(
                     HumanMessage(
@@ -389,67 +786,26 @@ class LangChainChatService:
                     )
                 )
                 # 툴 결과 반영 후 재호출
-                llm_res = self.llm.invoke(state)
+                llm_res = await self.llm.ainvoke(state)
                 state.append(llm_res)
 
             # 최종 답변 정리
-            assistant_reply = state[-1].content
-            assistant_reply = re.sub(
-                r"<think>.*?</think>", "", assistant_reply, flags=re.S
-            )
-            assistant_reply = assistant_reply.replace("<think>", "").strip()
-            assistant_reply = assistant_reply.replace("</think>", "").strip()
+            assistant_reply = strip_think(state[-1].content)
 
             logger.info("-------- Final Assistant Reply Generated")
             logger.info(f"-------- {assistant_reply}")
 
-            # 제목 요약 생성
-            title_llm = ChatOpenAI(
-                model=self.model_name,
-                openai_api_base=self.api_url,
-                openai_api_key=self.api_key,
-                temperature=0.0,
-            )
-
-            title_system_prompt = f"""
-                다음 문장을 바탕으로 한국어로 **짧고 간결한 대화 제목**을 하나만 만들어라.
-                절대 원문 문장을 그대로 복사하지 말고, 핵심 주제를 명사 중심으로 추출하라.
-
-                규칙:                      
-                - 글자 수: 12자 이상, 24자 이하
-                - 반드시 명사/주제어 위주 (불필요한 수식어 제거)
-                - 이모지, 따옴표, 마침표, 물음표, 느낌표, 특수문자 금지
-                - 접두사·접미사, 괄호, 콜론 금지
-                - 문장 그대로 복사 후 붙여넣기 하지 말고, 핵심 키워드만 뽑아서 제목화
-                - 질문 원문을 절대 그대로 베끼지 말 것 (핵심 개념만 압축)
-                - 답변은 오직 제목 텍스트만 출력 (불필요한 설명·접두어 금지)
-                                        
-                예시:
-                - 입력: "코드노바의 API 서버 기술스택알려줘"
-                    출력: 코드노바의 API 서버 기술스택
-                - 입력: "코드노바의 캐시 만료 시간은 어떤 기준으로 설정해야 하나요?"
-                    출력: 코드노바의 캐시 만료 시간
-            """
-
-            title_prompt = [
-                SystemMessage(content=title_system_prompt),
-                HumanMessage(
-                    content=json.dumps(
-                        history + [{"role": "assistant", "content": assistant_reply}],
-                        ensure_ascii=False,
-                    )
-                ),
-            ]
-
-            title_res = title_llm.invoke(title_prompt)
-            title = title_res.content.strip()
-            title = re.sub(r"<think>.*?</think>", "", title, flags=re.S)
-            title = title.replace("</think>", "").strip()
+            # 제목: conversation_id 가 있으면 기다리지 않음 (나중에 /chat/title/{id} 로 조회)
+            title = await self.titles.result(request, title_task)
 
             return assistant_reply, title, tool_calls, tool_responses
 
         except Exception as e:
+            if not request.conversation_id:
+                title_task.cancel()
             raise Exception(f"Failed to get response from AI: {str(e)}")
 
 
-chat_service = LangChainChatService()
+@component("chat_service")
+def chat_service():
+    return LangChainChatService()
@@ -1,34 +1,126 @@
 from models.chat_model import ChatRequest2
 
+from services.utils.answer_cache import answer_cache
+from services.utils.components import component
 from services.utils.langgraph_setting2 import graph_setting
+import asyncio
 import traceback
 
-graph = graph_setting()
+
+# 비동기 노드 그래프: 요청 처리 중에도 이벤트 루프(/health 등)가 막히지 않음
+@component("chat2_graph")
+def chat2_graph():
+    return graph_setting(use_async=True)
+
+
+# 스트리밍 시 진행 상황을 알릴 노드 / 답변 토큰을 내보낼 노드
+PROGRESS_NODES = {
+    "analyze_image": "이미지 분석",
+    "classify": "질문 분류",
+    "extract_queries": "질문 정리",
+    "split_queries": "검색 쿼리 생성",
+    "tool": "문서 검색",
+    "basic": "답변 생성",
+    "simple": "답변 생성",
+    "impossible": "답변 생성",
+    "evaluate": "답변 평가",
+    "generate_queries": "추가 검색 준비",
+}
+ANSWER_NODES = {"basic", "simple", "impossible"}
+
+
+def _used_tags(result):
+    # 이번 답변을 만들 때 검색에 사용한 API 태그 (캐시 무효화용)
+    return [
+        tag
+        for call in result.get("tool_calls") or []
+        for tag in call.get("args", {}).get("api_tags") or []
+    ]
+
+
+async def _has_image_context(config):
+    # 이전 턴에 첨부한 이미지의 분석 결과는 thread state 에 남아 이번 답변에도 쓰인다
+    graph = await chat2_graph.aget()
+    snapshot = await graph.aget_state(config)
+    return bool(snapshot.values.get("image_analysis"))
+
+
+async def _cache_lookup(user_input, image, chat_history, config):
+    """
+    의미 기반 답변 캐시 조회: 비슷한 질문에 good 평가를 받은 답변이 있으면 그래프 생략
+    반환: (cache, probe, 캐시된 답변 또는 None)
+    """
+    try:
+        cache = await answer_cache.aget()
+    except Exception as e:  # 캐시를 못 열어도 답변은 계속 생성
+        print(f"answer cache 사용 불가: {str(e)}")
+        return None, None, None
+    if cache is None:
+        return None, None, None
+    # 이미지 질문 / 이전 턴 이미지 문맥이 있는 대화는 캐시하지 않음
+    # (다른 사용자의 스크린샷으로 만든 답변이 다른 대화에 나가지 않도록)
+    if image or await _has_image_context(config):
+        cache.skip()
+        return cache, None, None
+
+    probe = await asyncio.to_thread(cache.probe, user_input, chat_history)
+    hit = await asyncio.to_thread(cache.lookup, probe)
+    if hit:
+        print(f"answer cache hit (유사도 {hit['similarity']:.3f}): {hit['question']}")
+        if cache.shadow:  # 캐시 답변은 쓰지 않고, 새 답변과 비교하도록 기억
+            probe["shadow_hit"] = hit
+            return cache, probe, None
+        return cache, probe, hit["answer"]
+    return cache, probe, None
+
+
+async def _cache_store(cache, probe, result):
+    if probe is None:
+        return
+    if result.get("image_analysis"):  # 이번 턴에서 이미지 문맥이 생긴 경우
+        cache.skip()
+        return
+    if probe.get("shadow_hit"):
+        try:
+            await asyncio.to_thread(cache.compare, probe["shadow_hit"], result)
+        except Exception as e:  # 비교 실패는 답변에 영향 없음
+            print(f"answer cache shadow 비교 실패: {str(e)}")
+    if result.get("answer_quality") == "good":
+        await asyncio.to_thread(cache.store, probe, result["answer"], _used_tags(result))
+    else:
+        cache.skip()
+
+
+def _graph_inputs(request: ChatRequest2):
+    # chat_history가 None이면 빈 리스트로 초기화
+    state = {
+        "messages": request.chat_history or [],
+        "question": request.user_input,
+        "image": request.image,
+        "retry": False,
+    }
+    return state, {"configurable": {"thread_id": request.config_id}}
+
 
 async def run_langraph(request: ChatRequest2):
         user_input = request.user_input
-        config_id = request.config_id
         image = request.image
-        chat_history = request.chat_history
 
         try:
-            config = {"configurable": {"thread_id": config_id}}
-
-            # chat_history가 None이면 빈 리스트로 초기화
-            if chat_history is None:
-                chat_history = []
+            state, config = _graph_inputs(request)
 
             print(f"run_langraph 호출 - 입력: {user_input}, 이미지: {bool(image)}")
 
-            result = graph.invoke(
-                {
-                    "messages": chat_history,
-                    "question": user_input,
-                    "image": image,
-                    "retry": False,
-                },
-                config=config,
+            cache, probe, cached = await _cache_lookup(
+                user_input, image, state["messages"], config
             )
+            if cached is not None:
+                return cached
+
+            graph = await chat2_graph.aget()
+            result = await graph.ainvoke(state, config=config)
+
+            await _cache_store(cache, probe, result)
 
             return result["answer"]
 
@@ -40,3 +132,77 @@ async def run_langraph(request: ChatRequest2):
             return f"처리 중 오류가 발생했습니다: {str(e)}"
 
 
+async def stream_langraph(request: ChatRequest2):
+    """
+    /chat2 스트리밍 버전 (astream_events 기반), 아래 이벤트를 순서대로 yield
+    - {"type": "progress", "node", "label", "status": "start" | "end", ...}
+    - {"type": "answer_start", "attempt"}: 답변 생성 시작 (재시도 시 이전 토큰은 버림)
+    - {"type": "token", "content"}: 답변 토큰
+    - {"type": "done", "answer", "cached"}: 최종 답변 (run_langraph 반환값과 동일)
+    - {"type": "error", "message"}
+    """
+    try:
+        state, config = _graph_inputs(request)
+        print(f"stream_langraph 호출 - 입력: {request.user_input}, 이미지: {bool(request.image)}")
+
+        cache, probe, cached = await _cache_lookup(
+            request.user_input, request.image, state["messages"], config
+        )
+        if cached is not None:
+            yield {"type": "token", "content": cached}
+            yield {"type": "done", "answer": cached, "cached": True}
+            return
+
+        graph = await chat2_graph.aget()
+        result, attempt, streamed = None, 0, False
+
+        async for event in graph.astream_events(state, config=config, version="v2"):
+            kind = event["event"]
+            name = event.get("name")
+            node = event.get("metadata", {}).get("langgraph_node")
+
+            if kind == "on_chat_model_stream" and node in ANSWER_NODES:
+                content = event["data"]["chunk"].content
+                if content:
+                    streamed = True
+                    yield {"type": "token", "content": content}
+
+            elif kind in ("on_chain_start", "on_chain_end") and name == node:
+                if name not in PROGRESS_NODES:
+                    continue
+                status = "start" if kind == "on_chain_start" else "end"
+                output = event["data"].get("output") if status == "end" else None
+                progress = {
+                    "type": "progress",
+                    "node": name,
+                    "label": PROGRESS_NODES[name],
+                    "status": status,
+                }
+                if isinstance(output, dict):
+                    if name == "classify":
+                        progress["classify"] = output.get("classify")
+                    elif name == "evaluate":
+                        progress["answer_quality"] = output.get("answer_quality")
+                yield progress
+
+                if name in ANSWER_NODES and status == "start":
+                    attempt += 1
+                    streamed = False
+                    yield {"type": "answer_start", "attempt": attempt}
+                # LLM 캐시 적중 등으로 토큰이 흐르지 않았으면 답변 전체를 한 번에 보냄
+                elif name in ANSWER_NODES and not streamed and isinstance(output, dict):
+                    yield {"type": "token", "content": output.get("answer", "")}
+
+            elif kind == "on_chain_end" and name == "LangGraph":
+                result = event["data"].get("output")
+
+        if not isinstance(result, dict):  # 최종 상태를 이벤트에서 못 받은 경우
+            result = (await graph.aget_state(config)).values
+
+        await _cache_store(cache, probe, result)
+        yield {"type": "done", "answer": result["answer"], "cached": False}
+
+    except Exception as e:
+        print(f"stream_langraph 에러: {str(e)}")
+        traceback.print_exc()
+        yield {"type": "error", "message": f"처리 중 오류가 발생했습니다: {str(e)}"}
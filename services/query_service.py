@@ -1,8 +1,11 @@
+import asyncio
 import json
 import chromadb
-from chromadb.utils import embedding_functions
 
 from models.query_model import QueryRequest
+from services.utils.components import component
+from services.utils.embedding_cache import get_shared_embeddings
+from services.utils.retriever import text_vectorstore
 
 
 from pathlib import Path
@@ -13,25 +16,19 @@ CHROMA_DIR = SERVICES_DIR / "utils" / "chroma_db"
 CHROMA_DIR.mkdir(parents=True, exist_ok=True)
 
 
-collection = None
 doc_ids = []
 doc_texts = []
-okt = None
 
 
-def ensure_search_initialized():
-    global collection
-
-    if collection is not None:
-        return
-
+@component("query_collection")
+def query_collection():
+    # chroma_db 는 vectorstore_text 가 (없으면 드라이브에서) 내려받으므로 먼저 로드
+    # (먼저 열면 빈 chroma.sqlite3 를 만들어 그 클라이언트가 캐시됨)
+    text_vectorstore.get()
     client = chromadb.PersistentClient(path=str(CHROMA_DIR))
 
-    emb = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="BAAI/bge-m3",
-        device="cpu",
-    )
-    collection = client.get_collection(name="google_api_docs", embedding_function=emb)
+    # 쿼리 임베딩은 공유 bge-m3 캐시로 직접 계산해서 넘긴다 (search_dense 참고)
+    return client.get_collection(name="google_api_docs")
 
 
 def normalize_meta(meta, default_doc=""):  # Chroma 메타데이터 정리
@@ -71,9 +68,12 @@ async def search_dense(request: QueryRequest):
     q = request.q
     k = request.k
 
-    ensure_search_initialized()
-    res = collection.query(
-        query_texts=[q],
+    collection = await query_collection.aget()
+    # 임베딩(첫 요청이면 bge-m3 로딩 포함) / Chroma 조회는 이벤트 루프 밖에서 실행
+    vector = await asyncio.to_thread(lambda: get_shared_embeddings().embed_query(q))
+    res = await asyncio.to_thread(
+        collection.query,
+        query_embeddings=[vector],
         n_results=k * 2,
         include=["documents", "metadatas"],
     )
@@ -0,0 +1,327 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .components import component
+from .embedding_cache import get_shared_embeddings, normalize_text
+from .metrics import register_stats
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "off")  # off | memory | sqlite
+# true 면 적중해도 답변을 새로 생성하고 캐시 답변과 비교만 (임계값 검증용)
+# 실제 트래픽에서 적중 품질을 확인하기 전까지는 shadow 가 기본 (false 로 바꿔야 캐시 답변 사용)
+ANSWER_CACHE_SHADOW = os.getenv("ANSWER_CACHE_SHADOW", "true").lower() == "true"
+ANSWER_CACHE_PATH = os.getenv(
+    "ANSWER_CACHE_PATH", os.path.join(HERE, "answer_cache.sqlite3")
+)
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))  # 초, 0 이면 만료 없음
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+# 키에 넣을 이전 사용자 질문 수
+ANSWER_CACHE_HISTORY = int(os.getenv("ANSWER_CACHE_HISTORY", "2"))
+# 지정하면 shadow 적중(캐시 답변 / 새 답변 비교)을 JSONL 로 기록
+ANSWER_CACHE_LOG = os.getenv("ANSWER_CACHE_LOG")
+
+# 질문에 언급된 API → 캐시 scope (rag2 의 11가지 API 주제)
+# "Drive 파일 권한" 과 "Gmail 파일 권한" 처럼 임베딩은 비슷해도 API 가 다르면 다른 scope
+API_KEYWORDS = {
+    "map": ("google map", "maps", "지도", "구글맵", "구글 맵"),
+    "firestore": ("firestore", "파이어스토어"),
+    "drive": ("drive", "드라이브"),
+    "firebase_authentication": ("firebase", "파이어베이스"),
+    "gmail": ("gmail", "지메일", "메일"),
+    "google_identity": ("identity", "oauth", "구글 인증", "구글 로그인"),
+    "calendar": ("calendar", "캘린더", "일정"),
+    "bigquery": ("bigquery", "빅쿼리"),
+    "sheets": ("sheets", "spreadsheet", "스프레드시트", "시트"),
+    "people": ("people api", "피플", "연락처"),
+    "youtube": ("youtube", "유튜브"),
+}
+
+
+def mentioned_tags(text: str) -> List[str]:
+    lowered = (text or "").lower()
+    return sorted(
+        tag
+        for tag, words in API_KEYWORDS.items()
+        if any(word in lowered for word in words)
+    )
+
+
+def _recent_questions(history: List[Dict], n: int) -> List[str]:
+    """히스토리에서 최근 사용자 질문 n 개 (role 이 없으면 그대로 사용)"""
+    if n <= 0:
+        return []
+    questions = [
+        str(m.get("content", ""))
+        for m in history or []
+        if isinstance(m, dict) and m.get("role", "user") == "user"
+    ]
+    return questions[-n:]
+
+
+class SemanticAnswerCache:
+    """
+    /chat2 의미 기반 답변 캐시
+    - 키: (최근 질문 + 이번 질문) bge-m3 임베딩, 질문에 언급된 API 로 scope 구분
+    - 같은 scope 에서 코사인 유사도가 threshold 이상인 가장 가까운 답변을 반환
+    - answer_quality == "good" 인 답변만 저장, TTL / 최대 개수(LRU) 로 제거
+    - 검색은 메모리 행렬로 하고, path 를 주면 SQLite 에도 저장해서 재시작 후에도 유지
+    - shadow: 적중해도 캐시 답변을 쓰지 않고, 새로 만든 답변과의 유사도만 기록
+    """
+
+    def __init__(
+        self,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: int = ANSWER_CACHE_TTL,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        history_turns: int = ANSWER_CACHE_HISTORY,
+        path: Optional[str] = None,
+        shadow: bool = ANSWER_CACHE_SHADOW,
+        log_path: Optional[str] = ANSWER_CACHE_LOG,
+        embeddings=None,
+    ):
+        self.threshold = threshold
+        self.shadow = shadow
+        self.log_path = log_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.history_turns = history_turns
+        self.embeddings = embeddings or get_shared_embeddings()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._index = None  # (ids, scopes, 벡터 행렬) - 저장 / 삭제 시 다시 만든다
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(
+            ["lookups", "hits", "misses", "stores", "skipped", "evictions", "expired"],
+            0,
+        )
+        self._shadow_counts = dict.fromkeys(["compared", "good"], 0)
+        self._shadow_similarity = 0.0  # 캐시 답변 / 새 답변 코사인 유사도 합
+
+        self.path = path
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "id TEXT PRIMARY KEY, scope TEXT, question TEXT, answer TEXT, "
+                "tags TEXT, vector BLOB, created REAL, last_used REAL, hits INTEGER)"
+            )
+            self._db.commit()
+            self._load()
+
+    def _load(self):
+        columns = ["id", "scope", "question", "answer", "tags", "vector"]
+        columns += ["created", "last_used", "hits"]
+        for row in self._db.execute(f"SELECT {', '.join(columns)} FROM answers"):
+            entry = dict(zip(columns, row))
+            entry["tags"] = json.loads(entry["tags"])
+            entry["vector"] = np.frombuffer(entry["vector"], dtype=np.float32)
+            self._entries[entry.pop("id")] = entry
+        with self._lock:
+            self._expire(time.time())
+            self._evict()
+        logger.info(f"-------- answer cache: {len(self._entries)}개 로드 ({self.path})")
+
+    # ------------------------------------------------------------ 내부 관리
+    def _remove(self, entry_ids):
+        for entry_id in entry_ids:
+            self._entries.pop(entry_id, None)
+        if entry_ids:
+            self._index = None
+            if self._db:
+                self._db.executemany(
+                    "DELETE FROM answers WHERE id = ?", [(i,) for i in entry_ids]
+                )
+                self._db.commit()
+
+    def _expire(self, now):
+        if self.ttl <= 0:
+            return
+        expired = [i for i, e in self._entries.items() if now - e["created"] > self.ttl]
+        self._counts["expired"] += len(expired)
+        self._remove(expired)
+
+    def _evict(self):
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            oldest = sorted(self._entries, key=lambda i: self._entries[i]["last_used"])
+            self._counts["evictions"] += overflow
+            self._remove(oldest[:overflow])
+
+    def _matrix(self):
+        if self._index is None:
+            ids = list(self._entries)
+            scopes = np.array([self._entries[i]["scope"] for i in ids], dtype=object)
+            vectors = (
+                np.stack([self._entries[i]["vector"] for i in ids])
+                if ids
+                else np.zeros((0, 0), dtype=np.float32)
+            )
+            self._index = (ids, scopes, vectors)
+        return self._index
+
+    # --------------------------------------------------------------- 공개 API
+    def probe(self, question: str, history: List[Dict]) -> Dict[str, Any]:
+        """조회 / 저장에 쓸 키 (scope + 임베딩) 계산 - 임베딩은 한 번만 한다"""
+        context = _recent_questions(history, self.history_turns)
+        text = normalize_text("\n".join(context + [question]))
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        return {
+            "text": text,
+            "scope": ",".join(mentioned_tags(text)),
+            "vector": vector / (np.linalg.norm(vector) or 1.0),
+        }
+
+    def lookup(self, probe: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            self._counts["lookups"] += 1
+            self._expire(now)
+            ids, scopes, vectors = self._matrix()
+
+            best = None
+            if ids:
+                sims = vectors @ probe["vector"]
+                sims[scopes != probe["scope"]] = -1.0
+                row = int(np.argmax(sims))
+                if sims[row] >= self.threshold:
+                    best = self._entries[ids[row]]
+                    best["last_used"] = now
+                    best["hits"] += 1
+                    if self._db:
+                        self._db.execute(
+                            "UPDATE answers SET last_used = ?, hits = ? WHERE id = ?",
+                            (now, best["hits"], ids[row]),
+                        )
+                        self._db.commit()
+                    best = {**best, "similarity": float(sims[row])}
+
+            self._counts["hits" if best else "misses"] += 1
+            return best
+
+    def store(self, probe: Dict[str, Any], answer: str, tags: List[str]):
+        now = time.time()
+        entry_id = hashlib.sha1(
+            f"{probe['scope']}\n{probe['text']}".encode("utf-8")
+        ).hexdigest()
+        entry = {
+            "scope": probe["scope"],
+            "question": probe["text"],
+            "answer": answer,
+            "tags": sorted(set(tags)),
+            "vector": probe["vector"],
+            "created": now,
+            "last_used": now,
+            "hits": 0,
+        }
+        with self._lock:
+            self._entries[entry_id] = entry
+            self._index = None
+            self._counts["stores"] += 1
+            if self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        entry_id,
+                        entry["scope"],
+                        entry["question"],
+                        answer,
+                        json.dumps(entry["tags"]),
+                        probe["vector"].astype(np.float32).tobytes(),
+                        now,
+                        now,
+                        0,
+                    ),
+                )
+                self._db.commit()
+            self._evict()
+
+    def compare(self, hit: Dict[str, Any], result: Dict[str, Any]):
+        """shadow 적중: 캐시 답변과 이번에 새로 만든 답변 비교 (임계값 검증용)"""
+        answer = result.get("answer") or ""
+        vectors = np.asarray(
+            self.embeddings.embed_documents([hit["answer"], answer]), dtype=np.float32
+        )
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        similarity = float(vectors[0] @ vectors[1])
+        good = result.get("answer_quality") == "good"
+        with self._lock:
+            self._shadow_counts["compared"] += 1
+            self._shadow_counts["good"] += good
+            self._shadow_similarity += similarity
+        if self.log_path:
+            row = {
+                "time": time.time(),
+                "question": result.get("question"),
+                "cached_question": hit["question"],
+                "similarity": hit["similarity"],
+                "answer_similarity": similarity,
+                "answer_quality": result.get("answer_quality"),
+            }
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def skip(self):
+        """캐시 대상이 아닌 요청 / 답변 (이미지 포함, 품질 good 아님) 집계"""
+        with self._lock:
+            self._counts["skipped"] += 1
+
+    def invalidate(self, tags: Optional[List[str]] = None) -> int:
+        """API 문서가 바뀌었을 때 해당 태그(scope 또는 검색에 쓴 태그)의 답변 삭제, None 이면 전체"""
+        with self._lock:
+            targets = [
+                i
+                for i, e in self._entries.items()
+                if tags is None
+                or set(tags)
+                & (set(e["tags"]) | set(filter(None, e["scope"].split(","))))
+            ]
+            self._remove(targets)
+            return len(targets)
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            shadow = dict(self._shadow_counts)
+            similarity = self._shadow_similarity
+            size = len(self._entries)
+        lookups = counts["lookups"]
+        compared = shadow["compared"]
+        return {
+            **counts,
+            "hit_rate": counts["hits"] / lookups if lookups else 0.0,
+            "size": size,
+            "backend": "sqlite" if self._db else "memory",
+            "threshold": self.threshold,
+            "shadow": self.shadow,
+            # shadow 적중에서 새 답변과 캐시 답변의 평균 유사도 / 새 답변이 good 인 비율
+            "shadow_compared": compared,
+            "shadow_answer_similarity": similarity / compared if compared else None,
+            "shadow_good_rate": shadow["good"] / compared if compared else None,
+        }
+
+
+@component("answer_cache", required=False)
+def answer_cache():
+    """ANSWER_CACHE=off 이면 None (캐시 사용 안 함)"""
+    if ANSWER_CACHE == "off":
+        return None
+    cache = SemanticAnswerCache(
+        path=ANSWER_CACHE_PATH if ANSWER_CACHE == "sqlite" else None
+    )
+    register_stats("answer_cache", cache.stats)
+    return cache
@@ -0,0 +1,230 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Sequence, Tuple
+
+from dotenv import load_dotenv
+from langgraph.checkpoint.memory import InMemorySaver
+
+from .metrics import register_stats
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "memory")  # memory | sqlite
+CHECKPOINT_MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "1000"))
+# 마지막 턴 이후 이 시간(초)이 지난 대화는 삭제 (0 이면 시간으로는 삭제 안 함)
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", "3600"))
+# 대화(thread)별로 남길 체크포인트 수 (다음 턴에는 마지막 체크포인트만 사용)
+CHECKPOINT_HISTORY = int(os.getenv("CHECKPOINT_HISTORY", "3"))
+# 저장 시 무거운 값(검색 결과 본문이 든 tool_calls, 원본 이미지 등) 제거
+CHECKPOINT_COMPACT = os.getenv("CHECKPOINT_COMPACT", "true").lower() == "true"
+CHECKPOINT_SQLITE_PATH = os.getenv("CHECKPOINT_SQLITE_PATH", "checkpoints.sqlite")
+
+TOP_THREADS = 10  # /metrics 에 보여줄 메모리 사용량 상위 대화 수
+
+
+def _drop_results(calls):
+    return [
+        (
+            {k: v for k, v in call.items() if k != "result"}
+            if isinstance(call, dict)
+            else call
+        )
+        for call in calls
+    ]
+
+
+# 채널(ChatState 키) → 저장용으로 줄이는 함수
+# 모두 턴마다 입력으로 다시 받거나 그 턴 안에서 다시 계산하는 값이라 다음 턴에 영향 없음
+COMPACT_CHANNELS = {
+    "tool_calls": _drop_results,  # 검색 결과 본문은 search_results 에 이미 있음
+    "image": lambda _: None,  # 원본 이미지 (분석 결과 image_analysis 는 유지)
+    "context": lambda _: {},
+    "context_scores": lambda _: {},
+    "chunk_ids": lambda _: {},
+}
+
+
+def compact_values(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        k: COMPACT_CHANNELS[k](v) if v and k in COMPACT_CHANNELS else v
+        for k, v in values.items()
+    }
+
+
+def compact_checkpoint(checkpoint):
+    return {
+        **checkpoint,
+        "channel_values": compact_values(checkpoint["channel_values"]),
+    }
+
+
+def compact_writes(writes: Sequence[Tuple[str, Any]]):
+    return [
+        (
+            (channel, COMPACT_CHANNELS[channel](value))
+            if value and channel in COMPACT_CHANNELS
+            else (channel, value)
+        )
+        for channel, value in writes
+    ]
+
+
+def thread_report(sizes: Dict[str, Tuple[int, int]]) -> Dict[str, Any]:
+    """thread_id → (체크포인트 수, 바이트) 를 /metrics 용으로 요약"""
+    total = sum(size for _, size in sizes.values())
+    top = sorted(sizes.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        "threads": len(sizes),
+        "checkpoints": sum(count for count, _ in sizes.values()),
+        "total_bytes": total,
+        "avg_bytes_per_thread": total / len(sizes) if sizes else 0.0,
+        "max_bytes_per_thread": top[0][1][1] if top else 0,
+        "top_threads": [
+            {"thread_id": thread_id, "checkpoints": count, "bytes": size}
+            for thread_id, (count, size) in top[:TOP_THREADS]
+        ],
+    }
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    MemorySaver + 메모리 상한
+    - thread 별 마지막 사용 시각 LRU: max_threads 초과 / ttl 경과 시 thread 전체 삭제
+    - thread 별 체크포인트는 최근 history 개만 유지 (지운 체크포인트의 writes, 참조 없는 blob 도 삭제)
+    - compact 면 저장 전에 COMPACT_CHANNELS 값을 줄임 (실행 중 state 는 그대로)
+    """
+
+    def __init__(
+        self,
+        max_threads: int = CHECKPOINT_MAX_THREADS,
+        ttl: float = CHECKPOINT_TTL,
+        history: int = CHECKPOINT_HISTORY,
+        compact: bool = CHECKPOINT_COMPACT,
+    ):
+        super().__init__()
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self.history = history
+        self.compact = compact
+        self._access = OrderedDict()  # thread_id → 마지막 저장 시각
+        self._versions = defaultdict(dict)  # (thread, ns) → {체크포인트 id: 채널 버전}
+        self._blob_keys = defaultdict(set)  # (thread, ns) → blobs 키
+        self._lock = threading.RLock()
+        self.counts = dict.fromkeys(["evicted_lru", "evicted_ttl", "pruned"], 0)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        if self.compact:
+            checkpoint = compact_checkpoint(checkpoint)
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._versions[(thread_id, ns)][checkpoint["id"]] = dict(
+                checkpoint["channel_versions"]
+            )
+            self._blob_keys[(thread_id, ns)].update(
+                (thread_id, ns, k, v) for k, v in new_versions.items()
+            )
+            self._prune(thread_id, ns)
+            self._access[thread_id] = time.monotonic()
+            self._access.move_to_end(thread_id)
+            self._evict()
+        return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        if self.compact:
+            writes = compact_writes(writes)
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+
+    def _prune(self, thread_id: str, ns: str):
+        checkpoints = self.storage[thread_id][ns]
+        if self.history <= 0 or len(checkpoints) <= self.history:
+            return
+        # 체크포인트 id 는 시간 순으로 정렬되는 uuid6
+        for checkpoint_id in sorted(checkpoints)[: -self.history]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, ns, checkpoint_id), None)
+            self._versions[(thread_id, ns)].pop(checkpoint_id, None)
+            self.counts["pruned"] += 1
+
+        referenced = {
+            (thread_id, ns, channel, version)
+            for versions in self._versions[(thread_id, ns)].values()
+            for channel, version in versions.items()
+        }
+        keys = self._blob_keys[(thread_id, ns)]
+        for key in keys - referenced:
+            self.blobs.pop(key, None)
+        keys &= referenced
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._access:
+            thread_id, last = next(iter(self._access.items()))
+            if len(self._access) > self.max_threads:
+                reason = "evicted_lru"
+            elif self.ttl and now - last > self.ttl:
+                reason = "evicted_ttl"
+            else:
+                break
+            self.delete_thread(thread_id)
+            self.counts[reason] += 1
+
+    def delete_thread(self, thread_id: str) -> None:
+        """기본 구현은 전체 writes / blobs 를 훑으므로 thread 별 색인으로 삭제"""
+        with self._lock:
+            for ns, checkpoints in self.storage.pop(thread_id, {}).items():
+                for checkpoint_id in checkpoints:
+                    self.writes.pop((thread_id, ns, checkpoint_id), None)
+                for key in self._blob_keys.pop((thread_id, ns), ()):
+                    self.blobs.pop(key, None)
+                self._versions.pop((thread_id, ns), None)
+            self._access.pop(thread_id, None)
+
+    def thread_sizes(self) -> Dict[str, Tuple[int, int]]:
+        """thread_id → (체크포인트 수, 직렬화된 바이트 합)"""
+        sizes = defaultdict(lambda: [0, 0])
+        with self._lock:
+            for thread_id, namespaces in self.storage.items():
+                for checkpoints in namespaces.values():
+                    for checkpoint, metadata, _ in checkpoints.values():
+                        sizes[thread_id][0] += 1
+                        sizes[thread_id][1] += len(checkpoint[1]) + len(metadata[1])
+            for (thread_id, _), keys in self._blob_keys.items():
+                sizes[thread_id][1] += sum(
+                    len(self.blobs[k][1]) for k in keys if k in self.blobs
+                )
+            for (thread_id, _, _), writes in self.writes.items():
+                sizes[thread_id][1] += sum(len(w[2][1]) for w in writes.values())
+        return {thread_id: tuple(size) for thread_id, size in sizes.items()}
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        return {
+            "backend": "memory",
+            "max_threads": self.max_threads,
+            "ttl": self.ttl,
+            "history": self.history,
+            "compact": self.compact,
+            **counts,
+            **thread_report(self.thread_sizes()),
+        }
+
+
+def create_checkpointer(backend: str = CHECKPOINT_BACKEND):
+    """graph.compile 에 넘길 checkpointer (sqlite 는 여러 워커가 같은 파일을 공유)"""
+    if backend == "sqlite":
+        from .checkpointer_sqlite import BoundedSqliteSaver
+
+        saver = BoundedSqliteSaver.from_path(CHECKPOINT_SQLITE_PATH)
+    else:
+        saver = BoundedMemorySaver()
+    register_stats("checkpointer", saver.stats)
+    return saver
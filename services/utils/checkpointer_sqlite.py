@@ -0,0 +1,186 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from .checkpointer import (
+    CHECKPOINT_COMPACT,
+    CHECKPOINT_HISTORY,
+    CHECKPOINT_MAX_THREADS,
+    CHECKPOINT_TTL,
+    compact_checkpoint,
+    compact_writes,
+    thread_report,
+)
+
+EVICT_INTERVAL = 10  # 초, 오래된 thread 정리 쿼리 최소 간격 (워커마다)
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver + BoundedMemorySaver 와 같은 상한 (pip install langgraph-checkpoint-sqlite)
+    - 여러 워커가 같은 DB 파일을 쓰므로 마지막 사용 시각은 thread_access 테이블에 기록
+    - 비동기 메서드는 동기 메서드를 스레드에서 실행 (비동기 그래프에서도 사용 가능)
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        max_threads: int = CHECKPOINT_MAX_THREADS,
+        ttl: float = CHECKPOINT_TTL,
+        history: int = CHECKPOINT_HISTORY,
+        compact: bool = CHECKPOINT_COMPACT,
+    ):
+        super().__init__(conn)
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self.history = history
+        self.compact = compact
+        self._last_evict = 0.0
+        self._counts_lock = threading.Lock()
+        self.counts = dict.fromkeys(["evicted_lru", "evicted_ttl", "pruned"], 0)
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs):
+        return cls(sqlite3.connect(path, check_same_thread=False), **kwargs)
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS thread_access (
+                thread_id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS thread_access_time
+                ON thread_access (last_access);
+            """)
+
+    def _count(self, name: str, delta: int):
+        with self._counts_lock:
+            self.counts[name] += delta
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        if self.compact:
+            checkpoint = compact_checkpoint(checkpoint)
+        result = super().put(config, checkpoint, metadata, new_versions)
+
+        thread_id = str(config["configurable"]["thread_id"])
+        ns = config["configurable"]["checkpoint_ns"]
+        with self.cursor() as cur:
+            cur.execute(
+                "INSERT OR REPLACE INTO thread_access (thread_id, last_access) "
+                "VALUES (?, ?)",
+                (thread_id, time.time()),
+            )
+            if self.history > 0:
+                keep = (
+                    "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? "
+                    "AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT ?"
+                )
+                args = (thread_id, ns, thread_id, ns, self.history)
+                cur.execute(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+                    f"AND checkpoint_id NOT IN ({keep})",
+                    args,
+                )
+                cur.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    f"AND checkpoint_id NOT IN ({keep})",
+                    args,
+                )
+                self._count("pruned", max(cur.rowcount, 0))
+
+        if time.monotonic() - self._last_evict > EVICT_INTERVAL:
+            self._last_evict = time.monotonic()
+            self._evict()
+        return result
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        if self.compact:
+            writes = compact_writes(writes)
+        super().put_writes(config, writes, task_id, task_path)
+
+    def _evict(self):
+        with self.cursor() as cur:
+            expired = []
+            if self.ttl:
+                cur.execute(
+                    "SELECT thread_id FROM thread_access WHERE last_access < ?",
+                    (time.time() - self.ttl,),
+                )
+                expired = [row[0] for row in cur.fetchall()]
+            cur.execute(
+                "SELECT thread_id FROM thread_access ORDER BY last_access DESC "
+                "LIMIT -1 OFFSET ?",
+                (self.max_threads,),
+            )
+            overflow = [row[0] for row in cur.fetchall() if row[0] not in expired]
+        for thread_id in expired + overflow:
+            self.delete_thread(thread_id)
+        self._count("evicted_ttl", len(expired))
+        self._count("evicted_lru", len(overflow))
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute(
+                "DELETE FROM thread_access WHERE thread_id = ?", (str(thread_id),)
+            )
+
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(
+            self.put_writes, config, writes, task_id, task_path
+        )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def thread_sizes(self):
+        """thread_id → (체크포인트 수, 바이트), 모든 워커가 저장한 대화 포함"""
+        sizes = {}
+        with self.cursor(transaction=False) as cur:
+            cur.execute(
+                "SELECT thread_id, COUNT(*), "
+                "SUM(LENGTH(checkpoint) + LENGTH(metadata)) "
+                "FROM checkpoints GROUP BY thread_id"
+            )
+            for thread_id, count, size in cur.fetchall():
+                sizes[thread_id] = [count, size or 0]
+            cur.execute(
+                "SELECT thread_id, SUM(LENGTH(value)) FROM writes GROUP BY thread_id"
+            )
+            for thread_id, size in cur.fetchall():
+                sizes.setdefault(thread_id, [0, 0])[1] += size or 0
+        return {thread_id: tuple(size) for thread_id, size in sizes.items()}
+
+    def stats(self):
+        with self._counts_lock:
+            counts = dict(self.counts)
+        return {
+            "backend": "sqlite",
+            "max_threads": self.max_threads,
+            "ttl": self.ttl,
+            "history": self.history,
+            "compact": self.compact,
+            **counts,
+            **thread_report(self.thread_sizes()),
+        }
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Component:
+    """
+    지연 로딩 컴포넌트
+    - 처음 get() 할 때(또는 warmup 시) 한 번만 로드하고 이후에는 같은 객체를 재사용
+    - 로드 실패 시 다음 get() 에서 다시 시도
+    """
+
+    def __init__(self, name, loader, required=True):
+        self.name = name
+        self.required = required
+        self._loader = loader
+        self._value = None
+        self._lock = threading.Lock()
+        self.status = "pending"  # pending / loading / ready / failed
+        self.seconds = None
+        self.error = None
+
+    def get(self):
+        if self.status == "ready":
+            return self._value
+
+        with self._lock:
+            if self.status != "ready":
+                self.status = "loading"
+                start = time.perf_counter()
+                try:
+                    self._value = self._loader()
+                except Exception as e:
+                    self.status = "failed"
+                    self.error = str(e)
+                    self.seconds = round(time.perf_counter() - start, 3)
+                    logger.exception(f"-------- component '{self.name}' 로드 실패")
+                    raise
+                self.seconds = round(time.perf_counter() - start, 3)
+                self.error = None
+                self.status = "ready"
+                logger.info(f"-------- component '{self.name}' ready ({self.seconds}s)")
+        return self._value
+
+    async def aget(self):
+        """이벤트 루프를 막지 않도록 로드는 스레드에서 수행"""
+        if self.status == "ready":
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    def report(self):
+        return {"status": self.status, "seconds": self.seconds, "error": self.error}
+
+
+COMPONENTS = {}
+
+
+def component(name, required=True):
+    """로더 함수를 Component 로 감싸서 등록하는 데코레이터"""
+
+    def decorator(loader):
+        COMPONENTS[name] = Component(name, loader, required)
+        return COMPONENTS[name]
+
+    return decorator
+
+
+async def warmup_components():
+    """등록된 모든 컴포넌트를 병렬로 로드 (서로 의존하는 컴포넌트는 get() 락에서 대기)"""
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(c.aget() for c in COMPONENTS.values()), return_exceptions=True
+    )
+    logger.info(f"-------- warmup finished ({time.perf_counter() - start:.1f}s)")
+
+
+def readiness():
+    ready = all(c.status == "ready" for c in COMPONENTS.values() if c.required)
+    return ready, {name: c.report() for name, c in COMPONENTS.items()}
@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import os
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .metrics import register_stats
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# basic_chain 에 넣을 검색 문맥 최대 토큰 수 (0 이면 제한 없음, 중복 제거 / 재정렬만)
+CONTEXT_BUDGET_TOKENS = int(os.getenv("CONTEXT_BUDGET_TOKENS", "12000"))
+# SimHash 해밍 거리가 이 값 이하면 거의 같은 청크로 보고 점수 낮은 쪽을 제외 (-1 이면 안 함)
+CONTEXT_DEDUP_DISTANCE = int(os.getenv("CONTEXT_DEDUP_DISTANCE", "6"))
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "o200k_base")  # gpt-4o / gpt-4.1
+
+SIMHASH_NGRAM = 3
+_BITS = np.arange(64, dtype=np.uint64)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken 인코딩 (처음 한 번 내려받아야 하므로 실패하면 글자 수로 근사)"""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(CONTEXT_TOKENIZER)
+    except Exception as e:
+        logger.warning(f"-------- tiktoken 사용 불가, 토큰 수를 글자 수로 근사: {e}")
+        return None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, len(text) // 2)  # 한국어 기준 대략 2글자당 1토큰
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=8192)
+def simhash(text: str) -> int:
+    """글자 3-gram 집합의 64비트 SimHash (한국어 / 영어 / 코드 구분 없이 사용)"""
+    text = " ".join(unicodedata.normalize("NFC", text).lower().split())
+    grams = {text[i : i + SIMHASH_NGRAM] for i in range(max(len(text) - 2, 1))}
+    hashes = np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(g.encode(), digest_size=8).digest(), "little"
+            )
+            for g in grams
+        ],
+        dtype=np.uint64,
+    )
+    votes = ((hashes[:, None] >> _BITS) & np.uint64(1)).sum(axis=0)
+    return sum(1 << int(i) for i in np.flatnonzero(votes * 2 > len(hashes)))
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class ContextPack(NamedTuple):
+    sections: Dict[str, str]  # 프롬프트 변수 이름 → "\n" 으로 합친 문맥
+    input_tokens: int
+    output_tokens: int
+    duplicates: int  # near-duplicate 로 제외한 청크 수
+    truncated: int  # 예산 초과로 제외한 청크 수
+
+
+class ContextBudgeter:
+    """
+    basic_chain 프롬프트 문맥 조립
+    - 모든 섹션(원문 / QA / 재검색 원문 / 재검색 QA)의 청크를 하이브리드 검색 점수(RRF) 순으로 정렬
+    - 점수 높은 청크부터 SimHash near-duplicate 제외 → 토큰 예산 안에서 greedy 로 채움
+    - 섹션 안의 순서도 점수 순 (점수가 없는 청크는 원래 순서 유지)
+    """
+
+    def __init__(
+        self,
+        budget: int = CONTEXT_BUDGET_TOKENS,
+        dedup_distance: int = CONTEXT_DEDUP_DISTANCE,
+    ):
+        self.budget = budget
+        self.dedup_distance = dedup_distance
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(
+            ["requests", "input_tokens", "output_tokens", "duplicates", "truncated"], 0
+        )
+
+    def pack(
+        self, sections: Dict[str, List[str]], scores: Dict[str, float]
+    ) -> ContextPack:
+        chunks = [
+            (name, str(text)) for name, texts in sections.items() for text in texts
+        ]
+        tokens = [count_tokens(text) for _, text in chunks]
+        # sorted 는 안정 정렬이므로 동점 / 점수 없음은 섹션 → 검색 순위 순서 유지
+        ranked = sorted(
+            range(len(chunks)), key=lambda i: -scores.get(chunks[i][1], 0.0)
+        )
+
+        kept, signatures = [], []
+        used = duplicates = truncated = 0
+        for i in ranked:
+            text = chunks[i][1]
+            if self.dedup_distance >= 0:
+                signature = simhash(text)
+                if any(
+                    hamming(signature, s) <= self.dedup_distance for s in signatures
+                ):
+                    duplicates += 1
+                    continue
+            if self.budget and used + tokens[i] > self.budget:
+                truncated += 1  # 더 작은 청크는 아직 들어갈 수 있으므로 계속
+                continue
+            kept.append(i)
+            used += tokens[i]
+            if self.dedup_distance >= 0:
+                signatures.append(signature)
+
+        packed = {name: [] for name in sections}
+        for i in kept:
+            packed[chunks[i][0]].append(chunks[i][1])
+        result = ContextPack(
+            {name: "\n".join(texts) for name, texts in packed.items()},
+            sum(tokens),
+            used,
+            duplicates,
+            truncated,
+        )
+        self._record(result)
+        return result
+
+    def _record(self, pack: ContextPack):
+        with self._lock:
+            self.counts["requests"] += 1
+            self.counts["input_tokens"] += pack.input_tokens
+            self.counts["output_tokens"] += pack.output_tokens
+            self.counts["duplicates"] += pack.duplicates
+            self.counts["truncated"] += pack.truncated
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        saved = counts["input_tokens"] - counts["output_tokens"]
+        return {
+            "budget": self.budget,
+            "dedup_distance": self.dedup_distance,
+            **counts,
+            "tokens_saved": saved,
+            "tokens_saved_per_request": (
+                saved / counts["requests"] if counts["requests"] else 0.0
+            ),
+            "saved_ratio": (
+                saved / counts["input_tokens"] if counts["input_tokens"] else 0.0
+            ),
+        }
+
+
+context_budgeter = ContextBudgeter()
+register_stats("context_budget", context_budgeter.stats)
@@ -0,0 +1,247 @@
+import hashlib
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from .metrics import register_stats
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 잠금 없이 스레드 락만 사용
+    fcntl = None
+
+load_dotenv()
+
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))
+EMBED_DISK_CACHE_DIR = os.getenv(
+    "EMBED_DISK_CACHE_DIR"
+)  # 없으면 디스크 캐시 사용 안 함
+EMBED_DISK_CACHE_MAX = int(os.getenv("EMBED_DISK_CACHE_MAX", "200000"))
+
+
+def normalize_text(text: str) -> str:
+    """캐시 키용 정규화: 유니코드 NFC + 공백 정리 (정규화된 텍스트를 그대로 임베딩)"""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+@contextmanager
+def _file_lock(path: str):
+    """같은 디렉토리를 쓰는 다른 프로세스(uvicorn 워커)와의 배타 잠금"""
+    with open(path, "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class DiskEmbeddingStore:
+    """
+    append-only 디스크 캐시
+    - vectors.f32: float32 벡터를 행 단위로 이어 붙인 파일 (읽기는 np.memmap)
+    - index.tsv: "sha1(text)\\t행 번호"
+    - 쓰기는 파일 잠금 안에서 벡터 → 인덱스 순서, 새 행 번호는 벡터 파일 크기로 계산
+      (여러 워커가 같은 디렉토리를 써도 행이 겹치지 않음, 다른 워커가 쓴 행은 재시작 후 사용)
+    """
+
+    def __init__(self, directory: str, max_rows: int = EMBED_DISK_CACHE_MAX):
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.index_path = os.path.join(directory, "index.tsv")
+        self.lock_path = os.path.join(directory, "lock")
+        self.max_rows = max_rows
+        self.dim = None
+        self._rows = {}
+        self._mmap = None
+        self._lock = threading.Lock()
+
+        with self._lock, _file_lock(self.lock_path):
+            self._load()
+
+    def _stored_rows(self) -> int:
+        if not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.dim)
+
+    def _load(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r+b") as f:
+                data = f.read()
+                complete = data.rfind(b"\n") + 1
+                f.truncate(complete)  # 쓰는 도중 종료된 마지막 줄은 잘라낸다
+            for line in data[:complete].decode("utf-8").splitlines():
+                key, _, row = line.partition("\t")
+                if key == "#dim":
+                    self.dim = int(row)
+                elif row:
+                    self._rows[key] = int(row)
+
+        if self.dim and os.path.exists(self.vectors_path):
+            # 마지막 쓰기 도중 종료된 경우 벡터 파일에 없는 행은 버리고,
+            # 인덱스에 기록되지 않은 뒷부분 (벡터만 쓰고 종료, 쓰다 만 행) 은 잘라낸다
+            stored = self._stored_rows()
+            self._rows = {k: r for k, r in self._rows.items() if r < stored}
+            keep = max(self._rows.values(), default=-1) + 1
+            with open(self.vectors_path, "r+b") as f:
+                f.truncate(keep * 4 * self.dim)
+
+    def _vectors(self, row: int):
+        if self._mmap is None or self._mmap.shape[0] <= row:
+            self._mmap = np.memmap(
+                self.vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._stored_rows(), self.dim),
+            )
+        return self._mmap
+
+    def get(self, key: str) -> Optional[List[float]]:
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        with self._lock:
+            return self._vectors(row)[row].tolist()
+
+    def put_many(self, items):
+        with self._lock, _file_lock(self.lock_path):
+            items = [(k, v) for k, v in items if k not in self._rows]
+            if not items:
+                return
+
+            if self.dim is None:
+                self.dim = len(items[0][1])
+                with open(self.index_path, "a", encoding="utf-8") as f:
+                    f.write(f"#dim\t{self.dim}\n")
+
+            # 다른 워커가 추가한 행까지 포함한 실제 파일 기준 (메모리 인덱스 크기 아님)
+            start = self._stored_rows()
+            items = items[: max(self.max_rows - start, 0)]
+            if not items:
+                return
+
+            mode = "r+b" if os.path.exists(self.vectors_path) else "wb"
+            with open(self.vectors_path, mode) as f:
+                f.seek(start * 4 * self.dim)  # 쓰다 만 행이 있으면 덮어씀
+                f.write(np.asarray([v for _, v in items], dtype=np.float32).tobytes())
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                for offset, (key, _) in enumerate(items):
+                    f.write(f"{key}\t{start + offset}\n")
+                    self._rows[key] = start + offset
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    임베딩 결과 캐시 (메모리 LRU → 디스크 → 모델 순서로 조회)
+    - 캐시에 없는 텍스트만 모아서 한 번의 배치로 임베딩
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_entries: int = EMBED_CACHE_SIZE,
+        disk_dir: Optional[str] = EMBED_DISK_CACHE_DIR,
+    ):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.disk = DiskEmbeddingStore(disk_dir) if disk_dir else None
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: str):
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        vector = self.disk.get(key) if self.disk else None
+        if vector is not None:
+            self._remember(key, vector)
+            with self._lock:
+                self.disk_hits += 1
+        return vector
+
+    def _remember(self, key: str, vector: List[float]):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        normalized = [normalize_text(t) for t in texts]
+        keys = [_digest(t) for t in normalized]
+
+        found = {}
+        missing = {}
+        for key, text in zip(keys, normalized):
+            if key in found or key in missing:
+                continue
+            vector = self._lookup(key)
+            if vector is None:
+                missing[key] = text
+            else:
+                found[key] = vector
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            with self._lock:
+                self.misses += len(missing)
+            for key, vector in zip(missing, vectors):
+                vector = list(vector)
+                self._remember(key, vector)
+                found[key] = vector
+            if self.disk:
+                self.disk.put_many([(k, found[k]) for k in missing])
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        # bge-m3 는 query / document 인코딩이 동일하므로 같은 캐시를 사용
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "size": len(self._lru),
+                "disk_size": len(self.disk._rows) if self.disk else 0,
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_embeddings() -> CachedEmbeddings:
+    """프로세스 전체가 공유하는 bge-m3 임베딩 (공유 엔진 + 캐시, 모델은 한 번만 로드)"""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                from .embedding_engine import get_engine
+
+                _shared = CachedEmbeddings(get_engine())
+                register_stats("embedding_cache", _shared.stats)
+    return _shared
@@ -0,0 +1,121 @@
+import logging
+import os
+import threading
+from typing import List
+
+from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+
+from .components import component
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBED_MODEL = "BAAI/bge-m3"
+EMBED_DEVICE = os.getenv("EMBED_DEVICE", "cpu")
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))  # 0 이면 torch 기본값
+EMBED_DTYPE = os.getenv("EMBED_DTYPE", "float32")  # float32 | float16 | bfloat16 | int8
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    프로세스 전체가 공유하는 bge-m3 인코더
+    - 첫 사용(또는 load 호출) 시 한 번만 모델을 로드
+    - device / 스레드 수 / dtype(int8 동적 양자화, float16, bfloat16) / 배치 크기 설정 가능
+    - 출력은 항상 L2 정규화 (Chroma DB 생성 시 설정과 동일)
+    """
+
+    def __init__(
+        self,
+        model_name: str = EMBED_MODEL,
+        device: str = EMBED_DEVICE,
+        threads: int = EMBED_THREADS,
+        dtype: str = EMBED_DTYPE,
+        batch_size: int = EMBED_BATCH_SIZE,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.threads = threads
+        self.dtype = dtype
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _apply_dtype(self, model):
+        import torch
+
+        if self.dtype == "int8":
+            if self.device != "cpu":
+                logger.warning("int8 동적 양자화는 CPU 에서만 지원 → float32 사용")
+                return model
+            # Linear 레이어 가중치를 int8 로 양자화 (메모리 ~1/4, CPU 추론 가속)
+            return torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        if self.dtype == "float16":
+            if self.device == "cpu":
+                logger.warning("CPU 에서는 float16 대신 bfloat16 사용")
+                return model.to(torch.bfloat16)
+            return model.half()
+        if self.dtype == "bfloat16":
+            return model.to(torch.bfloat16)
+        return model
+
+    def load(self):
+        if self._model is not None:
+            return self._model
+
+        with self._lock:
+            if self._model is None:
+                import torch
+                from sentence_transformers import SentenceTransformer
+
+                if self.threads > 0:
+                    torch.set_num_threads(self.threads)
+
+                model = SentenceTransformer(self.model_name, device=self.device)
+                model.eval()
+                self._model = self._apply_dtype(model)
+                logger.info(
+                    f"-------- embedding engine loaded: {self.model_name} "
+                    f"(device={self.device}, dtype={self.dtype}, batch={self.batch_size})"
+                )
+        return self._model
+
+    def encode(self, texts: List[str]):
+        return self.load().encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.encode(texts).astype("float32").tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> EmbeddingEngine:
+    """공유 임베딩 엔진 (모델 로드는 첫 인코딩 시점까지 미룸)"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = EmbeddingEngine()
+    return _engine
+
+
+@component("embedding_model")
+def embedding_model():
+    return get_engine().load()
@@ -0,0 +1,206 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .embedding_cache import get_shared_embeddings
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# off: 항상 LLM 평가 / shadow: LLM 평가 + 로컬 판단 비교 / on: 로컬이 확신하면 LLM 생략
+GROUNDEDNESS = os.getenv("GROUNDEDNESS", "off")
+# 답변 문장별 근거 유사도(검색 청크와의 최대 코사인) 평균 / 최솟값 기준
+GROUNDEDNESS_GOOD = float(os.getenv("GROUNDEDNESS_GOOD", "0.7"))
+GROUNDEDNESS_MIN_SENTENCE = float(os.getenv("GROUNDEDNESS_MIN_SENTENCE", "0.55"))
+GROUNDEDNESS_BAD = float(os.getenv("GROUNDEDNESS_BAD", "0.45"))
+# shadow 모드에서 검사할 턴 비율 (on 모드는 항상 검사)
+GROUNDEDNESS_SHADOW_SAMPLE = float(os.getenv("GROUNDEDNESS_SHADOW_SAMPLE", "0.1"))
+# 저장된 벡터가 없어 직접 임베딩하는 청크의 최대 개수 / 청크당 최대 글자 수
+GROUNDEDNESS_MAX_CHUNKS = int(os.getenv("GROUNDEDNESS_MAX_CHUNKS", "8"))
+GROUNDEDNESS_CHUNK_CHARS = int(os.getenv("GROUNDEDNESS_CHUNK_CHARS", "1000"))
+# 지정하면 로컬 판단과 LLM 평가 결과를 JSONL 로 기록 (임계값 조정용)
+GROUNDEDNESS_LOG = os.getenv("GROUNDEDNESS_LOG")
+
+# answer_quality 프롬프트의 평가 기준 0 (회피 / 무응답 문구가 있으면 무조건 bad)
+REFUSAL_PHRASES = (
+    "죄송하지만",
+    "제공된 문서에 포함되어 있지 않습니다",
+    "답변할 수 없습니다",
+    "관련된 정보를 찾을 수 없습니다",
+    "관련 정보를 찾을 수 없습니다",
+)
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?。])\s+|\n+")
+LIST_MARKER = re.compile(r"^(?:[-*#>]+|\d+[.)])\s*")
+MIN_SENTENCE_CHARS = 10  # 이보다 짧은 문장 (제목, 목록 기호 등) 은 판단에서 제외
+
+
+class Verdict(NamedTuple):
+    label: Optional[str]  # good | bad | None (판단 못 함)
+    source: str  # refusal | similarity | empty
+    score: Optional[float]  # 문장별 근거 유사도 평균
+    weakest: Optional[float]  # 가장 근거가 약한 문장의 유사도
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences = []
+    for sentence in SENTENCE_SPLIT.split(text or ""):
+        sentence = LIST_MARKER.sub("", sentence.strip()).strip()
+        if len(sentence) >= MIN_SENTENCE_CHARS:
+            sentences.append(sentence)
+    return sentences
+
+
+class GroundednessChecker:
+    """
+    evaluate(quality_chain) 호출 전 로컬 근거성 검사
+    - 회피 문구가 있으면 bad (프롬프트 기준과 동일)
+    - 답변 문장마다 검색 청크와의 최대 코사인 유사도 (bge-m3)
+      - 청크 벡터는 Chroma 에 저장된 임베딩을 받아 쓰고, 없는 청크만 개수 / 길이를 잘라 임베딩
+      - 답변 문장 / 청크 본문은 공유 임베딩 캐시(LRU, 디스크)를 거치지 않음 (재사용되지 않는 값)
+    - 평균 >= good 이고 가장 약한 문장 >= min_sentence 이면 good, 평균 < bad 이면 bad
+    - 그 사이는 판단하지 않고 LLM 평가로 넘김
+    """
+
+    def __init__(
+        self,
+        mode: str = GROUNDEDNESS,
+        good: float = GROUNDEDNESS_GOOD,
+        min_sentence: float = GROUNDEDNESS_MIN_SENTENCE,
+        bad: float = GROUNDEDNESS_BAD,
+        log_path: Optional[str] = GROUNDEDNESS_LOG,
+        embeddings=None,
+        shadow_sample: float = GROUNDEDNESS_SHADOW_SAMPLE,
+        max_chunks: int = GROUNDEDNESS_MAX_CHUNKS,
+        chunk_chars: int = GROUNDEDNESS_CHUNK_CHARS,
+    ):
+        self.mode = mode
+        self.good = good
+        self.min_sentence = min_sentence
+        self.bad = bad
+        self.log_path = log_path
+        self.shadow_sample = shadow_sample
+        self.max_chunks = max_chunks
+        self.chunk_chars = chunk_chars
+        self._embeddings = embeddings
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(["total", "decided", "escalated", "skipped"], 0)
+        self.sources = dict.fromkeys(["refusal", "similarity"], 0)
+        self.shadow_counts = dict.fromkeys(["compared", "agree"], 0)
+        self.confusion = {}  # "로컬->LLM": 건수
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def should_check(self) -> bool:
+        """이번 턴에 검사할지 (shadow 는 shadow_sample 비율만 검사해 임베딩 비용을 줄임)"""
+        if not self.enabled:
+            return False
+        if self.mode == "on" or random.random() < self.shadow_sample:
+            return True
+        with self._lock:
+            self.counts["skipped"] += 1
+        return False
+
+    @staticmethod
+    def refusal(answer: str) -> bool:
+        return any(phrase in answer for phrase in REFUSAL_PHRASES)
+
+    def check(
+        self,
+        answer: str,
+        chunks: Sequence[str],
+        stored: Optional[Dict[str, List[float]]] = None,
+    ) -> Verdict:
+        """
+        chunks: 근거 청크 (중요한 순), stored: 청크 → Chroma 에 저장된 임베딩
+        """
+        if self.refusal(answer):
+            return Verdict("bad", "refusal", None, None)
+        sentences = split_sentences(answer)
+        stored = stored or {}
+        known = [stored[c] for c in chunks if c in stored]
+        missing = [c for c in chunks if c not in stored][: self.max_chunks]
+        if not sentences or not (known or missing):
+            return Verdict(None, "empty", None, None)
+
+        if self._embeddings is None:
+            # 캐시 없이 모델을 직접 사용 (검사마다 달라지는 텍스트로 LRU / 디스크를 채우지 않음)
+            self._embeddings = get_shared_embeddings().embeddings
+        embedded = self._embeddings.embed_documents(
+            sentences + [c[: self.chunk_chars] for c in missing]
+        )
+        vectors = np.asarray(list(embedded) + known, dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        support = (vectors[: len(sentences)] @ vectors[len(sentences) :].T).max(axis=1)
+        score, weakest = float(support.mean()), float(support.min())
+
+        label = None
+        if score >= self.good and weakest >= self.min_sentence:
+            label = "good"
+        elif score < self.bad:
+            label = "bad"
+        return Verdict(label, "similarity", score, weakest)
+
+    def decide(self, verdict: Optional[Verdict]) -> Optional[str]:
+        """평가에 사용할 로컬 결과 (shadow 이거나 판단 못 했으면 None → LLM)"""
+        with self._lock:
+            self.counts["total"] += 1
+            if verdict is not None and verdict.label is not None:
+                self.sources[verdict.source] += 1
+            if verdict is None or verdict.label is None or self.mode != "on":
+                self.counts["escalated"] += 1
+                return None
+            self.counts["decided"] += 1
+            return verdict.label
+
+    def record(self, question: str, verdict: Verdict, llm_label: str):
+        """LLM 평가 결과와 로컬 판단 비교 (shadow) + 임계값 조정용 로그"""
+        if verdict.label is not None:
+            with self._lock:
+                self.shadow_counts["compared"] += 1
+                self.shadow_counts["agree"] += verdict.label == llm_label
+                if verdict.label != llm_label:
+                    key = f"{verdict.label}->{llm_label}"
+                    self.confusion[key] = self.confusion.get(key, 0) + 1
+        if self.log_path:
+            row = {
+                "time": time.time(),
+                "question": question,
+                "llm": llm_label,
+                "local": verdict.label,
+                "source": verdict.source,
+                "score": verdict.score,
+                "weakest": verdict.weakest,
+            }
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            sources = dict(self.sources)
+            shadow = dict(self.shadow_counts)
+            confusion = dict(self.confusion)
+        judged = sum(sources.values())
+        return {
+            "mode": self.mode,
+            **counts,
+            # 로컬에서 판단할 수 있었던 비율 (shadow 여도 집계)
+            "coverage": judged / counts["total"] if counts["total"] else 0.0,
+            "sources": sources,
+            "agreement": (
+                shadow["agree"] / shadow["compared"] if shadow["compared"] else None
+            ),
+            "compared": shadow["compared"],
+            "confusion": confusion,
+        }
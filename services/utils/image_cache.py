@@ -0,0 +1,74 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .metrics import register_stats
+
+load_dotenv()
+
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "256"))  # 0 이면 캐시 안 함
+
+
+def image_key(image: str) -> str:
+    """
+    이미지 내용 기준 키
+    - data URL 은 base64 본문만 해시 (mime 표기가 달라도 같은 이미지면 같은 키)
+    - 일반 URL 은 URL 문자열을 해시
+    """
+    if image.startswith("data:") and "," in image:
+        image = image.split(",", 1)[1]
+    return hashlib.sha256(image.encode("utf-8")).hexdigest()
+
+
+class ImageAnalysisCache:
+    """
+    이미지 해시 → GPT-4o vision 분석 결과 LRU
+    - 같은 스크린샷을 대화 내내 다시 보내도 vision 호출은 한 번만 한다
+    - 분석 실패 결과는 저장하지 않는다
+    """
+
+    def __init__(self, max_entries: int = IMAGE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(["hits", "misses"], 0)
+
+    def get(self, image: str) -> Optional[str]:
+        if self.max_entries <= 0:
+            return None
+        key = image_key(image)
+        with self._lock:
+            analysis = self._items.get(key)
+            if analysis is None:
+                self.counts["misses"] += 1
+                return None
+            self._items.move_to_end(key)
+            self.counts["hits"] += 1
+            return analysis
+
+    def set(self, image: str, analysis: str):
+        if self.max_entries <= 0:
+            return
+        key = image_key(image)
+        with self._lock:
+            self._items[key] = analysis
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def stats(self):
+        lookups = self.counts["hits"] + self.counts["misses"]
+        return {
+            **self.counts,
+            "hit_rate": self.counts["hits"] / lookups if lookups else 0.0,
+            "size": len(self._items),
+            "max_entries": self.max_entries,
+        }
+
+
+image_cache = ImageAnalysisCache()
+register_stats("image_cache", image_cache.stats)
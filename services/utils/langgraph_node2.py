@@ -1,5 +1,6 @@
-from typing import TypedDict, List, Dict, Any
-from langchain_core.tools import tool
+from typing import Annotated, TypedDict, List, Dict, Any, Optional, Tuple
+from langchain_core.callbacks import get_usage_metadata_callback
+from langchain_core.tools import InjectedToolArg, tool
 from langchain_openai import ChatOpenAI
 
 from .rag2 import (
@@ -11,29 +12,50 @@ from .rag2 import (
     answer_quality_chain_setting_rag,
     alternative_queries_chain_setting,
 )
+from .context_budget import context_budgeter
+from .groundedness import GroundednessChecker
+from .image_cache import image_cache
+from .llm_cache import cached_chain
+from .metrics import register_stats
+from .preclassifier import PreClassifier
+from .reranker import reranker
+from .tag_router import tag_router
 from .retriever import retriever_setting
 from .retriever_qa import retriever_setting2
-from .retriever_hybrid import hybrid_retriever_setting, hybrid_retriever_setting_qa
+from .retriever_hybrid import (
+    hybrid_retriever_setting,
+    hybrid_retriever_setting_qa,
+    embed_queries,
+    stored_embeddings,
+)
 
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 import openai
 from dotenv import load_dotenv
 import os
+import time
+import uuid
 
 load_dotenv()
 
-# OpenAI 클라이언트 초기화
+# OpenAI 클라이언트 초기화 (동기 그래프 / 비동기 그래프용)
 client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+async_client = openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
+# temperature 0 체인은 exact-match 캐시로 감싼다 (같은 입력이면 LLM 호출 생략)
+# 답변 생성(basic)은 제외: 스트리밍되어야 하고, 답변 재사용은 answer_cache 가 담당
 basic_chain = basic_chain_setting()
 # vs = retriever_setting()
 # qa_vs = retriever_setting2()
-query_chain = query_setting()
-classification_chain = classify_chain_setting()
-simple_chain = simple_chain_setting()
-imp_chain = impossable_chain_setting()
-quality_chain = answer_quality_chain_setting_rag()
-alt_query_chain = alternative_queries_chain_setting()
+query_chain = cached_chain(query_setting(), "query")
+classification_chain = cached_chain(classify_chain_setting(), "classify")
+simple_chain = simple_chain_setting()  # temperature 0.4 → 캐시 안 함
+imp_chain = impossable_chain_setting()  # temperature 0.4 → 캐시 안 함
+quality_chain = cached_chain(answer_quality_chain_setting_rag(), "quality")
+alt_query_chain = cached_chain(alternative_queries_chain_setting(), "alt_query")
 
 
 class ChatState(TypedDict, total=False):
@@ -54,6 +76,32 @@ class ChatState(TypedDict, total=False):
     hyde_qa_results: List[str]
     hyde_text_results: List[str]
     search_results_final: List[str]
+    speculative: bool  # classify 와 동시에 미리 검색한 결과를 사용했는지
+    context_scores: Dict[str, float]  # 검색 청크 → 하이브리드 검색 점수 (문맥 정렬용)
+    # 검색 청크 → (컬렉션 "text"/"qa", Chroma id) (근거성 검사에서 저장된 임베딩 조회)
+    chunk_ids: Dict[str, Tuple[str, str]]
+    context: Dict[str, str]  # basic_chain 에 넣은 문맥 (evaluate 에서 재사용)
+    hyde_job: Optional[str]  # 답변과 동시에 시작한 재검색 작업 id
+    hyde_ready: bool  # bad 평가 시 미리 재검색한 결과를 사용했는지
+
+
+# 동시에 실행할 검색 수 (툴 호출 / 원문·QA retriever 각각)
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "4"))
+
+# classify 와 동시에 질문 분리 + 첫 검색을 미리 실행 (비동기 그래프 전용, 기본 off)
+SPECULATIVE_SEARCH = os.getenv("SPECULATIVE_SEARCH", "false").lower() == "true"
+
+# 첫 답변 생성과 동시에 대체 쿼리 생성 + 재검색을 미리 실행 (비동기 그래프 전용, 기본 off)
+SPECULATIVE_HYDE = os.getenv("SPECULATIVE_HYDE", "false").lower() == "true"
+# 동시에 진행 중인 재검색 작업 최대 수 (넘으면 미리 실행하지 않음)
+SPECULATIVE_HYDE_MAX_INFLIGHT = int(os.getenv("SPECULATIVE_HYDE_MAX_INFLIGHT", "4"))
+# 최근 첫 답변의 bad 비율(EWMA)이 이보다 낮으면 미리 실행하지 않음
+SPECULATIVE_HYDE_MIN_BAD_RATE = float(os.getenv("SPECULATIVE_HYDE_MIN_BAD_RATE", "0"))
+
+# 원문/QA 검색 전용 스레드 풀 (프로세스 전체의 동시 검색 수를 제한)
+_retrieval_pool = ThreadPoolExecutor(
+    max_workers=SEARCH_CONCURRENCY * 2, thread_name_prefix="retrieval"
+)
 
 
 # [QA] Google API 선택 옵션 정의
@@ -72,61 +120,224 @@ GOOGLE_API_OPTIONS = {
 }
 
 
-# 분류 노드
-def classify(state: ChatState):
-    image_text = state.get("image_analysis")
-    question = state["question"]
-    chat_history = state.get("messages", [])
-    chat_history = chat_history[-4:]
+# classify LLM 앞의 로컬 분류기 (인사 / 명백한 구글 API 질문은 LLM 호출 생략)
+preclassifier = PreClassifier(GOOGLE_API_OPTIONS)
+register_stats("preclassifier", preclassifier.stats)
 
-    # 이미지 분석 결과가 있으면 질문에 포함시킴
+# evaluate LLM 앞의 로컬 근거성 검사 (회피 문구 / 답변-검색 결과 임베딩 유사도)
+groundedness = GroundednessChecker()
+register_stats("groundedness", groundedness.stats)
+
+
+def _question_with_image(state: ChatState) -> str:
+    """이미지 분석 결과가 있으면 질문에 포함시킨 문자열을 반환"""
+    question = state["question"]
     if state.get("image_analysis"):
         question = (
             f"사용자의 이번 질문:{question}"
             + "\n"
             + f'사용자가 이번에 혹은 이전에 첨부한 이미지에 대한 설명: {state.get("image_analysis")}'
         )
+    return question
+
+
+# 분류 노드
+def classify(state: ChatState):
+    question = _question_with_image(state)
+    chat_history = state.get("messages", [])[-4:]
+
+    prediction = preclassifier.predict(
+        state["question"], state.get("image"), bool(chat_history)
+    )
+    local = preclassifier.decide(prediction)
+    if local:
+        print(f"[classify] 로컬 분류: {local} ({prediction.source})")
+        state["classify"] = local
+        return state
 
     result = classification_chain.invoke(
         {"question": question, "context": chat_history}
     ).strip()
+    preclassifier.record(state["question"], prediction, result)
 
     state["classify"] = result
 
     return state
 
 
+async def aclassify(state: ChatState):
+    question = _question_with_image(state)
+    chat_history = state.get("messages", [])[-4:]
+    state["speculative"] = False
+
+    if preclassifier.uses_embeddings:
+        prediction = await asyncio.to_thread(
+            preclassifier.predict,
+            state["question"],
+            state.get("image"),
+            bool(chat_history),
+        )
+    else:
+        prediction = preclassifier.predict(
+            state["question"], state.get("image"), bool(chat_history)
+        )
+    local = preclassifier.decide(prediction)
+    if local:
+        print(f"[classify] 로컬 분류: {local} ({prediction.source})")
+        state["classify"] = local
+        return state
+
+    speculation = None
+    if SPECULATIVE_SEARCH:
+        # "api" 일 것이라 보고 질문 분리 + 첫 검색을 분류와 동시에 시작
+        job = {"tokens": 0, "seconds": 0.0}
+        speculation = (asyncio.create_task(_speculative_search(dict(state), job)), job)
+
+    start = time.perf_counter()
+    try:
+        result = await classification_chain.ainvoke(
+            {"question": question, "context": chat_history}
+        )
+    except BaseException:
+        if speculation:
+            speculation[0].cancel()
+        raise
+
+    state["classify"] = result.strip()
+    preclassifier.record(state["question"], prediction, state["classify"])
+
+    if speculation:
+        await _commit_speculation(state, *speculation, time.perf_counter() - start)
+
+    return state
+
+
 def route_from_classify(state):
     route = state.get("classify").strip()
+    # 미리 검색한 결과를 채택했으면 검색 단계를 건너뛰고 바로 답변
+    if route == "api" and state.get("speculative"):
+        return "api_speculative"
     # classification_chain이 실제로 뭘 반환하는지에 따라 매핑
     return route
 
 
+# classify 결과가 api 일 때 채택할 미리 계산한 state 값
+SPECULATIVE_KEYS = ["rewritten", "queries", "search_results", "qa_search_results"]
+SPECULATIVE_KEYS += ["tool_calls", "context_scores", "chunk_ids"]
+
+_speculation_counts = dict.fromkeys(
+    ["attempts", "hits", "discarded", "errors", "tokens", "wasted_tokens"], 0
+)
+_speculation_counts["seconds_saved"] = 0.0
+
+
+async def _speculative_search(state: ChatState, job: Dict[str, Any]) -> ChatState:
+    """extract_queries → split_queries → tool 을 복사한 state 로 실행 (사용 토큰은 job 에 기록)"""
+    start = time.perf_counter()
+    # 이 task 안의 LLM 호출만 집계 (contextvar 라서 classify 호출은 포함되지 않음)
+    with get_usage_metadata_callback() as usage:
+        try:
+            extract_queries(state)
+            await asplit_queries(state)
+            return await atool_based_search_node(state)
+        finally:
+            job["tokens"] = sum(
+                u.get("total_tokens", 0) for u in usage.usage_metadata.values()
+            )
+            job["seconds"] = time.perf_counter() - start
+
+
+async def _commit_speculation(state, task, job, classify_seconds):
+    """api 면 미리 검색한 결과를 state 에 반영, 아니면 취소하고 쓴 토큰을 낭비로 집계"""
+    counts = _speculation_counts
+    counts["attempts"] += 1
+
+    if state["classify"] != "api":
+        task.cancel()
+        # 취소 완료까지 기다려야 사용 토큰이 기록됨 (응답 전에 끊긴 호출은 집계되지 않음)
+        await asyncio.wait([task])
+        counts["discarded"] += 1
+        counts["tokens"] += job["tokens"]
+        counts["wasted_tokens"] += job["tokens"]
+        return state
+
+    try:
+        speculated = await task
+    except Exception as e:  # 실패하면 원래 순서대로 다시 검색
+        print(f"[speculative_search] 실패, 순차 실행으로 전환: {str(e)}")
+        counts["errors"] += 1
+        counts["tokens"] += job["tokens"]
+        counts["wasted_tokens"] += job["tokens"]
+        return state
+
+    for key in SPECULATIVE_KEYS:
+        state[key] = speculated.get(key)
+    state["speculative"] = True
+    counts["hits"] += 1
+    counts["tokens"] += job["tokens"]
+    # 순차 실행이면 classify + 검색, 동시 실행이면 둘 중 긴 쪽만 걸린다
+    counts["seconds_saved"] += min(classify_seconds, job["seconds"])
+    print(f"[speculative_search] 채택 - queries={state['queries']}")
+    return state
+
+
+def speculation_stats():
+    counts = _speculation_counts
+    return {
+        **counts,
+        "enabled": SPECULATIVE_SEARCH,
+        "hit_rate": counts["hits"] / counts["attempts"] if counts["attempts"] else 0.0,
+        "seconds_saved": round(counts["seconds_saved"], 3),
+    }
+
+
+register_stats("speculative_search", speculation_stats)
+
+
+def _vision_messages(image: str) -> List[Dict[str, Any]]:
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": "이 이미지에 대해 자세히 설명해주세요.",
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {"url": image},  # URL이면 그대로 사용
+                },
+            ],
+        }
+    ]
+
+
+def route_from_start(state: ChatState) -> str:
+    # 이미지가 없으면 분석 노드를 거치지 않음 (이전 턴의 image_analysis 는 state 에 그대로 남음)
+    return "image" if state.get("image") else "text"
+
+
+def _cached_image_analysis(state: ChatState) -> bool:
+    """같은 이미지를 이미 분석했으면 state 에 넣고 True"""
+    analysis = image_cache.get(state["image"])
+    if analysis is None:
+        return False
+    print("analyze_image 캐시 사용")
+    state["image_analysis"] = analysis
+    return True
+
+
 def analyze_image(state: ChatState) -> ChatState:
     """ChatState의 이미지를 분석하는 함수"""
     print(f"analyze_image 호출됨 - 이미지 존재: {bool(state.get('image'))}")
     if state.get("image"):
+        if _cached_image_analysis(state):
+            return state
         try:
             # GPT-4 Vision API 호출
             response = client.chat.completions.create(
                 model="gpt-4o",
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "이 이미지에 대해 자세히 설명해주세요.",
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": state["image"]  # URL이면 그대로 사용
-                                },
-                            },
-                        ],
-                    }
-                ],
+                messages=_vision_messages(state["image"]),
                 max_tokens=500,
             )
 
@@ -134,6 +345,7 @@ def analyze_image(state: ChatState) -> ChatState:
             state["image_analysis"] = (
                 answer  # 원본 이미지는 유지하고 분석 결과를 별도 필드에 저장
             )
+            image_cache.set(state["image"], answer)
             return state
         except Exception as e:
             print(f"이미지 분석 에러: {str(e)}")
@@ -143,6 +355,28 @@ def analyze_image(state: ChatState) -> ChatState:
         return state
 
 
+async def aanalyze_image(state: ChatState) -> ChatState:
+    """analyze_image의 비동기 버전 (AsyncOpenAI 사용)"""
+    print(f"analyze_image 호출됨 - 이미지 존재: {bool(state.get('image'))}")
+    if not state.get("image"):
+        return state
+    if _cached_image_analysis(state):
+        return state
+
+    try:
+        response = await async_client.chat.completions.create(
+            model="gpt-4o",
+            messages=_vision_messages(state["image"]),
+            max_tokens=500,
+        )
+        state["image_analysis"] = response.choices[0].message.content
+        image_cache.set(state["image"], state["image_analysis"])
+    except Exception as e:
+        print(f"이미지 분석 에러: {str(e)}")
+        state["image_analysis"] = f"이미지 분석 중 오류가 발생했습니다: {str(e)}"
+    return state
+
+
 # (1) 사용자 질문 + 히스토리 통합 → 통합된 질문과 쿼리 추출
 def extract_queries(state: ChatState) -> ChatState:
     user_text = state["question"]
@@ -184,9 +418,20 @@ def split_queries(state: ChatState) -> ChatState:
     return state
 
 
+async def asplit_queries(state: ChatState) -> ChatState:
+    response = await query_chain.ainvoke({"rewritten": state.get("rewritten")})
+    state["queries"] = response["questions"]
+
+    return state
+
+
 @tool
 def vector_search_tool(
-    query: str, api_tags: List[str], text_k: int = 5, qa_k: int = 20
+    query: str,
+    api_tags: List[str],
+    text_k: int = 5,
+    qa_k: int = 20,
+    query_vector: Annotated[Optional[List[float]], InjectedToolArg] = None,
 ):
     """
     태그 기반 원문 하이브리드 검색 (Chroma + BM25, 다중 태그 지원)
@@ -194,32 +439,34 @@ def vector_search_tool(
     retriever = hybrid_retriever_setting(api_tags, text_k)
     retriever_qa = hybrid_retriever_setting_qa(api_tags, qa_k)
 
-    results_text = retriever.get_relevant_documents(query)
-
-    results_qa = retriever_qa.get_relevant_documents(query)
+    # 원문 / QA 검색을 동시에 실행 (query_vector 는 두 컬렉션이 공유)
+    future_text = _retrieval_pool.submit(retriever.search, query, query_vector)
+    future_qa = _retrieval_pool.submit(retriever_qa.search, query, query_vector)
+    hits_text = future_text.result()
+    hits_qa = future_qa.result()
 
     print(f"[vector_search_tool] hybrid 검색 완료: '{query}', tags={api_tags}")
 
-    # 각 결과에서 page_content만 추출하여 반환
+    # 각 결과에서 page_content 와 RRF 점수, Chroma id 만 추출하여 반환
     return {
-        "text": [result.page_content for result in results_text],
-        "qa": [result.page_content for result in results_qa],
+        "text": [hit.doc.page_content for hit in hits_text],
+        "qa": [hit.doc.page_content for hit in hits_qa],
+        "text_scores": [hit.score for hit in hits_text],
+        "qa_scores": [hit.score for hit in hits_qa],
+        "text_ids": [getattr(hit, "doc_id", None) for hit in hits_text],
+        "qa_ids": [getattr(hit, "doc_id", None) for hit in hits_qa],
     }
 
 
 llm = ChatOpenAI(model="gpt-4.1", temperature=0)
+llm_with_tools = llm.bind_tools([vector_search_tool])
 
 
-def tool_based_search_node(state: ChatState) -> ChatState:
-    """LLM이 툴을 사용해서 벡터 DB 검색을 수행하는 노드"""
-    queries = state.get("queries", [])
-    llm_with_tools = llm.bind_tools([vector_search_tool])
+def _search_instruction(queries: List[str]) -> str:
     options_str = "\n".join([f"- {k}: {v}" for k, v in GOOGLE_API_OPTIONS.items()])
 
-    print(f"[tool_based_search_node] 실행 - queries={queries}")
-
     # LLM에게 명시적으로 "각 질문마다 툴 호출"을 요구
-    search_instruction = f"""
+    return f"""
     다음의 Google API 관련 **검색 쿼리**들에 대해, 각 쿼리마다 반드시 한 번씩
     `vector_search_tool`을 호출해 주세요.
     - 질문들: {queries}
@@ -240,35 +487,79 @@ def tool_based_search_node(state: ChatState) -> ChatState:
     {{"query": "<하나의 질문>", "api_tags": ["gmail","calendar"]}}
     """
 
-    response = llm_with_tools.invoke(search_instruction)
 
-    # 툴 호출 결과 추출
+def _search_tool_calls(state: ChatState, response) -> List[Dict[str, Any]]:
+    """LLM 응답에서 vector_search_tool 호출 인자만 추출 (retry 시 k 확장)"""
+    calls = []
+    if hasattr(response, "tool_calls") and response.tool_calls:
+        for tool_call in response.tool_calls:
+            if tool_call["name"] == "vector_search_tool":
+                calls.append(_with_retry_k(state, tool_call["args"]))
+    return calls
+
+
+def _with_retry_k(state: ChatState, args: Dict[str, Any]) -> Dict[str, Any]:
+    if state["retry"]:
+        args["text_k"] = 15
+        args["qa_k"] = 30
+    return args
+
+
+def _local_tag_routes(router, queries: List[str], vectors: Dict[str, List[float]]):
+    """로컬 태그 라우터 결과 (router 가 없으면 None)"""
+    if router is None or not queries:
+        return None
+    return router.route(queries, vectors)
+
+
+def _routed_calls(state: ChatState, routes) -> List[Dict[str, Any]]:
+    return [
+        _with_retry_k(state, {"query": r.query, "api_tags": r.tags}) for r in routes
+    ]
+
+
+def _with_query_vectors(
+    calls: List[Dict[str, Any]], vectors: Dict[str, List[float]]
+) -> List[Dict[str, Any]]:
+    """툴 인자에 미리 계산한 쿼리 임베딩을 주입 (state의 tool_calls 기록에는 남기지 않음)"""
+    return [{**args, "query_vector": vectors.get(args.get("query"))} for args in calls]
+
+
+def _rerank(ranker, calls: List[Dict[str, Any]], results: List[Dict[str, Any]]):
+    """턴 전체 검색 후보를 cross-encoder 로 재정렬해 상위 N 개만 남김 (ranker 가 없으면 그대로)"""
+    if ranker is None:
+        return results
+    return ranker.rerank([(args.get("query"), r) for args, r in zip(calls, results)])
+
+
+def _apply_search_results(
+    state: ChatState, calls: List[Dict[str, Any]], results: List[Dict[str, Any]]
+) -> ChatState:
+    """툴 실행 결과를 호출 순서대로 state에 반영"""
     search_results = []
     qa_search_results = []
     tool_calls = []
+    # 재검색이면 첫 검색 점수에 합친다 (같은 청크는 높은 점수)
+    scores = dict(state.get("context_scores") or {}) if state["retry"] else {}
+    chunk_ids = dict(state.get("chunk_ids") or {}) if state["retry"] else {}
+
+    for args, result in zip(calls, results):
+        search_results.extend(result["text"])
+        qa_search_results.extend(result["qa"])
+        for key in ("text", "qa"):
+            for content, score in zip(result[key], result.get(f"{key}_scores", [])):
+                scores[content] = max(score, scores.get(content, 0.0))
+            for content, doc_id in zip(result[key], result.get(f"{key}_ids", [])):
+                if doc_id is not None:
+                    chunk_ids.setdefault(content, (key, doc_id))
+        tool_calls.append(
+            {
+                "tool": "vector_search_tool",
+                "args": args,
+                "result": result,
+            }
+        )
 
-    if hasattr(response, "tool_calls") and response.tool_calls:
-        for tool_call in response.tool_calls:
-            if tool_call["name"] == "vector_search_tool":
-                # 툴 실행
-                args = tool_call["args"]
-                if state["retry"]:
-                    args["text_k"] = 15
-                    args["qa_k"] = 30
-                result = vector_search_tool.invoke(args)
-                qa_results = result["qa"]
-                text_results = result["text"]
-                search_results.extend(text_results)
-                qa_search_results.extend(qa_results)
-                tool_calls.append(
-                    {
-                        "tool": "vector_search_tool",
-                        "args": tool_call["args"],
-                        "result": result,
-                    }
-                )
-
-    # state['search_results'] = search_results
     if not state["retry"]:
         state["search_results"] = list(dict.fromkeys(search_results))
         state["qa_search_results"] = list(dict.fromkeys(qa_search_results))
@@ -277,16 +568,84 @@ def tool_based_search_node(state: ChatState) -> ChatState:
         state["hyde_qa_results"] = list(dict.fromkeys(qa_search_results))
 
     state["tool_calls"] = tool_calls
-
-    # print(f"[tool_based_search_node] 실행 - state['search_results']={state['search_results']}")
-    # print(f"[tool_based_search_node] 실행 - state['qa_search_results']={state['qa_search_results']}")
+    state["context_scores"] = scores
+    state["chunk_ids"] = chunk_ids
 
     return state
 
 
-# (4) 기본 답변 생성 노드
-def basic_langgraph_node(state: ChatState) -> Dict[str, Any]:
-    """질문에 대한 기본 답변 생성"""
+def tool_based_search_node(state: ChatState) -> ChatState:
+    """LLM이 툴을 사용해서 벡터 DB 검색을 수행하는 노드"""
+    queries = state.get("queries", [])
+
+    print(f"[tool_based_search_node] 실행 - queries={queries}")
+
+    # 태그 라우터를 쓰면 쿼리를 먼저 임베딩 (검색에도 그대로 재사용)
+    router = tag_router.get()
+    vectors = embed_queries(queries) if router is not None else {}
+    routes = _local_tag_routes(router, queries, vectors)
+
+    if routes is not None and router.accept(routes):
+        print(f"[tool_based_search_node] 로컬 태그: {[r.tags for r in routes]}")
+        calls = _routed_calls(state, routes)
+    else:
+        response = llm_with_tools.invoke(_search_instruction(queries))
+        # 툴 실행 (호출 순서대로 결과를 모아야 dict.fromkeys 중복 제거 결과가 동일함)
+        calls = _search_tool_calls(state, response)
+        if router is not None:
+            router.observe(routes, calls)
+
+    # 이번 턴의 모든 쿼리를 한 번에 임베딩
+    missing = [args.get("query") for args in calls if args.get("query") not in vectors]
+    vectors.update(embed_queries(missing))
+    with ThreadPoolExecutor(max_workers=SEARCH_CONCURRENCY) as pool:
+        results = list(
+            pool.map(vector_search_tool.invoke, _with_query_vectors(calls, vectors))
+        )
+    results = _rerank(reranker.get(), calls, results)
+
+    return _apply_search_results(state, calls, results)
+
+
+async def atool_based_search_node(state: ChatState) -> ChatState:
+    """tool_based_search_node의 비동기 버전 (검색은 스레드에서 실행)"""
+    queries = state.get("queries", [])
+
+    print(f"[tool_based_search_node] 실행 - queries={queries}")
+
+    router = await tag_router.aget()
+    vectors = {}
+    if router is not None:
+        vectors = await asyncio.to_thread(embed_queries, queries)
+    routes = _local_tag_routes(router, queries, vectors)
+
+    if routes is not None and router.accept(routes):
+        print(f"[tool_based_search_node] 로컬 태그: {[r.tags for r in routes]}")
+        calls = _routed_calls(state, routes)
+    else:
+        response = await llm_with_tools.ainvoke(_search_instruction(queries))
+        calls = _search_tool_calls(state, response)
+        if router is not None:
+            router.observe(routes, calls)
+
+    missing = [args.get("query") for args in calls if args.get("query") not in vectors]
+    vectors.update(await asyncio.to_thread(embed_queries, missing))
+    semaphore = asyncio.Semaphore(SEARCH_CONCURRENCY)
+
+    async def run(args):
+        async with semaphore:
+            return await asyncio.to_thread(vector_search_tool.invoke, args)
+
+    # gather는 입력 순서대로 결과를 돌려주므로 중복 제거 순서가 유지됨
+    results = await asyncio.gather(
+        *(run(args) for args in _with_query_vectors(calls, vectors))
+    )
+    results = await asyncio.to_thread(_rerank, await reranker.aget(), calls, results)
+
+    return _apply_search_results(state, calls, results)
+
+
+def _basic_inputs(state: ChatState) -> Dict[str, Any]:
     search_results_text = state["search_results"]
     search_results_qa = state["qa_search_results"]
 
@@ -296,121 +655,252 @@ def basic_langgraph_node(state: ChatState) -> Dict[str, Any]:
         search_results_text2 = state["hyde_text_results"]
         search_results_qa2 = state["hyde_qa_results"]
 
-    history = state["messages"][-4:]
-    question = state["question"]
+    # near-duplicate 제거 + 점수 순 재정렬 + 토큰 예산 (evaluate 도 같은 문맥 사용)
+    packed = context_budgeter.pack(
+        {
+            "context_text": search_results_text,
+            "context_qa": search_results_qa,
+            "context_text2": search_results_text2,
+            "context_qa2": search_results_qa2,
+        },
+        state.get("context_scores") or {},
+    )
+    state["context"] = packed.sections
+    print(
+        f"[basic_langgraph_node] 문맥 {packed.input_tokens} → {packed.output_tokens} 토큰 "
+        f"(중복 {packed.duplicates}, 예산 초과 {packed.truncated})"
+    )
 
-    # 이미지 분석 결과가 있으면 질문에 포함시킴
-    if state.get("image_analysis"):
-        question = (
-            f"사용자의 이번 질문:{question}"
-            + "\n"
-            + f'사용자가 이번에 혹은 이전에 첨부한 이미지에 대한 설명: {state.get("image_analysis")}'
-        )
+    return {
+        "question": _question_with_image(state),
+        **packed.sections,
+        "history": state["messages"][-4:],
+    }
 
-    # 검색된 결과를 바탕으로 답변 생성
-    answer = basic_chain.invoke(
-        {
-            "question": question,
-            "context_text": "\n".join([str(res) for res in search_results_text]),
-            "context_qa": "\n".join([str(res) for res in search_results_qa]),
-            "context_text2": "\n".join([str(res) for res in search_results_text2]),
-            "context_qa2": "\n".join([str(res) for res in search_results_qa2]),
-            "history": history,
-        }
-    ).strip()
 
+def _apply_basic_answer(state: ChatState, answer: str) -> ChatState:
     state["search_results_final"] = (
-        search_results_text
-        + search_results_qa
-        + search_results_qa2
-        + search_results_text2
+        state["search_results"]
+        + state["qa_search_results"]
+        + (state["hyde_qa_results"] if state["retry"] else [])
+        + (state["hyde_text_results"] if state["retry"] else [])
     )
     state["answer"] = answer
 
     print(f"[basic_langgraph_node] 생성된 답변: {answer}")
 
-    return state  # 답변을 반환
+    return state
+
+
+# (4) 기본 답변 생성 노드
+def basic_langgraph_node(state: ChatState) -> Dict[str, Any]:
+    """질문에 대한 기본 답변 생성"""
+    # 검색된 결과를 바탕으로 답변 생성
+    answer = basic_chain.invoke(_basic_inputs(state)).strip()
+
+    return _apply_basic_answer(state, answer)  # 답변을 반환
+
+
+async def abasic_langgraph_node(state: ChatState) -> Dict[str, Any]:
+    _start_hyde_speculation(state)
+    answer = await basic_chain.ainvoke(_basic_inputs(state))
+
+    return _apply_basic_answer(state, answer.strip())
+
+
+# evaluate 가 bad 일 때 채택할 미리 계산한 state 값
+HYDE_KEYS = ["queries", "retry", "hyde_text_results", "hyde_qa_results"]
+HYDE_KEYS += ["tool_calls", "context_scores", "chunk_ids"]
+HYDE_JOB_TTL = 120  # 평가까지 가지 못한 작업(에러 등)은 이 시간 뒤 정리
+
+_hyde_jobs = {}  # 작업 id → (task, job)
+_hyde_counts = dict.fromkeys(
+    ["attempts", "used", "discarded", "errors", "tokens", "wasted_tokens"], 0
+)
+_hyde_counts.update(dict.fromkeys(["skipped_inflight", "skipped_rate"], 0))
+_hyde_counts["seconds_saved"] = 0.0
+_hyde_bad_rate = {"value": None, "alpha": 0.1}  # 첫 답변 bad 비율 EWMA
+
+
+async def _speculative_hyde(state: ChatState, job: Dict[str, Any]) -> ChatState:
+    """generate_queries → tool(retry) 를 복사한 state 로 실행 (사용 토큰은 job 에 기록)"""
+    start = time.perf_counter()
+    with get_usage_metadata_callback() as usage:
+        try:
+            await agenerate_alternative_queries(state)
+            return await atool_based_search_node(state)
+        finally:
+            job["tokens"] = sum(
+                u.get("total_tokens", 0) for u in usage.usage_metadata.values()
+            )
+            job["seconds"] = time.perf_counter() - start
+
+
+def _start_hyde_speculation(state: ChatState):
+    """첫 답변이면 재검색을 미리 시작 (대체 쿼리는 답변과 무관하게 질문 / 히스토리로만 생성)"""
+    state["hyde_job"] = None
+    if not SPECULATIVE_HYDE or state["retry"]:
+        return
+
+    counts = _hyde_counts
+    now = time.perf_counter()
+    for job_id, (task, job) in list(_hyde_jobs.items()):
+        if now - job["started"] > HYDE_JOB_TTL:
+            task.cancel()
+            _hyde_jobs.pop(job_id, None)
+
+    if len(_hyde_jobs) >= SPECULATIVE_HYDE_MAX_INFLIGHT:
+        counts["skipped_inflight"] += 1
+        return
+    bad_rate = _hyde_bad_rate["value"]
+    if bad_rate is not None and bad_rate < SPECULATIVE_HYDE_MIN_BAD_RATE:
+        counts["skipped_rate"] += 1
+        return
+
+    job = {"tokens": 0, "seconds": 0.0, "started": now}
+    job_id = uuid.uuid4().hex
+    # 빈 context 에서 실행: basic 노드의 실행 config (콜백) 를 물려받으면
+    # 재검색 체인의 토큰이 basic 노드 이벤트로 스트리밍되어 답변에 섞임
+    task = asyncio.create_task(
+        _speculative_hyde(dict(state), job), context=contextvars.Context()
+    )
+    _hyde_jobs[job_id] = (task, job)
+    state["hyde_job"] = job_id
+    counts["attempts"] += 1
+
+
+async def _commit_hyde_speculation(state: ChatState) -> ChatState:
+    """bad 면 미리 재검색한 결과를 state 에 반영, 아니면 취소하고 쓴 토큰을 낭비로 집계"""
+    counts = _hyde_counts
+    state["hyde_ready"] = False
+    if not state["retry"]:
+        bad = float(state["answer_quality"] == "bad")
+        rate = _hyde_bad_rate
+        rate["value"] = (
+            bad
+            if rate["value"] is None
+            else (1 - rate["alpha"]) * rate["value"] + rate["alpha"] * bad
+        )
+
+    entry = _hyde_jobs.pop(state.get("hyde_job") or "", None)
+    state["hyde_job"] = None
+    if entry is None:
+        return state
+    task, job = entry
+
+    if state["answer_quality"] != "bad":
+        task.cancel()
+        # 취소 완료까지 기다려야 사용 토큰이 기록됨 (응답 전에 끊긴 호출은 집계되지 않음)
+        await asyncio.wait([task])
+        counts["discarded"] += 1
+        counts["tokens"] += job["tokens"]
+        counts["wasted_tokens"] += job["tokens"]
+        return state
+
+    start = time.perf_counter()
+    try:
+        speculated = await task
+    except Exception as e:  # 실패하면 원래 순서대로 다시 검색
+        print(f"[speculative_hyde] 실패, 순차 실행으로 전환: {str(e)}")
+        counts["errors"] += 1
+        counts["tokens"] += job["tokens"]
+        counts["wasted_tokens"] += job["tokens"]
+        return state
+
+    for key in HYDE_KEYS:
+        state[key] = speculated.get(key)
+    state["hyde_ready"] = True
+    counts["used"] += 1
+    counts["tokens"] += job["tokens"]
+    # 순차 실행이면 재검색 전체, 동시 실행이면 평가 후 남은 대기 시간만 걸린다
+    counts["seconds_saved"] += max(job["seconds"] - (time.perf_counter() - start), 0)
+    print(f"[speculative_hyde] 채택 - queries={state['queries']}")
+    return state
+
+
+def hyde_speculation_stats():
+    counts = _hyde_counts
+    settled = counts["used"] + counts["discarded"]
+    return {
+        **counts,
+        "enabled": SPECULATIVE_HYDE,
+        "in_flight": len(_hyde_jobs),
+        "use_rate": counts["used"] / settled if settled else 0.0,
+        "bad_rate": _hyde_bad_rate["value"],
+        "seconds_saved": round(counts["seconds_saved"], 3),
+    }
+
+
+register_stats("speculative_hyde", hyde_speculation_stats)
+
+
+def _short_chat_inputs(state: ChatState) -> Dict[str, Any]:
+    return {
+        "question": _question_with_image(state),
+        "context": state.get("messages", [])[-4:],
+    }
 
 
 # (5) 일상 질문 답변 노드
 def simple(state: ChatState):
     print("일상 질문 답변 노드 시작")
-    image_text = state.get("image_analysis")
-    question = state["question"]
-    chat_history = state.get("messages", [])
-    chat_history = chat_history[-4:]
-
-    # 이미지 분석 결과가 있으면 질문에 포함시킴
-    if state.get("image_analysis"):
-        question = (
-            f"사용자의 이번 질문:{question}"
-            + "\n"
-            + f'사용자가 이번에 혹은 이전에 첨부한 이미지에 대한 설명: {state.get("image_analysis")}'
-        )
 
     # 검색된 결과를 바탕으로 답변 생성
-    answer = simple_chain.invoke(
-        {
-            "question": question,
-            "context": chat_history,
-        }
-    ).strip()
+    answer = simple_chain.invoke(_short_chat_inputs(state)).strip()
 
     state["answer"] = answer
 
     return state  # 답변을 반환
 
 
+async def asimple(state: ChatState):
+    print("일상 질문 답변 노드 시작")
+
+    answer = await simple_chain.ainvoke(_short_chat_inputs(state))
+
+    state["answer"] = answer.strip()
+
+    return state
+
+
 # (5) 답변할 수 없는 질문(구글 api 혹은 일상 질문 아닌 경우)
 def impossible(state: ChatState):
     print("답변 불가 노드 시작")
-    image_text = state.get("image_analysis")
-    question = state["question"]
-    chat_history = state.get("messages", [])
-    chat_history = chat_history[-4:]
 
-    # 이미지 분석 결과가 있으면 질문에 포함시킴
-    if state.get("image_analysis"):
-        question = (
-            f"사용자의 이번 질문:{question}"
-            + "\n"
-            + f'사용자가 이번에 혹은 이전에 첨부한 이미지에 대한 설명: {state.get("image_analysis")}'
-        )
-
-    # 검색된 결과를 바탕으로 답변 생성
-    answer = imp_chain.invoke(
-        {
-            "question": question,
-            "context": chat_history,
-        }
-    ).strip()
+    answer = imp_chain.invoke(_short_chat_inputs(state)).strip()
 
     state["answer"] = answer
 
     return state  # 답변을 반환
 
 
-def evaluate_answer_node(state: ChatState) -> str:
-    """
-    답변 품질 평가 후, 결과 문자열("good"/"bad")을 반환.
-    """
-    answer = state["answer"]
-    history = state.get("messages", [])
-    question = state["question"]
+async def aimpossible(state: ChatState):
+    print("답변 불가 노드 시작")
 
-    context = "\n".join(state.get("search_results", []))  # 원본 문서
-    context_qa = "\n".join(state.get("qa_search_results", []))  # QA 문서
+    answer = await imp_chain.ainvoke(_short_chat_inputs(state))
 
-    result = quality_chain.invoke(
-        {
-            "history": history[-4:],
-            "question": question,
-            "context": context,
-            "context_qa": context_qa,
-            "answer": answer,
-        }
-    ).strip()
+    state["answer"] = answer.strip()
+
+    return state
 
+
+def _quality_inputs(state: ChatState) -> Dict[str, Any]:
+    context = state.get("context") or {}
+    return {
+        "history": state.get("messages", [])[-4:],
+        "question": state["question"],
+        # basic 노드가 조립한 문맥 (중복 제거 / 예산 적용), 없으면 검색 결과 전체
+        "context": context.get(
+            "context_text", "\n".join(state.get("search_results", []))
+        ),  # 원본 문서
+        "context_qa": context.get(
+            "context_qa", "\n".join(state.get("qa_search_results", []))
+        ),  # QA 문서
+        "answer": state["answer"],
+    }
+
+
+def _apply_quality(state: ChatState, result: str) -> ChatState:
     state["answer_quality"] = result
 
     if state.get("classify") in ["basic", "none"]:
@@ -427,6 +917,85 @@ def evaluate_answer_node(state: ChatState) -> str:
     return state
 
 
+def _grounding_chunks(state: ChatState) -> List[str]:
+    """답변 생성에 들어간 검색 청크, 점수 순 (basic 노드 문맥 예산에서 빠진 청크는 제외)"""
+    chunks = state.get("search_results", []) + state.get("qa_search_results", [])
+    if state.get("retry"):
+        chunks += state.get("hyde_text_results", []) + state.get("hyde_qa_results", [])
+    context = "\n".join((state.get("context") or {}).values())
+    chunks = [c for c in dict.fromkeys(chunks) if not context or c in context]
+    scores = state.get("context_scores") or {}
+    return sorted(chunks, key=lambda c: scores.get(c, 0.0), reverse=True)
+
+
+def _check_grounding(state: ChatState):
+    """로컬 근거성 검사 (검색 청크는 다시 임베딩하지 않고 Chroma 에 저장된 벡터 사용)"""
+    chunks = _grounding_chunks(state)
+    refs = state.get("chunk_ids") or {}
+    refs = {c: tuple(refs[c]) for c in chunks if c in refs}
+    vectors = {}
+    if refs:
+        try:
+            vectors = stored_embeddings(refs)
+        except Exception as e:
+            print(f"[evaluate_answer_node] 저장된 청크 임베딩 조회 실패: {e}")
+    return groundedness.check(state["answer"], chunks, vectors)
+
+
+def _local_quality(verdict):
+    """로컬 판단을 쓸 수 있으면 "good"/"bad", 아니면 None (LLM 평가)"""
+    local = groundedness.decide(verdict)
+    if local is not None:
+        print(
+            f"[evaluate_answer_node] 로컬 판단: {local} "
+            f"({verdict.source}, score={verdict.score})"
+        )
+    return local
+
+
+def evaluate_answer_node(state: ChatState) -> str:
+    """
+    답변 품질 평가 후, 결과 문자열("good"/"bad")을 반환.
+    """
+    verdict = None
+    if groundedness.should_check():
+        verdict = _check_grounding(state)
+        local = _local_quality(verdict)
+        if local is not None:
+            return _apply_quality(state, local)
+
+    result = quality_chain.invoke(_quality_inputs(state)).strip()
+    if verdict is not None:
+        groundedness.record(state["question"], verdict, result)
+
+    return _apply_quality(state, result)
+
+
+async def aevaluate_answer_node(state: ChatState) -> ChatState:
+    verdict = local = None
+    if groundedness.should_check():
+        verdict = await asyncio.to_thread(_check_grounding, state)
+        local = _local_quality(verdict)
+
+    if local is not None:
+        _apply_quality(state, local)
+    else:
+        result = (await quality_chain.ainvoke(_quality_inputs(state))).strip()
+        if verdict is not None:
+            groundedness.record(state["question"], verdict, result)
+        _apply_quality(state, result)
+
+    return await _commit_hyde_speculation(state)
+
+
+def route_from_evaluate(state):
+    quality = state["answer_quality"]
+    # 미리 재검색한 결과를 채택했으면 대체 쿼리 생성 / 검색을 건너뛰고 바로 답변
+    if quality == "bad" and state.get("hyde_ready"):
+        return "bad_speculative"
+    return quality
+
+
 def generate_alternative_queries(state: ChatState) -> ChatState:
     """
     답변 품질이 'bad'로 평가되었을 때 대체 질문 2개를 생성
@@ -438,16 +1007,31 @@ def generate_alternative_queries(state: ChatState) -> ChatState:
         # 이미 한 번 fallback을 돌았다면 재실행하지 않음
         return state
 
-    question = state["question"]
-    history = state.get("messages", [])[-4:]
-
     response = alt_query_chain.invoke(
         {
-            "history": history,
-            "question": question,
+            "history": state.get("messages", [])[-4:],
+            "question": state["question"],
+        }
+    )
+
+    return _apply_alternative_queries(state, response)
+
+
+async def agenerate_alternative_queries(state: ChatState) -> ChatState:
+    if state.get("retry", False):
+        return state
+
+    response = await alt_query_chain.ainvoke(
+        {
+            "history": state.get("messages", [])[-4:],
+            "question": state["question"],
         }
     )
 
+    return _apply_alternative_queries(state, response)
+
+
+def _apply_alternative_queries(state: ChatState, response: Dict[str, Any]) -> ChatState:
     new_queries = response.get("docs", [])
 
     print("[generate_alternative_queries] 생성된 쿼리:", new_queries)
@@ -1,18 +1,38 @@
 from langgraph.graph import StateGraph, END
 from .rag2 import basic_chain_setting
 from .retriever import retriever_setting
-from langgraph.checkpoint.memory import MemorySaver
+from .checkpointer import create_checkpointer
 from .langgraph_node2 import *
 
+# 노드 이름 → (동기 함수, 비동기 함수)
+NODES = {
+    "analyze_image": (analyze_image, aanalyze_image),
+    "classify": (classify, aclassify),
+    "extract_queries": (extract_queries, extract_queries),
+    "split_queries": (split_queries, asplit_queries),
+    "basic": (basic_langgraph_node, abasic_langgraph_node),
+    "simple": (simple, asimple),
+    "impossible": (impossible, aimpossible),
+    "tool": (tool_based_search_node, atool_based_search_node),
+    "evaluate": (evaluate_answer_node, aevaluate_answer_node),
+    "generate_queries": (generate_alternative_queries, agenerate_alternative_queries),
+}
+
 
 # 그래프 설정
-def graph_setting():
+def graph_setting(use_async=False):
+    """
+    use_async=True 이면 ainvoke 전용 비동기 노드로 그래프를 구성
+    (이벤트 루프를 막지 않으므로 FastAPI 에서는 비동기 그래프를 사용)
+    """
+    node = {name: fns[1] if use_async else fns[0] for name, fns in NODES.items()}
+
     # LangGraph 정의
     graph = StateGraph(ChatState)
 
     # 노드 등록
-    graph.add_node("analyze_image", analyze_image)
-    graph.add_node("classify", classify)
+    graph.add_node("analyze_image", node["analyze_image"])
+    graph.add_node("classify", node["classify"])
 
     # classify 후 route와 level에 따라 분기
     graph.add_conditional_edges(
@@ -20,22 +40,30 @@ def graph_setting():
         route_from_classify,  # classify 함수에서 route를 분류
         {
             "api": "extract_queries",
+            "api_speculative": "basic",  # SPECULATIVE_SEARCH: 검색을 이미 마침
             "basic": "simple",
             "none": "impossible",
         },
     )
 
-    graph.add_node("extract_queries", extract_queries)  # 질문 통합 + 쿼리 추출 노드
-    graph.add_node("split_queries", split_queries)  # 질문 분리 툴
-    graph.add_node("basic", basic_langgraph_node)  # 기본 답변 노드
-    graph.add_node("simple", simple)
-    graph.add_node("impossible", impossible)
-    graph.add_node("tool", tool_based_search_node)
-    graph.add_node("evaluate", evaluate_answer_node)
-    graph.add_node("generate_queries", generate_alternative_queries)
+    # 질문 통합 + 쿼리 추출 노드
+    graph.add_node("extract_queries", node["extract_queries"])
+    graph.add_node("split_queries", node["split_queries"])  # 질문 분리 툴
+    graph.add_node("basic", node["basic"])  # 기본 답변 노드
+    graph.add_node("simple", node["simple"])
+    graph.add_node("impossible", node["impossible"])
+    graph.add_node("tool", node["tool"])
+    graph.add_node("evaluate", node["evaluate"])
+    graph.add_node("generate_queries", node["generate_queries"])
 
-    # 시작 노드 정의
-    graph.set_entry_point("analyze_image")
+    # 시작 노드 정의 (이미지가 있을 때만 이미지 분석)
+    graph.set_conditional_entry_point(
+        route_from_start,
+        {
+            "image": "analyze_image",
+            "text": "classify",
+        },
+    )
 
     # 흐름 설정
     graph.add_edge("analyze_image", "classify")
@@ -46,10 +74,11 @@ def graph_setting():
 
     graph.add_conditional_edges(
         "evaluate",
-        lambda state: state["answer_quality"],  # good / bad
+        route_from_evaluate,  # good / bad
         {
             "good": END,
             "bad": "generate_queries",
+            "bad_speculative": "basic",  # SPECULATIVE_HYDE: 재검색을 이미 마침
             "final": END,
         },
     )
@@ -59,8 +88,8 @@ def graph_setting():
     graph.add_edge("simple", END)  # 일상 질문 시 답변 후 종료
     graph.add_edge("impossible", END)
 
-    # 그래프 컴파일
-    memory = MemorySaver()
+    # 그래프 컴파일 (대화 수 / 대화별 체크포인트 수에 상한이 있는 checkpointer)
+    memory = create_checkpointer()
     compiled_graph = graph.compile(checkpointer=memory)
 
     return compiled_graph
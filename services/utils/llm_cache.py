@@ -0,0 +1,301 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.load import dumpd
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ensure_config
+
+from .metrics import register_stats
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+LLM_CACHE = os.getenv("LLM_CACHE", "memory")  # off | memory | sqlite
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(HERE, "llm_cache.sqlite3"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "4096"))  # 백엔드 최대 항목 수
+
+# 체인별 TTL(초) 기본값, LLM_CACHE_TTLS="classify=600,quality=0" 처럼 덮어쓰기 (0 = 캐시 안 함)
+DEFAULT_TTLS = {
+    "classify": 86400,
+    "query": 86400,
+    "alt_query": 86400,
+    "quality": 3600,
+}
+
+
+def _parse_ttls(value: str) -> Dict[str, int]:
+    ttls = {}
+    for item in filter(None, (v.strip() for v in value.split(","))):
+        name, _, seconds = item.partition("=")
+        ttls[name.strip()] = int(seconds)
+    return ttls
+
+
+CHAIN_TTLS = {**DEFAULT_TTLS, **_parse_ttls(os.getenv("LLM_CACHE_TTLS", ""))}
+
+
+class MemoryBackend:
+    """프로세스 내 LRU (만료 시각 포함)"""
+
+    def __init__(self, max_entries: int = LLM_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item["expires"] < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item
+
+    def set(self, key: str, item: Dict[str, Any]):
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SqliteBackend:
+    """
+    디스크 캐시 (재시작 후에도 유지, 값은 JSON 으로 저장)
+    - 시작할 때와 prune_every 번 쓸 때마다 만료된 행을 지우고,
+      max_entries 를 넘으면 만료가 가장 이른 행부터 지운다
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        max_entries: int = LLM_CACHE_SIZE,
+        prune_every: int = 100,
+    ):
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._writes = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, item TEXT, expires REAL)"
+            )
+            self._prune()
+            self._db.commit()
+
+    def _prune(self):
+        """만료된 행 + 최대 항목 수를 넘는 행 삭제 (lock 안에서 호출)"""
+        self._db.execute("DELETE FROM llm_cache WHERE expires < ?", (time.time(),))
+        count = self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY expires LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT item FROM llm_cache WHERE key = ? AND expires >= ?",
+                (key, time.time()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, item: Dict[str, Any]):
+        try:
+            payload = json.dumps(item, ensure_ascii=False)
+        except TypeError:  # JSON 으로 저장할 수 없는 출력은 캐시하지 않음
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)",
+                (key, payload, item["expires"]),
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune()
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+def _fingerprint(chain) -> str:
+    """체인의 프롬프트 템플릿 + 모델 설정 (프롬프트나 모델이 바뀌면 키도 바뀐다)"""
+    parts = []
+    for step in getattr(chain, "steps", [chain]):
+        if isinstance(step, (BasePromptTemplate, BaseLanguageModel)):
+            parts.append(dumpd(step))
+        else:
+            parts.append(type(step).__name__ + ":" + str(getattr(step, "name", "")))
+    return json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _temperature(chain) -> float:
+    for step in getattr(chain, "steps", [chain]):
+        if isinstance(step, BaseLanguageModel):
+            return getattr(step, "temperature", 0) or 0
+    return 0
+
+
+class CachedChain(Runnable):
+    """
+    temperature 0 체인용 exact-match 캐시
+    - 키: sha256(체인 이름 + 프롬프트 템플릿 + 모델 설정 + 입력)
+    - miss 일 때 실제 호출의 토큰 사용량 / 소요 시간을 같이 저장해서 hit 마다 절약량 집계
+    - 호출 시 받은 config(callbacks 등)는 그대로 원래 체인에 넘긴다
+    """
+
+    def __init__(self, chain, name: str, ttl: int, backend):
+        self.chain = chain
+        self.name = name
+        self.ttl = ttl
+        self.backend = backend
+        self._fingerprint = _fingerprint(chain)
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(
+            ["hits", "misses", "tokens_saved", "seconds_saved"], 0
+        )
+
+    def _key(self, input) -> str:
+        payload = json.dumps(
+            [self.name, self._fingerprint, input],
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _hit(self, key):
+        item = self.backend.get(key)
+        if item is None:
+            return None
+        with self._lock:
+            self.counts["hits"] += 1
+            self.counts["tokens_saved"] += item["tokens"]
+            self.counts["seconds_saved"] += item["seconds"]
+        # 호출한 쪽에서 결과(dict 등)를 수정해도 캐시가 바뀌지 않도록 복사본 반환
+        return copy.deepcopy(item["output"])
+
+    def _config(self, config):
+        usage = UsageMetadataCallbackHandler()
+        config = ensure_config(config)
+        callbacks = config.get("callbacks")
+        if callbacks is None:
+            callbacks = [usage]
+        elif isinstance(callbacks, list):
+            callbacks = callbacks + [usage]
+        else:  # CallbackManager
+            callbacks = callbacks.copy()
+            callbacks.add_handler(usage, inherit=True)
+        return {**config, "callbacks": callbacks}, usage
+
+    def _store(self, key, output, usage, seconds):
+        tokens = sum(u.get("total_tokens", 0) for u in usage.usage_metadata.values())
+        with self._lock:
+            self.counts["misses"] += 1
+        self.backend.set(
+            key,
+            {
+                "output": copy.deepcopy(output),
+                "tokens": tokens,
+                "seconds": seconds,
+                "expires": time.time() + self.ttl,
+            },
+        )
+
+    def invoke(self, input, config=None, **kwargs):
+        key = self._key(input)
+        cached = self._hit(key)
+        if cached is not None:
+            return cached
+        config, usage = self._config(config)
+        start = time.perf_counter()
+        output = self.chain.invoke(input, config, **kwargs)
+        self._store(key, output, usage, time.perf_counter() - start)
+        return output
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        key = self._key(input)
+        cached = self._hit(key)
+        if cached is not None:
+            return cached
+        config, usage = self._config(config)
+        start = time.perf_counter()
+        output = await self.chain.ainvoke(input, config, **kwargs)
+        self._store(key, output, usage, time.perf_counter() - start)
+        return output
+
+
+_backend = None
+_backend_lock = threading.Lock()
+CACHED_CHAINS: Dict[str, CachedChain] = {}
+
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if LLM_CACHE == "sqlite":
+                    _backend = SqliteBackend()
+                else:
+                    _backend = MemoryBackend()
+                register_stats("llm_cache", llm_cache_stats)
+    return _backend
+
+
+def cached_chain(chain, name: str, ttl: Optional[int] = None):
+    """
+    deterministic 체인을 캐시로 감싼다
+    - LLM_CACHE=off, TTL 0, temperature > 0 (simple_chain 등) 이면 원래 체인을 그대로 반환
+    """
+    ttl = CHAIN_TTLS.get(name, 0) if ttl is None else ttl
+    if LLM_CACHE == "off" or ttl <= 0:
+        return chain
+    if _temperature(chain) > 0:
+        logger.warning(f"-------- '{name}' 체인은 temperature > 0 이라 캐시하지 않음")
+        return chain
+    CACHED_CHAINS[name] = CachedChain(chain, name, ttl, _get_backend())
+    return CACHED_CHAINS[name]
+
+
+def llm_cache_stats():
+    chains = {
+        name: {**c.counts, "seconds_saved": round(c.counts["seconds_saved"], 3)}
+        for name, c in CACHED_CHAINS.items()
+    }
+    hits = sum(c["hits"] for c in chains.values())
+    lookups = hits + sum(c["misses"] for c in chains.values())
+    return {
+        "backend": LLM_CACHE,
+        "size": len(_backend) if _backend is not None else 0,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "tokens_saved": sum(c["tokens_saved"] for c in chains.values()),
+        "seconds_saved": round(sum(c["seconds_saved"] for c in chains.values()), 3),
+        "chains": chains,
+    }
@@ -0,0 +1,22 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 이름 → 통계 dict 를 돌려주는 함수 (캐시 적중률 등, /metrics 에서 한 번에 조회)
+STATS = {}
+
+
+def register_stats(name, fn):
+    STATS[name] = fn
+    return fn
+
+
+def collect_stats():
+    report = {}
+    for name, fn in STATS.items():
+        try:
+            report[name] = fn()
+        except Exception as e:  # 통계 하나가 실패해도 나머지는 보여준다
+            logger.warning(f"-------- stats '{name}' 수집 실패: {e}")
+            report[name] = {"error": str(e)}
+    return report
@@ -0,0 +1,289 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .embedding_cache import get_shared_embeddings
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PRECLASSIFIER = os.getenv("PRECLASSIFIER", "rules")  # off | rules | logreg
+# true 면 로컬 판단을 사용하지 않고 LLM 결과와 비교만 (커버리지 / 일치율 측정)
+# 일치율을 확인하기 전까지는 shadow 가 기본 (false 로 바꿔야 LLM 호출을 생략)
+PRECLASSIFIER_SHADOW = os.getenv("PRECLASSIFIER_SHADOW", "true").lower() == "true"
+PRECLASSIFIER_MODEL = os.getenv(
+    "PRECLASSIFIER_MODEL", os.path.join(HERE, "preclassifier.npz")
+)
+PRECLASSIFIER_MIN_PROB = float(os.getenv("PRECLASSIFIER_MIN_PROB", "0.9"))
+# 지정하면 LLM 분류 결과를 JSONL 로 기록 (logreg 학습 / 오프라인 비교용)
+PRECLASSIFIER_LOG = os.getenv("PRECLASSIFIER_LOG")
+
+LABELS = ("api", "basic", "none")
+
+# 질문 전체가 인사 / 감사 표현이면 basic
+GREETING = re.compile(
+    r"^(안녕|안녕하세요|안녕하십니까|하이|하이요|ㅎㅇ|hi|hello|hey|헬로|"
+    r"반가워|반가워요|반갑습니다|고마워|고마워요|감사|감사해요|감사합니다|"
+    r"땡큐|thanks|thank you|굿모닝|좋은 아침|수고하세요|수고하셨습니다)$"
+)
+# 자음 / 모음만 나열 (ㅋㅋㅋ, ㅇㄹㄴㄹ) → classify 프롬프트 기준 none
+JAMO_ONLY = re.compile(r"^[ㄱ-ㅎㅏ-ㅣ\s]+$")
+# 개발 질문 신호 (제품명과 같이 나와야 api)
+DEV_WORDS = ("api", "sdk", "oauth", "rest", "json", "endpoint", "엔드포인트")
+DEV_WORDS += ("python", "파이썬", "javascript", "자바스크립트", "java", "자바")
+DEV_WORDS += ("라이브러리", "library", "연동", "호출", "개발", "스크립트", "script")
+DEV_WORDS += ("할당량", "quota", "scope", "스코프", "서비스 계정", "service account")
+DEV_WORDS += ("client id", "클라이언트 id", "샘플 코드", "예제 코드")
+# 구글 제품이 분명한 단어 (개발 신호가 있을 때만 api, "gmail 비밀번호" 같은 사용 질문 제외)
+PRODUCT_WORDS = ("gmail", "firestore", "firebase", "bigquery")
+PRODUCT_WORDS += ("파이어스토어", "파이어베이스", "빅쿼리")
+
+
+class Prediction(NamedTuple):
+    label: str
+    source: str  # rules | logreg
+    confidence: float
+
+
+def _clean(text: str) -> str:
+    text = unicodedata.normalize("NFC", text or "").lower()
+    text = re.sub(r"[^\w\sㄱ-ㅎㅏ-ㅣ]", " ", text)
+    return " ".join(text.split())
+
+
+def _word_pattern(words) -> re.Pattern:
+    """단어 경계로 매칭 ("maps" 안의 "map" 제외, "드라이브에서" 처럼 조사가 붙는 건 허용)"""
+    alternatives = "|".join(re.escape(w) for w in sorted(words, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)(?:{alternatives})(?![a-z0-9])")
+
+
+def _tag_words(tag: str, label: str):
+    """태그 하나의 (API 이름, 제품 이름)"""
+    english, _, korean = label.partition(" (")
+    names, bare_words = set(), {tag.replace("_", " ")}
+    for name in (english, korean.rstrip(")")):
+        bare = _clean(name).replace(" api", "").strip()
+        names.add(bare)
+        if bare.startswith(("google ", "구글 ")):
+            bare_words.add(bare.split(" ", 1)[1])
+    names |= bare_words & set(PRODUCT_WORDS)
+    return {f"{bare} api" for bare in names | bare_words}, names
+
+
+def api_lexicon(api_options: Dict[str, str]):
+    """
+    GOOGLE_API_OPTIONS 에서 어휘 생성
+    - API 이름 ("google drive api", "구글 드라이브 api", "드라이브 api"): 있으면 바로 api
+    - 제품 이름 ("구글 드라이브", "gmail"): 개발 신호(DEV_WORDS)와 같이 나오면 api
+    - "map", "메일", "시트" 같은 일반 단어만으로는 판단하지 않음
+    """
+    phrases, names = set(), set(PRODUCT_WORDS)
+    for tag, label in api_options.items():
+        tag_phrases, tag_names = _tag_words(tag, label)
+        phrases |= tag_phrases
+        names |= tag_names
+    return sorted(phrases), sorted(names)
+
+
+class ApiMentions:
+    """텍스트에 이름이 나온 API 태그 (api_lexicon 과 같은 어휘, 단어 경계로 매칭)"""
+
+    def __init__(self, api_options: Dict[str, str]):
+        self.patterns = {
+            tag: _word_pattern(set.union(*_tag_words(tag, label)))
+            for tag, label in api_options.items()
+        }
+
+    def __call__(self, text: str) -> List[str]:
+        text = _clean(text)
+        return sorted(
+            tag for tag, pattern in self.patterns.items() if pattern.search(text)
+        )
+
+
+class LogisticClassifier:
+    """bge-m3 임베딩 위의 다항 로지스틱 회귀 (numpy 전용, 저장은 npz)"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels=LABELS):
+        self.weights = np.asarray(weights, dtype=np.float32)  # (dim, 클래스 수)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.labels = tuple(labels)
+
+    def predict_proba(self, vectors) -> np.ndarray:
+        logits = np.atleast_2d(vectors) @ self.weights + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        prob = np.exp(logits)
+        return prob / prob.sum(axis=1, keepdims=True)
+
+    @classmethod
+    def fit(cls, vectors, labels: List[str], epochs=500, lr=0.5, l2=1e-4):
+        x = np.asarray(vectors, dtype=np.float32)
+        classes = [c for c in LABELS if c in set(labels)]
+        y = np.eye(len(classes), dtype=np.float32)[[classes.index(l) for l in labels]]
+        model = cls(
+            np.zeros((x.shape[1], len(classes))), np.zeros(len(classes)), classes
+        )
+        for _ in range(epochs):  # full-batch gradient descent
+            grad = (model.predict_proba(x) - y) / len(x)
+            model.weights -= lr * (x.T @ grad + l2 * model.weights)
+            model.bias -= lr * grad.sum(axis=0)
+        return model
+
+    def save(self, path: str):
+        np.savez(
+            path, weights=self.weights, bias=self.bias, labels=np.array(self.labels)
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        data = np.load(path)
+        return cls(data["weights"], data["bias"], [str(l) for l in data["labels"]])
+
+
+class PreClassifier:
+    """
+    classify LLM 호출 전 로컬 분류 (확신할 때만 결과를 내고, 아니면 None → LLM)
+    - rules: 구글 API 이름 / 제품 이름 + 개발 신호 → api, 인사 → basic, 자모 나열 → none
+    - logreg: 규칙이 판단 못 하면 임베딩 로지스틱 회귀 (확률 min_prob 이상일 때만)
+    - 이전 대화가 있으면 API 이름이 있는 질문만 판단 ("ㅇㅇ" 같은 답은 문맥에 따라 다름)
+    - shadow: 로컬 판단은 기록만 하고 항상 LLM 결과 사용
+    """
+
+    def __init__(
+        self,
+        api_options: Dict[str, str],
+        mode: str = PRECLASSIFIER,
+        shadow: bool = PRECLASSIFIER_SHADOW,
+        model_path: str = PRECLASSIFIER_MODEL,
+        min_prob: float = PRECLASSIFIER_MIN_PROB,
+        log_path: Optional[str] = PRECLASSIFIER_LOG,
+        embeddings=None,
+    ):
+        self.mode = mode
+        self.shadow = shadow
+        self.min_prob = min_prob
+        self.log_path = log_path
+        phrases, names = api_lexicon(api_options)
+        self.phrases = _word_pattern(phrases)
+        self.names = _word_pattern(names)
+        self.dev_words = _word_pattern(DEV_WORDS)
+        self._embeddings = embeddings
+        self.model = None
+        if mode == "logreg":
+            if os.path.exists(model_path):
+                self.model = LogisticClassifier.load(model_path)
+            else:
+                logger.warning(
+                    f"-------- preclassifier 모델 없음, 규칙만 사용: {model_path}"
+                )
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(["total", "decided", "fallthrough"], 0)
+        self.sources = {"rules": 0, "logreg": 0}
+        self.shadow_counts = dict.fromkeys(["compared", "agree"], 0)
+        self.confusion = {}  # "로컬->LLM": 건수
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def uses_embeddings(self) -> bool:
+        return self.model is not None
+
+    def rules(self, question: str, has_history: bool = False) -> Optional[str]:
+        text = _clean(question)
+        if self.phrases.search(text):
+            return "api"
+        if self.names.search(text) and self.dev_words.search(text):
+            return "api"
+        if has_history:
+            return None
+        if not text or (JAMO_ONLY.match(text) and not GREETING.match(text)):
+            return "none"
+        if GREETING.match(text):
+            return "basic"
+        return None
+
+    def predict(
+        self, question: str, image: Optional[str] = None, has_history: bool = False
+    ) -> Optional[Prediction]:
+        """image 가 있는 턴은 질문만으로 판단할 수 없으므로 LLM 에 맡긴다"""
+        if not self.enabled or image:
+            return None
+        label = self.rules(question, has_history)
+        if label:
+            return Prediction(label, "rules", 1.0)
+        if self.model is not None and not has_history:
+            if self._embeddings is None:
+                self._embeddings = get_shared_embeddings()
+            vector = self._embeddings.embed_query(_clean(question))
+            prob = self.model.predict_proba(vector)[0]
+            best = int(np.argmax(prob))
+            if prob[best] >= self.min_prob:
+                return Prediction(self.model.labels[best], "logreg", float(prob[best]))
+        return None
+
+    def decide(self, prediction: Optional[Prediction]) -> Optional[str]:
+        """분류에 사용할 로컬 결과 (shadow 이거나 판단 못 했으면 None)"""
+        with self._lock:
+            self.counts["total"] += 1
+            if prediction is not None:
+                self.sources[prediction.source] += 1
+            if prediction is None or self.shadow:
+                self.counts["fallthrough"] += 1
+                return None
+            self.counts["decided"] += 1
+            return prediction.label
+
+    def record(self, question: str, prediction: Optional[Prediction], llm_label: str):
+        """LLM 분류 결과와 로컬 판단 비교 (shadow) + 학습용 로그"""
+        if prediction is not None:
+            with self._lock:
+                self.shadow_counts["compared"] += 1
+                self.shadow_counts["agree"] += prediction.label == llm_label
+                if prediction.label != llm_label:
+                    key = f"{prediction.label}->{llm_label}"
+                    self.confusion[key] = self.confusion.get(key, 0) + 1
+        if self.log_path:
+            row = {
+                "time": time.time(),
+                "question": question,
+                "llm": llm_label,
+                "local": prediction.label if prediction else None,
+                "source": prediction.source if prediction else None,
+                "confidence": prediction.confidence if prediction else None,
+            }
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            shadow = dict(self.shadow_counts)
+            confusion = dict(self.confusion)
+            sources = dict(self.sources)
+        predicted = sum(sources.values())
+        return {
+            "mode": self.mode,
+            "shadow": self.shadow,
+            **counts,
+            # 로컬에서 판단할 수 있었던 비율 (shadow 여도 집계)
+            "coverage": predicted / counts["total"] if counts["total"] else 0.0,
+            "sources": sources,
+            "agreement": (
+                shadow["agree"] / shadow["compared"] if shadow["compared"] else None
+            ),
+            "compared": shadow["compared"],
+            "confusion": confusion,
+        }
@@ -0,0 +1,224 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from .components import component
+from .metrics import register_stats
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RERANKER = os.getenv("RERANKER", "false").lower() == "true"
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "BAAI/bge-reranker-v2-m3")
+RERANKER_DEVICE = os.getenv("RERANKER_DEVICE", "cpu")
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "512"))
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+# 턴 전체(모든 쿼리)에서 남길 원문 / QA 청크 수
+RERANKER_TOP_TEXT = int(os.getenv("RERANKER_TOP_TEXT", "6"))
+RERANKER_TOP_QA = int(os.getenv("RERANKER_TOP_QA", "10"))
+# 이 시간을 넘길 것 같거나 넘기면 재정렬을 건너뛰고 하이브리드 순위 그대로 사용
+RERANKER_BUDGET_MS = float(os.getenv("RERANKER_BUDGET_MS", "800"))
+RERANKER_CACHE_SIZE = int(os.getenv("RERANKER_CACHE_SIZE", "20000"))
+
+
+class CrossEncoderReranker:
+    """
+    한 턴의 검색 후보 (쿼리, 청크) 쌍을 cross-encoder 로 점수 매겨 상위 N 개만 남김
+    - 후보는 모든 쿼리 결과의 합집합, 청크 점수는 그 청크를 찾은 쿼리들 중 최고 점수
+    - 상위 N 개 + 쿼리별 최고 청크를 남김
+    - (쿼리, 청크 해시) → 점수 LRU 캐시, 캐시에 없는 쌍만 배치로 계산
+    - 모델 호출은 한 번에 하나 (CPU 경합 방지), 대기 시간도 예산에 포함
+    - 예상 시간(쌍당 평균 × 쌍 수)이 예산을 넘거나 계산 중 예산을 넘기면 재정렬 안 함
+    """
+
+    def __init__(
+        self,
+        model,
+        batch_size: int = RERANKER_BATCH_SIZE,
+        top_text: int = RERANKER_TOP_TEXT,
+        top_qa: int = RERANKER_TOP_QA,
+        budget_ms: float = RERANKER_BUDGET_MS,
+        cache_size: int = RERANKER_CACHE_SIZE,
+    ):
+        self.model = model  # predict(pairs, batch_size=...) 를 가진 객체 (CrossEncoder)
+        self.batch_size = batch_size
+        self.top_n = {"text": top_text, "qa": top_qa}
+        self.budget = budget_ms / 1000
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        self._pair_seconds = None  # 쌍 하나당 평균 시간 (EWMA)
+        self.counts = dict.fromkeys(
+            [
+                "turns",
+                "reranked",
+                "skipped_budget",
+                "timeouts",
+                "pairs",
+                "cache_hits",
+                "scored",
+                "dropped",
+            ],
+            0,
+        )
+        self.seconds = 0.0
+
+    @staticmethod
+    def _key(query: str, chunk: str) -> Tuple[str, str]:
+        return query, hashlib.sha1(chunk.encode("utf-8")).hexdigest()
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self.counts[name] += delta
+
+    def score(self, pairs: Sequence[Tuple[str, str]]) -> Optional[List[float]]:
+        """(쿼리, 청크) 쌍 점수, 예산을 넘기면 None (계산한 배치는 캐시에 남김)"""
+        start = time.perf_counter()
+        keys = [self._key(q, c) for q, c in pairs]
+        scores = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+        missing = [i for i, key in enumerate(keys) if key not in scores]
+        self._count(pairs=len(pairs), cache_hits=len(pairs) - len(missing))
+
+        if missing and self._pair_seconds is not None:
+            if self._pair_seconds * len(missing) > self.budget:
+                self._count(skipped_budget=1)
+                # 일시적으로 느렸던 측정값 때문에 계속 건너뛰지 않도록 조금씩 낮춤
+                with self._lock:
+                    self._pair_seconds *= 0.95
+                return None
+
+        with self._model_lock:
+            for i in range(0, len(missing), self.batch_size):
+                if time.perf_counter() - start > self.budget:
+                    self._count(timeouts=1)
+                    return None
+                batch = missing[i : i + self.batch_size]
+                batch_start = time.perf_counter()
+                values = self.model.predict(
+                    [pairs[j] for j in batch],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False,
+                )
+                per_pair = (time.perf_counter() - batch_start) / len(batch)
+                with self._lock:
+                    self._pair_seconds = (
+                        per_pair
+                        if self._pair_seconds is None
+                        else 0.8 * self._pair_seconds + 0.2 * per_pair
+                    )
+                    for j, value in zip(batch, values):
+                        scores[keys[j]] = float(value)
+                        self._cache[keys[j]] = float(value)
+                        self._cache.move_to_end(keys[j])
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+                self._count(scored=len(batch))
+
+        with self._lock:
+            self.seconds += time.perf_counter() - start
+        return [scores[key] for key in keys]
+
+    def rerank(self, calls: List[Tuple[str, Dict[str, List]]]) -> List[Dict[str, List]]:
+        """
+        calls: (쿼리, vector_search_tool 결과) 목록
+        반환: 같은 순서의 결과, 남긴 청크만 재정렬 점수 순으로 ("*_scores" 는 재정렬 점수)
+        - "*_ids" (Chroma id) 도 청크 순서에 맞춰 재정렬
+        """
+        self._count(turns=1)
+        pairs = list(
+            dict.fromkeys(
+                (query, chunk)
+                for query, result in calls
+                for key in ("text", "qa")
+                for chunk in result[key]
+            )
+        )
+        values = self.score(pairs) if pairs else []
+        if values is None:
+            return [result for _, result in calls]
+        pair_score = dict(zip(pairs, values))
+
+        keep = {}
+        for key, top_n in self.top_n.items():
+            best = {}
+            for query, result in calls:
+                for chunk in result[key]:
+                    best[chunk] = max(pair_score[(query, chunk)], best.get(chunk, -1e9))
+            ranked = sorted(best, key=best.get, reverse=True)
+            keep[key] = set(ranked[:top_n])
+            # 쿼리마다 가장 좋은 청크 하나는 남김 (분리된 질문 하나가 통째로 빠지지 않도록)
+            for query, result in calls:
+                if result[key]:
+                    keep[key].add(
+                        max(result[key], key=lambda c: pair_score[(query, c)])
+                    )
+            self._count(dropped=len(ranked) - len(keep[key]))
+
+        reranked = []
+        for query, result in calls:
+            result = dict(result)
+            for key in ("text", "qa"):
+                ids = dict(zip(result[key], result.get(f"{key}_ids", [])))
+                chunks = sorted(
+                    (c for c in result[key] if c in keep[key]),
+                    key=lambda c: pair_score[(query, c)],
+                    reverse=True,
+                )
+                result[key] = chunks
+                result[f"{key}_scores"] = [pair_score[(query, c)] for c in chunks]
+                if ids:
+                    result[f"{key}_ids"] = [ids.get(c) for c in chunks]
+            reranked.append(result)
+        self._count(reranked=1)
+        return reranked
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            seconds = self.seconds
+            size = len(self._cache)
+            pair_ms = self._pair_seconds * 1000 if self._pair_seconds else None
+        return {
+            **counts,
+            "cache_hit_rate": (
+                counts["cache_hits"] / counts["pairs"] if counts["pairs"] else 0.0
+            ),
+            "cache_size": size,
+            "avg_ms": (
+                seconds / counts["reranked"] * 1000 if counts["reranked"] else 0.0
+            ),
+            "pair_ms": pair_ms,
+            "budget_ms": self.budget * 1000,
+        }
+
+
+@component("reranker", required=False)
+def reranker():
+    """RERANKER=false 이면 None (하이브리드 검색 순위 그대로)"""
+    if not RERANKER:
+        return None
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(
+        RERANKER_MODEL, device=RERANKER_DEVICE, max_length=RERANKER_MAX_LENGTH
+    )
+    instance = CrossEncoderReranker(model)
+    register_stats("reranker", instance.stats)
+    logger.info(
+        f"-------- reranker loaded: {RERANKER_MODEL} (device={RERANKER_DEVICE})"
+    )
+    return instance
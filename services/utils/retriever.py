@@ -1,7 +1,8 @@
 import os
 from dotenv import load_dotenv
 from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from .components import component
+from .embedding_cache import get_shared_embeddings
 from .vector_db import create_chroma_db
 
 # .env 로드
@@ -13,10 +14,8 @@ DB_DIR = os.path.join(HERE, "chroma_db")
 COLLECTION_NAME = "google_api_docs"
 EMBED_MODEL = "BAAI/bge-m3"
 
-embeddings = HuggingFaceEmbeddings(
-    model_name=EMBED_MODEL,
-    encode_kwargs={"normalize_embeddings": True},  # DB 생성 시 설정과 일치해야 함
-)
+# 프로세스 공유 bge-m3 + 임베딩 캐시 (normalize_embeddings=True, DB 생성 시 설정과 일치)
+embeddings = get_shared_embeddings()
 
 
 def retriever_setting(force_download=False):
@@ -52,3 +51,9 @@ def retriever_setting(force_download=False):
     )
 
     return vs
+
+
+# 벡터스토어는 첫 사용 시(또는 서버 warmup 시) 한 번만 연다
+@component("vectorstore_text")
+def text_vectorstore():
+    return retriever_setting()
@@ -1,59 +1,73 @@
 # retriever_bm25.py
-from collections import defaultdict
-from langchain_community.retrievers import BM25Retriever
-from langchain_core.documents import Document
-from .retriever import retriever_setting
-from .retriever_qa import retriever_setting2
-import os, pickle
+from .components import component
+from .retriever import text_vectorstore
+from .retriever_qa import qa_vectorstore
+from .sparse_index import SparseBM25Index
+from .tokenizer import TokenCache, get_tokenizer, query_tokenizer
+import os
 
 HERE = os.path.dirname(os.path.abspath(__file__))
-INDEX_FILE_PATH = os.path.join(HERE, "bm25_index.pkl")
-QA_INDEX_FILE_PATH = os.path.join(HERE, "bm25_qa_index.pkl")
+# CSR 역색인 디렉터리 (.npy + json, 예전 bm25_*.pkl 은 더 이상 읽지 않음)
+INDEX_DIR = os.path.join(HERE, "bm25_index")
+QA_INDEX_DIR = os.path.join(HERE, "bm25_qa_index")
+# 문서 토큰화 결과 캐시 (인덱스를 다시 만들 때 바뀌지 않은 문서는 형태소 분석 생략)
+TOKEN_CACHE_DIR = os.path.join(HERE, "bm25_token_cache")
 
-BM25_INDEX = None
-BM25_QA_INDEX = None
 
+def _load_bm25_index(path, vs):
+    """
+    BM25 역색인을 mmap 으로 열고, 없거나 Chroma 문서 수 / 토크나이저가 달라졌으면 새로 생성
+    - 인덱스에는 Chroma 문서 id 만 저장 (본문은 검색 결과를 만들 때 Chroma 에서 조회)
+    """
+    source_count = vs._collection.count()
+    tokenizer = get_tokenizer()
 
-# 전역에서 한 번만 로드
-def _load_bm25_index(path, retriever_func):
-    if os.path.exists(path):
-        print(f"BM25 인덱스 로드: {path}")
-        with open(path, "rb") as f:
-            return pickle.load(f)
+    if SparseBM25Index.exists(path):
+        index = SparseBM25Index.load(path)
+        if (
+            index.meta.get("source_count") == source_count
+            and index.meta.get("tokenizer") == tokenizer.name
+        ):
+            print(f"BM25 인덱스 로드: {path}")
+            return index
+        print(f"BM25 인덱스가 Chroma / 토크나이저와 다름 → 다시 생성: {path}")
     else:
         print(f"BM25 인덱스 없음 → 새로 생성: {path}")
-        vs = retriever_func()
-        data = vs.get(include=["documents", "metadatas"])
-        docs, metas = data["documents"], data["metadatas"]
 
-        tag_docs = defaultdict(list)
-        for doc, meta in zip(docs, metas):
-            tag = meta.get("tags")
-            if tag:
-                tag_docs[tag].append(Document(page_content=doc, metadata=meta))
+    data = vs.get(include=["documents", "metadatas"])
+    tags = [(meta or {}).get("tags") for meta in data["metadatas"]]
+    tokens = TokenCache(TOKEN_CACHE_DIR, tokenizer).tokenize_many(data["documents"])
+    index = SparseBM25Index.build(
+        data["ids"],
+        data["documents"],
+        tags,
+        tokenizer_name=tokenizer.name,
+        tokens=tokens,
+    )
+    index.meta["source_count"] = source_count
+    index.save(path)
 
-        bm25_dict = {
-            tag: BM25Retriever.from_documents(dlist) for tag, dlist in tag_docs.items()
-        }
+    # 저장한 파일을 mmap 으로 다시 열어서 빌드 중 만든 배열은 바로 해제
+    return SparseBM25Index.load(path)
 
-        with open(path, "wb") as f:
-            pickle.dump(bm25_dict, f)
 
-        return bm25_dict
+# 첫 사용 시(또는 서버 warmup 시) 로드
+@component("bm25_text")
+def bm25_index():
+    return _load_bm25_index(INDEX_DIR, text_vectorstore.get())
 
 
-# 시작 시 로드
-BM25_INDEX = _load_bm25_index(INDEX_FILE_PATH, retriever_setting)
-BM25_QA_INDEX = _load_bm25_index(QA_INDEX_FILE_PATH, retriever_setting2)
+@component("bm25_qa")
+def bm25_qa_index():
+    return _load_bm25_index(QA_INDEX_DIR, qa_vectorstore.get())
 
 
-def bm25_retrievers_by_tag(k=5):
-    for r in BM25_INDEX.values():
-        r.k = k
-    return BM25_INDEX
+_query_tokenize = None
 
 
-def bm25_retrievers_by_tag_qa(k=20):
-    for r in BM25_QA_INDEX.values():
-        r.k = k
-    return BM25_QA_INDEX
+def tokenize_query(query):
+    # 인덱스와 같은 토크나이저로 검색어 분석 (같은 검색어는 LRU 로 재사용)
+    global _query_tokenize
+    if _query_tokenize is None:
+        _query_tokenize = query_tokenizer(get_tokenizer())
+    return _query_tokenize(query)
@@ -1,70 +1,246 @@
-from collections import defaultdict
-from langchain.retrievers import EnsembleRetriever
-from langchain_community.retrievers import BM25Retriever
+import os
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
 from langchain_core.documents import Document
-from .retriever import retriever_setting
-from .retriever_qa import retriever_setting2
-from .retriever_bm25 import bm25_retrievers_by_tag, bm25_retrievers_by_tag_qa
+from .embedding_cache import get_shared_embeddings
+from .retriever import text_vectorstore
+from .retriever_qa import qa_vectorstore
+from .retriever_bm25 import bm25_index, bm25_qa_index, tokenize_query
 
-_vs = retriever_setting()
-_vs_qa = retriever_setting2()
+RRF_C = 60  # EnsembleRetriever 기본값과 동일
 
+# (컬렉션, 태그 집합, k) 별로 캐시할 retriever 개수
+RETRIEVER_CACHE_SIZE = int(os.getenv("RETRIEVER_CACHE_SIZE", "128"))
 
-def hybrid_retriever_setting(api_tags, k=5):
+
+class HybridHit(NamedTuple):
+    """하이브리드 검색 결과 한 건 (점수 + 어디서 찾았는지)"""
+
+    doc: Document
+    score: float  # 최종 RRF 점수
+    dense_rank: Optional[int]  # Chroma 결과 순위 (1부터, 없으면 None)
+    dense_distance: Optional[float]  # Chroma 거리 (작을수록 유사)
+    sparse_rank: Optional[int]  # 태그별 BM25 를 합친 목록에서의 순위
+    bm25: Dict[str, float]  # 태그별 BM25 점수
+    doc_id: Optional[str] = None  # Chroma id (저장된 임베딩 조회용)
+
+
+def _rrf(key_lists: List[np.ndarray], weights: List[float]):
     """
-    특정 태그 리스트에 맞는 원문 하이브리드 retriever 생성
-    - api_tags: ["drive"], ["gmail"], ["drive","calendar"] 등
+    가중 RRF (EnsembleRetriever.weighted_reciprocal_rank 와 같은 결과)
+    - key 는 page_content 별 정수 번호, 같은 key 의 점수는 목록 순서대로 더한다
+    - 동점이면 먼저 나온 key 우선 (sorted(reverse=True) 의 안정 정렬과 동일)
+    반환: (key 순서, 점수)
     """
-    filters = {}
-    if api_tags:
-        filters["tags"] = {"$in": api_tags}
+    keys = np.concatenate(key_lists)
+    if keys.size == 0:
+        return keys, np.zeros(0)
+    ranks = np.concatenate([np.arange(1, len(k) + 1) for k in key_lists])
+    w = np.concatenate([np.full(len(k), wt) for k, wt in zip(key_lists, weights)])
 
-    # Chroma retriever (필터 적용)
-    chroma_retriever = _vs.as_retriever(search_kwargs={"k": k}, filter=filters)
+    score = np.zeros(keys.max() + 1)
+    np.add.at(score, keys, w / (ranks + RRF_C))
 
-    # 태그별 BM25 retrievers
-    # bm25_retrievers = 요청된 태그들(api_tags)에 해당하는 BM25Retriever 객체들의 리스트
-    bm25_dict = bm25_retrievers_by_tag(k=k)
-    bm25_retrievers = [bm25_dict[tag] for tag in api_tags if tag in bm25_dict]
+    uniq, first = np.unique(keys, return_index=True)
+    uniq = uniq[np.argsort(first)]  # 처음 나온 순서
+    order = np.argsort(-score[uniq], kind="stable")
+    return uniq[order], score[uniq][order]
 
-    if not bm25_retrievers:
-        return chroma_retriever  # BM25 retriever가 없으면 Chroma만 반환
 
-    if len(bm25_retrievers) == 1:  # 태그가 하나라면 단일 BM25
-        bm25 = bm25_retrievers[0]
-    else:
-        # 여러 태그 BM25 합치기 -> 앙상블
-        bm25 = EnsembleRetriever(
-            retrievers=bm25_retrievers,
-            weights=[1 / len(bm25_retrievers)] * len(bm25_retrievers),  # 동일한 가중치
+def embed_queries(queries: List[str]) -> Dict[str, List[float]]:
+    """
+    한 턴의 모든 쿼리를 bge-m3 한 번의 배치로 임베딩
+    - 원문/QA 컬렉션 모두 같은 모델(bge-m3, normalize)이므로 벡터 하나를 두 컬렉션에 재사용
+    """
+    unique = [q for q in dict.fromkeys(queries) if q]
+    if not unique:
+        return {}
+    vectors = get_shared_embeddings().embed_documents(unique)
+    return dict(zip(unique, vectors))
+
+
+class HybridRetriever:
+    """
+    Chroma(dense) + 태그별 BM25(sparse) 하이브리드 검색 엔진
+    - dense: Chroma 쿼리 한 번 (query_vector 를 넘기면 재임베딩 없음)
+    - sparse: 요청 태그마다 CSR 인덱스로 점수 계산 → id / 점수만 수집
+    - dense 결과에 없는 후보만 Chroma 에서 한 번에 조회한 뒤 numpy 로 RRF 융합
+    - 순위는 예전 중첩 EnsembleRetriever (태그별 BM25 → 동일 가중 RRF → Chroma 와 RRF) 와 같다
+    - 생성 후 상태를 바꾸지 않으므로 여러 요청이 동시에 공유해도 안전
+    """
+
+    def __init__(
+        self, vs, index, api_tags, dense_k, sparse_k, tokenize, weights=(0.8, 0.2)
+    ):
+        self.vs = vs
+        self.index = index
+        self.tags = tuple(tag for tag in api_tags if index is not None and tag in index)
+        self.dense_k = dense_k
+        self.sparse_k = sparse_k
+        self.tokenize = tokenize
+        self.filter = {"tags": {"$in": list(api_tags)}} if api_tags else None
+        self.weights = tuple(weights)
+
+    def _dense(self, query, query_vector=None):
+        if query_vector is None:
+            query_vector = self.vs.embeddings.embed_query(query)
+        res = self.vs._collection.query(
+            query_embeddings=[query_vector],
+            n_results=self.dense_k,
+            where=self.filter,
+            include=["documents", "metadatas", "distances"],
         )
+        return [
+            (i, Document(page_content=doc, metadata=meta or {}), dist)
+            for i, doc, meta, dist in zip(
+                res["ids"][0],
+                res["documents"][0],
+                res["metadatas"][0],
+                res["distances"][0],
+            )
+        ]
 
-    # 최종 하이브리드 (Chroma + BM25)
-    return EnsembleRetriever(retrievers=[chroma_retriever, bm25], weights=[0.8, 0.2])
+    def _sparse(self, query):
+        tokens = self.tokenize(query)
+        return {tag: self.index.search(tag, tokens, self.sparse_k) for tag in self.tags}
 
+    def _fetch(self, ids):
+        if not ids:
+            return {}
+        data = self.vs._collection.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            i: Document(page_content=doc, metadata=meta or {})
+            for i, doc, meta in zip(data["ids"], data["documents"], data["metadatas"])
+        }
 
-def hybrid_retriever_setting_qa(api_tags, k=20):
+    def search(
+        self,
+        query: str,
+        query_vector: Optional[List[float]] = None,
+        top_k: Optional[int] = None,
+    ) -> List[HybridHit]:
+        dense = self._dense(query, query_vector)
+
+        if not self.tags:  # BM25 인덱스가 없으면 Chroma 만 사용
+            hits = [
+                HybridHit(doc, 1 / (rank + RRF_C), rank, dist, None, {}, doc_id)
+                for rank, (doc_id, doc, dist) in enumerate(dense, start=1)
+            ]
+            return hits[:top_k] if top_k else hits
+
+        sparse = self._sparse(query)
+        docs = {i: doc for i, doc, _ in dense}
+        # dense 결과에 없는 BM25 후보만 한 번에 조회
+        missing = [i for hits in sparse.values() for i, _ in hits if i not in docs]
+        docs.update(self._fetch(list(dict.fromkeys(missing))))
+
+        # page_content 기준으로 정수 key 부여 (예전 RRF 와 같은 중복 제거 기준)
+        key_of, first_doc, first_id = {}, [], []
+
+        def key(doc_id):
+            content = docs[doc_id].page_content
+            if content not in key_of:
+                key_of[content] = len(first_doc)
+                first_doc.append(docs[doc_id])
+                first_id.append(doc_id)
+            return key_of[content]
+
+        dense_keys = np.array([key(i) for i, _, _ in dense], dtype=np.int64)
+        tag_keys = [
+            np.array([key(i) for i, _ in hits if i in docs], dtype=np.int64)
+            for hits in sparse.values()
+        ]
+
+        if len(tag_keys) == 1:  # 태그가 하나라면 단일 BM25
+            sparse_keys = tag_keys[0]
+        else:  # 여러 태그 BM25 합치기 (동일한 가중치)
+            sparse_keys, _ = _rrf(tag_keys, [1 / len(tag_keys)] * len(tag_keys))
+
+        # 최종 하이브리드 (Chroma + BM25)
+        order, scores = _rrf([dense_keys, sparse_keys], self.weights)
+
+        # provenance: key 별로 처음 나온 순위 / 점수만 기록
+        dense_info = {}
+        for rank, (k, (_, _, dist)) in enumerate(zip(dense_keys.tolist(), dense), 1):
+            dense_info.setdefault(k, (rank, dist))
+        sparse_rank = {}
+        for rank, k in enumerate(sparse_keys.tolist(), start=1):
+            sparse_rank.setdefault(k, rank)
+        bm25 = {}
+        for tag, tag_hits in sparse.items():
+            for i, score in tag_hits:
+                if i in docs:
+                    bm25.setdefault(key(i), {}).setdefault(tag, score)
+
+        hits = []
+        for k, score in zip(order.tolist(), scores.tolist()):
+            rank, dist = dense_info.get(k, (None, None))
+            hits.append(
+                HybridHit(
+                    doc=first_doc[k],
+                    score=score,
+                    dense_rank=rank,
+                    dense_distance=dist,
+                    sparse_rank=sparse_rank.get(k),
+                    bm25=bm25.get(k, {}),
+                    doc_id=first_id[k],
+                )
+            )
+        return hits[:top_k] if top_k else hits
+
+    def get_relevant_documents(
+        self, query: str, query_vector: Optional[List[float]] = None
+    ) -> List[Document]:
+        return [hit.doc for hit in self.search(query, query_vector)]
+
+
+def stored_embeddings(refs: Dict[str, Tuple[str, str]]) -> Dict[str, List[float]]:
     """
-    특정 태그 리스트에 맞는 QA 하이브리드 retriever 생성
+    청크 → (컬렉션 "text" / "qa", Chroma id) 로 DB 에 저장된 임베딩 조회
+    - 검색한 청크를 다시 bge-m3 로 임베딩하지 않기 위해 사용 (groundedness)
     """
-    filters = {}
-    if api_tags:
-        filters["tags"] = {"$in": api_tags}
-
-    chroma_retriever = _vs_qa.as_retriever(search_kwargs={"k": 5}, filter=filters)
+    wanted = {}
+    for chunk, (collection, doc_id) in refs.items():
+        wanted.setdefault(collection, {})[doc_id] = chunk
+    vectors = {}
+    for collection, by_id in wanted.items():
+        vs = qa_vectorstore.get() if collection == "qa" else text_vectorstore.get()
+        data = vs._collection.get(ids=list(by_id), include=["embeddings"])
+        for doc_id, vector in zip(data["ids"], data["embeddings"]):
+            vectors[by_id[doc_id]] = vector
+    return vectors
 
-    bm25_dict = bm25_retrievers_by_tag_qa(k=k)
-    bm25_retrievers = [bm25_dict[tag] for tag in api_tags if tag in bm25_dict]
 
-    if not bm25_retrievers:
-        return chroma_retriever
+@lru_cache(maxsize=RETRIEVER_CACHE_SIZE)
+def _cached_retriever(collection: str, tags: tuple, k: int) -> HybridRetriever:
+    """
+    retriever 레지스트리: (컬렉션, 태그, k) 별로 한 번만 생성하고 LRU 로 유지
+    - 태그 순서가 BM25 후보를 RRF 에 넣는 순서(동점 처리)를 정하므로 분류기가 준 순서 그대로 키로 사용
+    """
+    api_tags = list(tags)
 
-    if len(bm25_retrievers) == 1:
-        bm25 = bm25_retrievers[0]
+    if collection == "qa":
+        vs, index, dense_k = qa_vectorstore.get(), bm25_qa_index.get(), 5
     else:
-        bm25 = EnsembleRetriever(
-            retrievers=bm25_retrievers,
-            weights=[1 / len(bm25_retrievers)] * len(bm25_retrievers),
-        )
+        vs, index, dense_k = text_vectorstore.get(), bm25_index.get(), k
 
-    return EnsembleRetriever(retrievers=[chroma_retriever, bm25], weights=[0.8, 0.2])
+    return HybridRetriever(
+        vs, index, api_tags, dense_k=dense_k, sparse_k=k, tokenize=tokenize_query
+    )
+
+
+def hybrid_retriever_setting(api_tags, k=5):
+    """
+    특정 태그 리스트에 맞는 원문 하이브리드 retriever 반환
+    - api_tags: ["drive"], ["gmail"], ["drive","calendar"] 등
+    """
+    return _cached_retriever("text", tuple(api_tags or []), k)
+
+
+def hybrid_retriever_setting_qa(api_tags, k=20):
+    """
+    특정 태그 리스트에 맞는 QA 하이브리드 retriever 반환
+    """
+    return _cached_retriever("qa", tuple(api_tags or []), k)
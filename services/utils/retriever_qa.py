@@ -1,9 +1,9 @@
 import os
 from dotenv import load_dotenv
 
-import torch
 from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from .components import component
+from .embedding_cache import get_shared_embeddings
 from .vector_db_qa import create_chroma_db
 
 # .env 로드
@@ -15,10 +15,8 @@ DB_DIR = os.path.join(HERE, "qa_chroma_db")
 COLLECTION_NAME = "qna_collection"
 EMBED_MODEL = "BAAI/bge-m3"
 
-embeddings = HuggingFaceEmbeddings(
-    model_name=EMBED_MODEL,
-    encode_kwargs={"normalize_embeddings": True},  # DB 생성 시 설정과 일치해야 함
-)
+# 프로세스 공유 bge-m3 + 임베딩 캐시 (normalize_embeddings=True, DB 생성 시 설정과 일치)
+embeddings = get_shared_embeddings()
 
 
 def retriever_setting2(force_download=False):
@@ -54,3 +52,9 @@ def retriever_setting2(force_download=False):
     )
 
     return vs
+
+
+# 벡터스토어는 첫 사용 시(또는 서버 warmup 시) 한 번만 연다
+@component("vectorstore_qa")
+def qa_vectorstore():
+    return retriever_setting2()
@@ -0,0 +1,221 @@
+import json
+import os
+import shutil
+from collections import defaultdict
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+FORMAT_VERSION = 1
+
+
+def whitespace_tokenize(text: str) -> List[str]:
+    # BM25Retriever 기본 전처리(default_preprocessing_func)와 동일
+    return text.split()
+
+
+class SparseBM25Index:
+    """
+    태그(segment)별 BM25Okapi 와 같은 점수를 내는 CSR 역색인
+    - 디렉터리 하나에 .npy 배열로 저장하고 np.load(mmap_mode="r") 로 연다
+      (문서 본문은 저장하지 않고 Chroma id 만 가진다)
+    - meta.json   : 파라미터, 태그별 문서 범위 / 평균 길이, 토크나이저 이름
+    - vocab.json  : 단어 목록 (위치 = term id, 모든 태그 공통)
+    - doc_ids.json: Chroma 문서 id (태그별로 연속 구간)
+    - indptr.npy  : (태그 수, 단어 수 + 1) int64, 태그 t 의 단어 w posting 구간
+    - postings.npy: 태그 내부 문서 번호 (int32)
+    - weights.npy : tf 와 문서 길이 정규화를 미리 계산한 BM25 가중치 (float64)
+    - idf.npy     : (태그 수, 단어 수) float64, 태그에 없는 단어는 0
+    """
+
+    def __init__(self, meta, vocab, doc_ids, indptr, postings, weights, idf):
+        self.meta = meta
+        self.tags = list(meta["tags"])
+        self._tag_index = {tag: i for i, tag in enumerate(self.tags)}
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        self.doc_ids = doc_ids
+        self.indptr = indptr
+        self.postings = postings
+        self.weights = weights
+        self.idf = idf
+
+    def __contains__(self, tag):
+        return tag in self._tag_index
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    # ---------------------------------------------------------------- build
+    @classmethod
+    def build(
+        cls,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        tags: Sequence[Optional[str]],
+        tokenize: Callable[[str], List[str]] = whitespace_tokenize,
+        tokenizer_name: str = "whitespace",
+        tokens: Optional[Sequence[List[str]]] = None,
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+    ) -> "SparseBM25Index":
+        """
+        (id, 본문, 태그) 목록으로 인덱스 생성
+        - tokens 를 주면 (토큰 캐시 등으로 미리 분석한 결과) tokenize 대신 사용
+        - idf / 문서 길이는 rank_bm25.BM25Okapi 로 계산해서 기존 BM25Retriever 와 값이 같다
+        """
+        if tokens is None:
+            tokens = [tokenize(text) for text in texts]
+
+        tag_items = defaultdict(list)
+        for doc_id, doc_tokens, tag in zip(ids, tokens, tags):
+            if tag:
+                tag_items[tag].append((doc_id, doc_tokens))
+
+        vocab = {}
+        doc_ids, segments, tag_models = [], {}, []
+        for tag, items in tag_items.items():
+            bm25 = BM25Okapi(
+                [doc_tokens for _, doc_tokens in items], k1=k1, b=b, epsilon=epsilon
+            )
+            segments[tag] = {
+                "start": len(doc_ids),
+                "size": len(items),
+                "avgdl": bm25.avgdl,
+            }
+            doc_ids.extend(doc_id for doc_id, _ in items)
+            for freqs in bm25.doc_freqs:
+                for term in freqs:
+                    vocab.setdefault(term, len(vocab))
+            tag_models.append(bm25)
+
+        n_terms = len(vocab)
+        indptr = np.zeros((len(tag_models), n_terms + 1), dtype=np.int64)
+        idf = np.zeros((len(tag_models), n_terms), dtype=np.float64)
+        all_docs, all_weights = [], []
+        offset = 0
+        for t, bm25 in enumerate(tag_models):
+            terms, docs, tfs = [], [], []
+            for doc_no, freqs in enumerate(bm25.doc_freqs):
+                for term, tf in freqs.items():
+                    terms.append(vocab[term])
+                    docs.append(doc_no)
+                    tfs.append(tf)
+
+            # term id → 문서 번호 순으로 정렬한 posting 목록
+            terms = np.array(terms, dtype=np.int64)
+            order = np.lexsort((np.array(docs), terms))
+            terms = terms[order]
+            docs = np.array(docs, dtype=np.int32)[order]
+            tf = np.array(tfs, dtype=np.int64)[order]
+
+            # BM25Okapi.get_scores 와 같은 식 / 같은 연산 순서 (float64)
+            doc_len = np.array(bm25.doc_len)[docs]
+            w = tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / bm25.avgdl))
+
+            counts = np.bincount(terms, minlength=n_terms)
+            indptr[t, 1:] = np.cumsum(counts)
+            indptr[t] += offset
+            offset += len(docs)
+            all_docs.append(docs)
+            all_weights.append(w)
+
+            for term, value in bm25.idf.items():
+                idf[t, vocab[term]] = value
+
+        meta = {
+            "version": FORMAT_VERSION,
+            "k1": k1,
+            "b": b,
+            "epsilon": epsilon,
+            "tokenizer": tokenizer_name,
+            "n_docs": len(doc_ids),
+            "tags": segments,
+        }
+        return cls(
+            meta,
+            sorted(vocab, key=vocab.get),
+            doc_ids,
+            indptr,
+            np.concatenate(all_docs) if all_docs else np.zeros(0, dtype=np.int32),
+            np.concatenate(all_weights) if all_weights else np.zeros(0),
+            idf,
+        )
+
+    # ---------------------------------------------------------- save / load
+    def save(self, directory: str):
+        """임시 디렉터리에 쓴 뒤 교체 (쓰는 도중 죽어도 이전 인덱스는 그대로)"""
+        tmp = directory.rstrip("/") + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        np.save(os.path.join(tmp, "indptr.npy"), self.indptr)
+        np.save(os.path.join(tmp, "postings.npy"), self.postings)
+        np.save(os.path.join(tmp, "weights.npy"), self.weights)
+        np.save(os.path.join(tmp, "idf.npy"), self.idf)
+        vocab = sorted(self.vocab, key=self.vocab.get)
+        for name, obj in (("vocab", vocab), ("doc_ids", self.doc_ids)):
+            with open(os.path.join(tmp, f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(obj, f, ensure_ascii=False)
+        # meta.json 을 마지막에 써서 완성된 인덱스만 유효하게 본다
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp, directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "SparseBM25Index":
+        mode = "r" if mmap else None
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"지원하지 않는 인덱스 버전: {meta.get('version')}")
+        with open(os.path.join(directory, "vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        with open(os.path.join(directory, "doc_ids.json"), encoding="utf-8") as f:
+            doc_ids = json.load(f)
+
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode)
+            for name in ("indptr", "postings", "weights", "idf")
+        }
+        return cls(meta, vocab, doc_ids, **arrays)
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return os.path.exists(os.path.join(directory, "meta.json"))
+
+    # -------------------------------------------------------------- search
+    def get_scores(self, tag: str, tokens: Sequence[str]) -> np.ndarray:
+        """BM25Okapi.get_scores 와 같은 값 (태그 내부 문서 순서)"""
+        t = self._tag_index[tag]
+        scores = np.zeros(self.meta["tags"][tag]["size"])
+        indptr, idf = self.indptr[t], self.idf[t]
+        for token in tokens:
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = indptr[term_id], indptr[term_id + 1]
+            if start == end:
+                continue
+            scores[self.postings[start:end]] += idf[term_id] * self.weights[start:end]
+        return scores
+
+    def _top(self, tag: str, tokens: Sequence[str], n: int):
+        # BM25Okapi.get_top_n 과 같은 순서 (argsort 후 뒤집기, 동점 처리까지 동일)
+        scores = self.get_scores(tag, tokens)
+        return np.argsort(scores)[::-1][:n], scores
+
+    def top_n(self, tag: str, tokens: Sequence[str], n: int) -> List[int]:
+        """상위 n 개 문서의 전역 번호"""
+        top, _ = self._top(tag, tokens, n)
+        start = self.meta["tags"][tag]["start"]
+        return [start + int(i) for i in top]
+
+    def search(self, tag: str, tokens: Sequence[str], n: int):
+        """상위 n 개 문서의 (Chroma id, BM25 점수) 목록"""
+        top, scores = self._top(tag, tokens, n)
+        start = self.meta["tags"][tag]["start"]
+        return [(self.doc_ids[start + int(i)], float(scores[i])) for i in top]
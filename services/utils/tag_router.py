@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .components import component
+from .metrics import register_stats
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# off: 항상 LLM / shadow: LLM 사용 + 로컬 결과와 비교 / on: 자신 있으면 LLM 생략
+TAG_ROUTER = os.getenv("TAG_ROUTER", "off")
+TAG_ROUTER_MIN_SIM = float(os.getenv("TAG_ROUTER_MIN_SIM", "0.45"))
+TAG_ROUTER_MIN_MARGIN = float(os.getenv("TAG_ROUTER_MIN_MARGIN", "0.03"))
+TAG_ROUTER_MULTI = float(os.getenv("TAG_ROUTER_MULTI", "0.01"))
+TAG_ROUTER_MAX_TAGS = int(os.getenv("TAG_ROUTER_MAX_TAGS", "3"))
+# 지정하면 LLM 이 고른 태그를 JSONL 로 기록 (benchmarks/eval_tag_router.py 입력)
+TAG_ROUTER_LOG = os.getenv("TAG_ROUTER_LOG")
+CENTROID_PATH = os.path.join(HERE, "tag_centroids.npz")
+
+
+class TagRoute(NamedTuple):
+    query: str
+    tags: List[str]
+    confidence: float  # 선택한 마지막 태그와 다음 태그의 유사도 차이 (키워드면 1.0)
+    confident: bool
+    source: str  # keyword | centroid
+
+
+class TagCentroids:
+    """태그별 문서 임베딩 평균 (정규화), Chroma 에 저장된 임베딩을 그대로 사용"""
+
+    def __init__(self, tags: List[str], centroids: np.ndarray, source_count=None):
+        self.tags = list(tags)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.source_count = source_count
+
+    @classmethod
+    def build(cls, vs, batch_size: int = 2000):
+        """컬렉션을 batch_size 씩 읽어서 태그별 합을 누적 (전체 임베딩을 한 번에 올리지 않음)"""
+        collection = vs._collection
+        total = collection.count()
+        sums, counts = {}, {}
+        for offset in range(0, total, batch_size):
+            data = collection.get(
+                include=["embeddings", "metadatas"], limit=batch_size, offset=offset
+            )
+            vectors = np.asarray(data["embeddings"], dtype=np.float32)
+            for vector, meta in zip(vectors, data["metadatas"]):
+                tag = (meta or {}).get("tags")
+                if not tag:
+                    continue
+                if tag not in sums:
+                    sums[tag] = np.zeros_like(vector)
+                    counts[tag] = 0
+                sums[tag] += vector
+                counts[tag] += 1
+
+        tags = sorted(sums)
+        centroids = np.stack([sums[t] / counts[t] for t in tags])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        return cls(tags, centroids, total)
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            tags=np.array(self.tags),
+            centroids=self.centroids,
+            source_count=np.array(self.source_count),
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        data = np.load(path)
+        return cls(
+            [str(t) for t in data["tags"]], data["centroids"], int(data["source_count"])
+        )
+
+    def similarities(self, vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return self.centroids @ (vector / (np.linalg.norm(vector) or 1.0))
+
+
+class TagRouter:
+    """
+    split_queries 결과 쿼리별 api_tags 를 로컬에서 결정 (tool 노드의 GPT-4.1 호출 대체)
+    - 쿼리에 API / 제품 이름이 있으면 그 태그 (mentions, 보통 preclassifier.ApiMentions)
+      "메일", "일정", "시트" 같은 일반 단어는 키워드로 보지 않음 (단어 경계 매칭)
+    - 없으면 태그 centroid 와 코사인 유사도, 1위와 multi 이내 태그까지 같이 선택
+    - 1위 유사도 < min_sim 이거나 다음 태그와 차이 < min_margin 이면 자신 없음
+    - 쿼리 하나라도 자신 없으면 그 턴은 LLM 으로 (태그 선택은 검색 필터라서 보수적으로)
+    """
+
+    def __init__(
+        self,
+        centroids: TagCentroids,
+        mentions: Optional[Callable[[str], List[str]]] = None,
+        mode: str = TAG_ROUTER,
+        min_sim: float = TAG_ROUTER_MIN_SIM,
+        min_margin: float = TAG_ROUTER_MIN_MARGIN,
+        multi: float = TAG_ROUTER_MULTI,
+        max_tags: int = TAG_ROUTER_MAX_TAGS,
+        log_path: Optional[str] = TAG_ROUTER_LOG,
+    ):
+        self.centroids = centroids
+        self.mentions = mentions
+        self.mode = mode
+        self.min_sim = min_sim
+        self.min_margin = min_margin
+        self.multi = multi
+        self.max_tags = max_tags
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(["turns", "local", "fallback"], 0)
+        self.shadow_counts = dict.fromkeys(["compared", "exact", "top1"], 0)
+        self.jaccard_sum = 0.0
+
+    def route_one(self, query: str, vector) -> TagRoute:
+        known = set(self.centroids.tags)
+        tags = [t for t in self.mentions(query) if t in known] if self.mentions else []
+        if tags:
+            return TagRoute(query, tags[: self.max_tags], 1.0, True, "keyword")
+
+        sims = self.centroids.similarities(vector)
+        order = np.argsort(-sims)
+        top = sims[order[0]]
+        chosen = [order[0]]
+        chosen += [i for i in order[1 : self.max_tags] if sims[i] >= top - self.multi]
+        following = sims[order[len(chosen)]] if len(chosen) < len(order) else -1.0
+        margin = float(sims[chosen[-1]] - following)
+        return TagRoute(
+            query,
+            [self.centroids.tags[i] for i in chosen],
+            margin,
+            bool(top >= self.min_sim and margin >= self.min_margin),
+            "centroid",
+        )
+
+    def route(self, queries: List[str], vectors: Dict[str, List[float]]):
+        return [self.route_one(q, vectors[q]) for q in queries if q in vectors]
+
+    def accept(self, routes: List[TagRoute]) -> bool:
+        """이번 턴에 로컬 결과를 쓸지 (on 모드 + 모든 쿼리에 자신 있을 때)"""
+        ok = self.mode == "on" and bool(routes) and all(r.confident for r in routes)
+        with self._lock:
+            self.counts["turns"] += 1
+            self.counts["local" if ok else "fallback"] += 1
+        return ok
+
+    def observe(self, routes: List[TagRoute], llm_calls: List[Dict]):
+        """LLM 이 고른 태그와 로컬 결과 비교 (shadow) + 평가용 로그"""
+        by_query = {r.query: r for r in routes or []}
+        rows = []
+        for i, args in enumerate(llm_calls):
+            llm_tags = sorted(set(args.get("api_tags") or []))
+            route = by_query.get(args.get("query"))
+            if route is None and routes and len(routes) == len(llm_calls):
+                route = routes[i]  # LLM 이 쿼리 문장을 조금 바꾼 경우 순서로 매칭
+            rows.append({"query": args.get("query"), "llm_tags": llm_tags})
+            if route is None:
+                continue
+            local = set(route.tags)
+            union = local | set(llm_tags)
+            with self._lock:
+                self.shadow_counts["compared"] += 1
+                self.shadow_counts["exact"] += local == set(llm_tags)
+                self.shadow_counts["top1"] += route.tags[0] in llm_tags
+                self.jaccard_sum += len(local & set(llm_tags)) / len(union)
+            rows[-1].update(
+                local_tags=route.tags,
+                confidence=route.confidence,
+                confident=route.confident,
+                source=route.source,
+            )
+
+        if self.log_path and rows:
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    row["time"] = time.time()
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+            shadow = dict(self.shadow_counts)
+            jaccard = self.jaccard_sum
+        compared = shadow["compared"]
+        return {
+            "mode": self.mode,
+            **counts,
+            "coverage": counts["local"] / counts["turns"] if counts["turns"] else 0.0,
+            "compared": compared,
+            "exact_rate": shadow["exact"] / compared if compared else None,
+            "top1_rate": shadow["top1"] / compared if compared else None,
+            "jaccard": jaccard / compared if compared else None,
+        }
+
+
+def load_centroids(vs, path: str = CENTROID_PATH) -> TagCentroids:
+    """저장된 centroid 를 읽고, 없거나 Chroma 문서 수가 달라졌으면 다시 계산"""
+    source_count = vs._collection.count()
+    if os.path.exists(path):
+        centroids = TagCentroids.load(path)
+        if centroids.source_count == source_count:
+            return centroids
+        logger.info(f"-------- 태그 centroid 가 Chroma 와 다름, 다시 계산: {path}")
+    centroids = TagCentroids.build(vs)
+    centroids.save(path)
+    return centroids
+
+
+@component("tag_router", required=False)
+def tag_router():
+    """TAG_ROUTER=off 이면 None (항상 LLM 으로 태그 선택)"""
+    if TAG_ROUTER == "off":
+        return None
+    from .langgraph_node2 import GOOGLE_API_OPTIONS
+    from .preclassifier import ApiMentions
+    from .retriever import text_vectorstore
+
+    router = TagRouter(
+        load_centroids(text_vectorstore.get()), ApiMentions(GOOGLE_API_OPTIONS)
+    )
+    register_stats("tag_router", router.stats)
+    return router
@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Dict, List, Sequence
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# auto | mecab | okt | ngram | whitespace
+# auto: mecab → okt → ngram 순서로 사용 가능한 첫 번째 (konlpy 형태소 분석기는 JVM / MeCab 필요)
+BM25_TOKENIZER = os.getenv("BM25_TOKENIZER", "auto")
+
+_HANGUL = re.compile(r"[가-힣]+|[0-9a-z_]+")
+
+# 검색에 도움이 안 되는 품사 (조사 / 어미 / 문장부호)
+_OKT_SKIP = {"Josa", "Eomi", "PreEomi", "Punctuation"}
+_MECAB_SKIP_PREFIX = ("J", "E", "SF", "SE", "SS", "SP", "SO", "SW", "SC", "SY")
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", text or "").lower()
+
+
+class Tokenizer:
+    """
+    BM25 토크나이저 = 정규화(NFC + 소문자) → 분석기
+    - name 은 인덱스 meta 에 저장되어 토크나이저가 바뀌면 인덱스를 다시 만든다
+    - whitespace 는 예전 BM25Retriever 와 같도록 정규화하지 않는다
+    """
+
+    def __init__(self, name: str, analyze: Callable[[str], List[str]]):
+        self.name = name
+        self._analyze = analyze
+        self._normalize = name != "whitespace"
+
+    def __call__(self, text: str) -> List[str]:
+        return self._analyze(_normalize(text) if self._normalize else text)
+
+
+def whitespace(text: str) -> List[str]:
+    return text.split()
+
+
+def char_ngrams(text: str, n: int = 2) -> List[str]:
+    """
+    형태소 분석기가 없을 때 쓰는 빠른 fallback
+    - 한글 어절은 음절 n-gram ("드라이브에서" → 드라 라이 이브 브에 에서)
+      조사가 붙어도 "드라이브의" 와 앞부분 n-gram 이 겹쳐서 매칭된다
+    - 영문 / 숫자는 단어 그대로 (API 이름, 메서드명)
+    """
+    tokens = []
+    for word in _HANGUL.findall(text):
+        if not "가" <= word[0] <= "힣" or len(word) <= n:  # 영문 / 숫자, 짧은 한글
+            tokens.append(word)
+        else:
+            tokens.extend(word[i : i + n] for i in range(len(word) - n + 1))
+    return tokens
+
+
+def _okt():
+    from konlpy.tag import Okt
+
+    okt = Okt()
+    lock = threading.Lock()  # JPype 호출은 직렬화
+
+    def analyze(text: str) -> List[str]:
+        with lock:
+            pos = okt.pos(text, norm=True, stem=True)
+        return [w for w, tag in pos if tag not in _OKT_SKIP]
+
+    return analyze
+
+
+def _mecab():
+    from konlpy.tag import Mecab
+
+    mecab = Mecab()
+
+    def analyze(text: str) -> List[str]:
+        return [
+            w for w, tag in mecab.pos(text) if not tag.startswith(_MECAB_SKIP_PREFIX)
+        ]
+
+    return analyze
+
+
+# 이름 → 분석기 생성 함수 (생성 실패 시 다음 후보로 넘어감)
+ANALYZERS: Dict[str, Callable[[], Callable[[str], List[str]]]] = {
+    "mecab": _mecab,
+    "okt": _okt,
+    "ngram": lambda: char_ngrams,
+    "whitespace": lambda: whitespace,
+}
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def _create(name: str) -> Tokenizer:
+    # 오타가 ngram 대체로 조용히 넘어가면 BM25 인덱스를 통째로 다시 만들게 되므로 먼저 검사
+    if name != "auto" and name not in ANALYZERS:
+        raise ValueError(f"알 수 없는 BM25 토크나이저: {name}")
+    candidates = ["mecab", "okt", "ngram"] if name == "auto" else [name, "ngram"]
+    for candidate in candidates:
+        try:
+            analyze = ANALYZERS[candidate]()
+        except Exception as e:
+            logger.warning(f"-------- BM25 토크나이저 '{candidate}' 사용 불가: {e}")
+            continue
+        logger.info(f"-------- BM25 토크나이저: {candidate}")
+        return Tokenizer(candidate, analyze)
+    raise RuntimeError(f"사용 가능한 BM25 토크나이저 없음: {name}")
+
+
+def get_tokenizer() -> Tokenizer:
+    """프로세스 공유 BM25 토크나이저 (형태소 분석기는 한 번만 로드)"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                _tokenizer = _create(BM25_TOKENIZER)
+    return _tokenizer
+
+
+def query_tokenizer(tokenizer: Tokenizer, maxsize: int = 4096):
+    """반복되는 검색어는 분석 결과를 재사용 (형태소 분석이 쿼리마다 돌지 않도록)"""
+    cached = lru_cache(maxsize=maxsize)(lambda text: tuple(tokenizer(text)))
+    return lambda text: list(cached(text))
+
+
+class TokenCache:
+    """
+    문서 토큰화 결과 디스크 캐시 (토크나이저별 append-only 파일)
+    - "sha1(본문)\\t토큰 토큰 ..." 한 줄씩 저장
+    - 인덱스를 다시 만들 때 바뀌지 않은 문서는 분석하지 않는다
+    """
+
+    def __init__(self, directory: str, tokenizer: Tokenizer):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{tokenizer.name}.tsv")
+        self.tokenizer = tokenizer
+        self._tokens = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    key, sep, tokens = line.rstrip("\n").partition("\t")
+                    if sep:
+                        self._tokens[key] = tokens.split()
+
+    def tokenize_many(self, texts: Sequence[str]) -> List[List[str]]:
+        keys = [hashlib.sha1(t.encode("utf-8")).hexdigest() for t in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self._tokens and key not in missing:
+                missing[key] = self.tokenizer(text)
+
+        if missing:
+            logger.info(
+                f"-------- 토큰화: {len(missing)}개 분석 / {len(texts) - len(missing)}개 캐시"
+            )
+            with open(self.path, "a", encoding="utf-8") as f:
+                for key, tokens in missing.items():
+                    f.write(f"{key}\t{' '.join(tokens)}\n")
+            self._tokens.update(missing)
+
+        return [self._tokens[key] for key in keys]